@@ -0,0 +1,123 @@
+"""
+Regression benchmark for the message parser.
+
+Runs the labelled Spanish corpus (corpus/parser_es.json) through LLMService
+with one or more parser backends and reports accuracy per tipo,
+amount-extraction errors and per-message latency. The heuristic backend's
+rules were written against that corpus, so every backend is also run on a
+held-out set: messages from loadgen.generate() with a fixed seed, which
+nobody tuned against.
+
+Usage:
+    python bench_parser.py                      # heuristic backend (offline)
+    python bench_parser.py heuristic replay     # several backends
+    python bench_parser.py record               # call OpenAI and save recordings
+    python bench_parser.py --held-out 500 --seed 3
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import loadgen
+from services.llm_service import LLMService
+from services.parser_backends import create_backend
+
+CORPUS_FILE = Path(__file__).parent / "corpus" / "parser_es.json"
+
+# Held-out set: generated phrasings, fixed seed so runs are comparable
+HELD_OUT_COUNT = 200
+HELD_OUT_SEED = 20240611
+
+
+async def run_backend(name: str, corpus: list) -> dict:
+    """
+    Parse the whole corpus with one backend.
+    
+    Args:
+        name: Backend name for create_backend()
+        corpus: Labelled messages
+    
+    Returns:
+        Metrics dict for the report
+    """
+    service = LLMService(backend=create_backend(name))
+    per_tipo = defaultdict(lambda: [0, 0])  # tipo -> [correct, total]
+    amount_errors = []
+    latencies = []
+    failures = 0
+    
+    for item in corpus:
+        started = time.perf_counter()
+        result, _ = await service.parse_message(item["message"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        
+        per_tipo[item["tipo"]][1] += 1
+        if result is None:
+            failures += 1
+            continue
+        
+        if result.tipo == item["tipo"]:
+            per_tipo[item["tipo"]][0] += 1
+        if abs(result.monto - item["monto"]) > 0.5:
+            amount_errors.append((item["message"], item["monto"], result.monto))
+    
+    return {
+        "per_tipo": dict(per_tipo),
+        "amount_errors": amount_errors,
+        "failures": failures,
+        "latencies": latencies
+    }
+
+
+def print_report(name: str, metrics: dict, total: int) -> None:
+    """Print the metrics of one backend on one message set."""
+    latencies = sorted(metrics["latencies"])
+    correct = sum(c for c, _ in metrics["per_tipo"].values())
+    
+    print(f"\n🔌 Backend: {name}")
+    print("-" * 70)
+    for tipo, (ok, count) in sorted(metrics["per_tipo"].items()):
+        print(f"   {tipo:<12} {ok:>3}/{count:<3} {ok / count:>6.0%}")
+    print(f"   {'total':<12} {correct:>3}/{total:<3} {correct / total:>6.0%}   (sin parsear: {metrics['failures']})")
+    print(f"   Errores de monto: {len(metrics['amount_errors'])}")
+    for message, expected, got in metrics["amount_errors"]:
+        print(f"      • {message!r}: esperado {expected:,.0f}, obtenido {got:,.0f}")
+    print(f"   Latencia ms: media {statistics.mean(latencies):.1f}, "
+          f"p50 {latencies[len(latencies) // 2]:.1f}, p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}")
+
+
+async def main_async(backends: list, held_out_count: int, seed: int) -> None:
+    """Run every backend over the corpus and the held-out set and print the reports."""
+    message_sets = [("corpus", json.loads(CORPUS_FILE.read_text(encoding="utf-8")))]
+    if held_out_count:
+        message_sets.append((f"held-out (loadgen, seed {seed})", loadgen.generate(held_out_count, seed=seed)))
+    
+    for label, messages in message_sets:
+        print("\n" + "=" * 70)
+        print(f"🧪 PARSER BENCHMARK - {label}: {len(messages)} mensajes etiquetados")
+        print("=" * 70)
+        
+        for name in backends:
+            metrics = await run_backend(name, messages)
+            print_report(name, metrics, len(messages))
+    print()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Parser accuracy benchmark")
+    parser.add_argument("backends", nargs="*", default=["heuristic"], help="Backends (default: heuristic)")
+    parser.add_argument("--held-out", type=int, default=HELD_OUT_COUNT,
+                        help=f"Generated held-out messages (default {HELD_OUT_COUNT}, 0 to skip)")
+    parser.add_argument("--seed", type=int, default=HELD_OUT_SEED, help="Seed of the held-out set")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.backends, args.held_out, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Token accounting report for LLM prompt profiles.
+
+Compares the input tokens sent per message by each prompt profile and
+output mode, using the example messages of LLMService. Token counts are
+exact when tiktoken is installed and approximate otherwise.
+
+Usage: python bench_prompts.py
+"""
+
+from services.llm_service import LLMService
+from services.prompts import token_report
+
+
+def main():
+    """Main entry point."""
+    messages = LLMService().get_example_messages()
+    rows = token_report(messages)
+    baseline = next(r["input_tokens"] for r in rows if r["profile"] == "full" and r["output_mode"] == "text")
+    
+    print("\n" + "=" * 70)
+    print(f"🧮 PROMPT TOKEN REPORT - {len(messages)} example messages")
+    print("=" * 70 + "\n")
+    print(f"{'profile':<10}{'output':<13}{'system':>8}{'schema':>8}{'user':>7}{'input':>8}{'vs full':>9}")
+    
+    for row in rows:
+        saving = 1 - row["input_tokens"] / baseline
+        print(f"{row['profile']:<10}{row['output_mode']:<13}{row['system_tokens']:>8}{row['schema_tokens']:>8}"
+              f"{row['user_tokens']:>7}{row['input_tokens']:>8}{saving:>8.0%}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
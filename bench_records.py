@@ -0,0 +1,106 @@
+"""
+Benchmark for the bulk decode path.
+
+Compares decoding synthetic Transacciones rows through the Pydantic
+Transaction model against the trusted row decoder that builds compact
+TransactionRecord tuples. Reports rows/sec and bytes per record, plus
+timestamp parsing speed of the decoder's fast path vs datetime.strptime.
+
+Usage: python bench_records.py [rows]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from domain.transaction import Transaction, TransactionType
+from services.row_decoder import decode_transactions, parse_timestamp
+
+CATEGORIES = ["Comida", "transporte", " Salario", "arriendo", "Servicios", "ocio", "salud"]
+
+
+def make_rows(count: int) -> list:
+    """Generate synthetic raw rows as returned by get_all_values()."""
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        fecha = start + timedelta(minutes=17 * i)
+        es_ingreso = random.random() < 0.2
+        rows.append([
+            fecha.strftime("%Y-%m-%d %H:%M:%S"),
+            str(random.randint(1, 500) * 1000),
+            random.choice(CATEGORIES),
+            f"Mensaje de prueba {i}",
+            "TRUE" if es_ingreso else "FALSE"
+        ])
+    return rows
+
+
+def decode_with_pydantic(rows: list) -> list:
+    """Decode rows through the validated Transaction model."""
+    return [
+        Transaction(
+            tipo=TransactionType.INGRESO if row[4] == "TRUE" else TransactionType.GASTO,
+            monto=float(row[1]),
+            categoria=row[2],
+            descripcion=row[3],
+            fecha=datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
+        )
+        for row in rows
+    ]
+
+
+def measure(name: str, decode, rows: list) -> None:
+    """Time a decoder and measure the memory held by its result."""
+    started = time.perf_counter()
+    decode(rows)
+    elapsed = time.perf_counter() - started
+    
+    tracemalloc.start()
+    result = decode(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(f"{name:<12} {len(rows) / elapsed:>14,.0f} rows/s {retained / len(result):>10,.0f} bytes/record")
+
+
+def measure_timestamps(rows: list) -> None:
+    """Compare per-row timestamp parsing: strptime vs the decoder fast path."""
+    values = [row[0] for row in rows]
+    
+    started = time.perf_counter()
+    for value in values:
+        datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    strptime_elapsed = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for value in values:
+        parse_timestamp(value)
+    fast_elapsed = time.perf_counter() - started
+    
+    print(f"{'strptime':<12} {len(values) / strptime_elapsed:>14,.0f} timestamps/s")
+    print(f"{'fast path':<12} {len(values) / fast_elapsed:>14,.0f} timestamps/s "
+          f"({strptime_elapsed / fast_elapsed:.1f}x)")
+
+
+def main():
+    """Main entry point."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    random.seed(42)
+    rows = make_rows(count)
+    
+    print("\n" + "=" * 70)
+    print(f"📊 BULK DECODE BENCHMARK - {count:,} Transacciones rows")
+    print("=" * 70 + "\n")
+    
+    measure("pydantic", decode_with_pydantic, rows)
+    measure("records", decode_transactions, rows)
+    print()
+    measure_timestamps(rows)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,14 @@ Contains bot handlers, commands, and message processing logic.
 """
 
 from .handlers import setup_handlers
-from .bot_instance import bot_app
+from .bot_instance import get_bot_app
 
-__all__ = ["setup_handlers", "bot_app"]
+__all__ = ["setup_handlers", "get_bot_app", "bot_app"]
+
+
+def __getattr__(name: str):
+    """Build the bot application lazily when `bot.bot_app` is first accessed."""
+    if name == "bot_app":
+        return get_bot_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -5,6 +5,8 @@ Creates and configures the Telegram bot application.
 """
 
 import logging
+from typing import Optional
+
 from telegram.ext import Application
 
 from services.config import settings
@@ -19,13 +21,36 @@ def create_bot_application() -> Application:
     Returns:
         Configured Application instance
     """
-    # Create application
-    app = Application.builder().token(settings.BOT_TOKEN).build()
+    # Updates are handled concurrently; messages and the commands that write
+    # capital movements or call the LLM are bounded and scheduled fairly per
+    # user by the admission controller
+    app = Application.builder().token(settings.BOT_TOKEN).concurrent_updates(
+        settings.ADMISSION_WORKERS + settings.ADMISSION_QUEUE_SIZE).build()
     
     logger.info(f"Created bot application: {settings.BOT_NAME}")
     return app
 
 
-# Global bot application instance
-bot_app = create_bot_application()
+# Global bot application instance (built on first access)
+_bot_app: Optional[Application] = None
+
+
+def get_bot_app() -> Application:
+    """
+    Get the global bot application, creating it on first call.
+    
+    Returns:
+        The shared Application instance
+    """
+    global _bot_app
+    if _bot_app is None:
+        _bot_app = create_bot_application()
+    return _bot_app
+
+
+def __getattr__(name: str):
+    """Keep `from bot.bot_instance import bot_app` working without building at import."""
+    if name == "bot_app":
+        return get_bot_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
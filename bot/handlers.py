@@ -4,7 +4,14 @@ Telegram bot command and message handlers.
 Implements bot commands (/start, /help, etc.) and message processing.
 """
 
+import asyncio
+import functools
 import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -14,15 +21,34 @@ from telegram.ext import (
     filters
 )
 
-from services.llm_service import LLMService
-from services.sheets_service import SheetsService
+from services.admission import Overloaded
+from services.container import container
 from services.config import settings
+from services.parser_backends import parse_spoken_amount
+from services.ledger import parse_period
+from services.recurring import detect_frequency
+from domain.recurring import Frequency
 
 logger = logging.getLogger(__name__)
 
-# Initialize services
-llm_service = LLMService()
-sheets_service = SheetsService()
+# "Retiré el CDT de Bancolombia" may be a withdrawal rather than a new movement
+_WITHDRAW_PATTERN = re.compile(r"^\s*retir[eé]\b", re.IGNORECASE)
+
+# /portafolio lists positions maturing within this many days
+_MATURING_WINDOW_DAYS = 30
+
+# Message length (characters) that counts as one more unit of admission cost
+_ADMISSION_COST_CHARS = 200
+
+# Startup loads running in the background (referenced so they are not garbage collected)
+_background_tasks: Set[asyncio.Task] = set()
+
+# Reply text for each recurring frequency
+_FREQUENCY_LABELS = {
+    "mensual": "cada mes",
+    "quincenal": "cada quincena",
+    "semanal": "cada semana"
+}
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -64,14 +90,30 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "*Presupuestos:*\n"
         "• Presupuesto de 300 mil para transporte\n"
         "• Presupuesto mensual de 1 millón para arriendo\n\n"
+        "*Recurrentes:* 🔁\n"
+        "• Pago 45 mil de Netflix cada mes\n"
+        "• Recibo 1.5 millones de salario cada quincena\n\n"
         "*Ahorros e Inversiones:* 💰\n"
         "• Ahorré 100 mil en el banco\n"
         "• Invertí 500 mil en CDT\n"
-        "• Guardé 200k en Davivienda\n\n"
+        "• Guardé 200k en Davivienda\n"
+        "• Retiré el CDT de Bancolombia\n\n"
         "*Comandos disponibles:*\n"
         "/start - Iniciar el bot\n"
         "/help - Ver esta ayuda\n"
-        "/stats - Ver estadísticas (próximamente)\n\n"
+        "/stats - Ver estadísticas del mes\n"
+        "/gastos semana pasada - Gastos de un periodo\n"
+        "/buscar uber - Buscar movimientos\n"
+        "/grafico categorias octubre - Gráfico de gastos (categorias, meses o capital)\n"
+        "/recalcular - Recalcular la hoja Resumen\n"
+        "/portafolio - Valor de tus ahorros e inversiones\n"
+        "/portafolio 2026-12-31 - Valor proyectado a una fecha\n"
+        "/retirar cdt bancolombia - Marcar un ahorro o inversión como retirado (confirmando con su id)\n"
+        "/retorno 45 mil cdt bancolombia - Registrar rendimientos\n"
+        "/recurrente mensual Pago arriendo 1.2 millones - Movimiento recurrente\n"
+        "/recurrentes - Ver movimientos recurrentes\n"
+        "/categoria almuerzos = comida - Corregir una categoría\n"
+        "/institucion banco davi = davivienda - Corregir una institución\n\n"
         "💡 *Tip:* Puedes usar \"mil\", \"k\" o números directos"
     )
     
@@ -83,27 +125,575 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     """
     Handle the /stats command.
     
-    Shows user statistics (to be implemented).
+    Shows the month's totals from the Resumen sheet: gastos, ingresos,
+    presupuesto vs. gasto per category, and active capital. Accepts a month
+    as "/stats 2026-03".
+    """
+    user_id = update.effective_user.id
+    month = context.args[0] if context.args else datetime.now().strftime("%Y-%m")
+    if not re.fullmatch(r"\d{4}-\d{2}", month):
+        await update.message.reply_text("✏️ Uso: /stats [AAAA-MM]\n\nEjemplo: /stats 2026-03")
+        return
+    
+    totals = container.summary.month(month)
+    gastos = totals.get("gasto", {})
+    ingresos = totals.get("ingreso", {})
+    presupuestos = totals.get("presupuesto", {})
+    total_gastos = sum(total for total, _ in gastos.values())
+    total_ingresos = sum(total for total, _ in ingresos.values())
+    
+    lines = [
+        f"📊 *Estadísticas {month}*\n",
+        f"💰 Ingresos: ${total_ingresos:,.2f}",
+        f"💸 Gastos: ${total_gastos:,.2f}",
+        f"⚖️ Balance: ${total_ingresos - total_gastos:,.2f}"
+    ]
+    
+    if gastos:
+        lines.append("\n*Gastos por categoría:*")
+        for categoria, (total, count) in sorted(gastos.items(), key=lambda item: -item[1][0])[:8]:
+            budget = presupuestos.get(categoria)
+            suffix = f" de ${budget[0]:,.2f} ({total / budget[0]:.0%})" if budget else ""
+            lines.append(f"• {categoria}: ${total:,.2f}{suffix}")
+    
+    capital = container.summary.active_capital()
+    if capital:
+        lines.append("\n*Capital activo:*")
+        lines += [f"• {institucion}: ${total:,.2f}" for institucion, total in sorted(capital.items(), key=lambda item: -item[1])]
+    
+    if not totals and not capital:
+        lines.append("\nNo hay movimientos registrados en este mes.")
+    
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    logger.info(f"User {user_id} requested stats for {month}")
+
+
+async def spending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /gastos command.
+    
+    Answers "¿cuánto gasté ...?" for a period from the date-indexed ledger,
+    e.g. "/gastos semana pasada", "/gastos octubre" or "/gastos este mes".
+    """
+    user_id = update.effective_user.id
+    text = " ".join(context.args or []) or "este mes"
+    period = parse_period(text)
+    if period is None:
+        await update.message.reply_text(
+            "✏️ Uso: /gastos <periodo>\n\n"
+            "Ejemplos: /gastos hoy, /gastos semana pasada, /gastos octubre, /gastos 2026-03"
+        )
+        return
+    
+    start, end = period
+    await asyncio.to_thread(container.ledger.ensure_range, start, end)
+    records = container.ledger.query(start, end, tipo="gasto")
+    
+    by_category: dict = {}
+    for record in records:
+        by_category[record.categoria] = by_category.get(record.categoria, 0.0) + record.monto
+    total = sum(by_category.values())
+    
+    lines = [
+        f"💸 *Gastos {text}*",
+        f"📅 {start.strftime('%Y-%m-%d')} a {(end - timedelta(days=1)).strftime('%Y-%m-%d')}\n",
+        f"Total: ${total:,.2f} en {len(records)} movimientos"
+    ]
+    if by_category:
+        lines.append("")
+        lines += [f"• {categoria}: ${monto:,.2f}"
+                  for categoria, monto in sorted(by_category.items(), key=lambda item: -item[1])[:10]]
+    
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    logger.info(f"User {user_id} queried gastos for {text}: {len(records)} records")
+
+
+async def chart_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /grafico command.
+    
+    Sends a chart image: gastos by categoria for a period ("/grafico
+    categorias octubre", the default), gastos vs ingresos per month (the
+    last 12 months, or "/grafico meses este año") or active capital by
+    institution ("/grafico capital"). Rendering runs in a worker process.
+    """
+    from services.charts import CHARTS
+    
+    user_id = update.effective_user.id
+    args = list(context.args or [])
+    kind = args.pop(0).lower() if args and args[0].lower() in CHARTS else "categorias"
+    text = " ".join(args)
+    
+    if kind == "meses" and not text:
+        today = datetime.now()
+        start = datetime(today.year - (today.month < 12), today.month % 12 + 1, 1)
+        end = datetime(today.year + (today.month == 12), today.month % 12 + 1, 1)
+        period = (start, end)
+    else:
+        period = parse_period(text or "este mes")
+    if period is None:
+        await update.message.reply_text(
+            "✏️ Uso: /grafico [categorias|meses|capital] [periodo]\n\n"
+            "Ejemplos: /grafico categorias octubre, /grafico meses este año, /grafico capital"
+        )
+        return
+    
+    await update.message.chat.send_action(action="upload_photo")
+    started = time.perf_counter()
+    start, end = period
+    png, title = await container.charts.render(user_id, kind, start, end)
+    if png is None:
+        await update.message.reply_text(f"📊 No hay datos para el gráfico: {title}.")
+        return
+    
+    await update.message.reply_photo(photo=png, caption=f"📊 {title}")
+    logger.info(f"User {user_id} requested {kind} chart ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /buscar command.
+    
+    Finds movements by words of their description or category, e.g.
+    "/buscar uber" or "/buscar pagué arriendo".
+    """
+    user_id = update.effective_user.id
+    query = " ".join(context.args or [])
+    if not query:
+        await update.message.reply_text("✏️ Uso: /buscar <palabras>\n\nEjemplo: /buscar uber")
+        return
+    
+    await asyncio.to_thread(container.search.ensure_loaded)
+    count, total, results = container.search.search(query, limit=10)
+    if not count:
+        await update.message.reply_text(f"🔍 No encontré movimientos con \"{query}\".")
+        return
+    
+    lines = [f"🔍 *{count} movimientos* con \"{query}\" (total ${total:,.2f})\n"]
+    for doc in results:
+        lines.append(f"• {doc['fecha'][:10]} {doc['tipo']} ${doc['monto']:,.2f} - {doc['descripcion'] or doc['categoria']}")
+    if count > len(results):
+        lines.append(f"\n_Mostrando los {len(results)} más recientes_")
+    
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    logger.info(f"User {user_id} searched {query!r}: {count} matches")
+
+
+async def rebuild_summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /recalcular command.
+    
+    Rebuilds the Resumen sheet, the search index, the date index and the
+    spending statistics from the ledger, e.g. after editing the
+    spreadsheet by hand.
+    """
+    await update.message.chat.send_action(action="typing")
+    await asyncio.to_thread(container.ledger.load, False)
+    await asyncio.to_thread(container.ledger.ensure_range)
+    gastos = [(record.categoria, record.monto) for record in container.ledger.query(tipo="gasto")]
+    await asyncio.to_thread(container.anomalies.rebuild, gastos)
+    lines = await asyncio.to_thread(container.summary.rebuild)
+    documents = await asyncio.to_thread(container.search.rebuild)
+    await update.message.reply_text(f"✅ Resumen recalculado ({lines} líneas, {documents} movimientos indexados).")
+    logger.info(f"User {update.effective_user.id} rebuilt the summary sheet")
+
+
+async def portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /portafolio command.
+    
+    Shows the current value of active ahorros e inversiones (with accrued
+    returns) by institution, or the projected value at a date given as
+    "/portafolio 2026-12-31", plus the positions that mature within the
+    following 30 days.
+    """
+    user_id = update.effective_user.id
+    
+    as_of = None
+    if context.args:
+        try:
+            as_of = datetime.strptime(context.args[0], "%Y-%m-%d")
+        except ValueError:
+            await update.message.reply_text("✏️ Uso: /portafolio [AAAA-MM-DD]\n\nEjemplo: /portafolio 2026-12-31")
+            return
+    
+    # The row index already holds every movement and is kept current by the outbox
+    await asyncio.to_thread(container.capital_index.ensure_loaded, container.sheets)
+    portfolio = container.capital_index.portfolio()
+    if not len(portfolio):
+        await update.message.reply_text("💼 No tienes ahorros ni inversiones activos.")
+        return
+    
+    started = time.perf_counter()
+    total = portfolio.total_value(as_of)
+    by_institution = sorted(portfolio.value_by_institution(as_of).items(), key=lambda item: -item[1])
+    by_tipo = portfolio.value_by_tipo(as_of)
+    since = as_of or datetime.now()
+    maturing = portfolio.maturing(since + timedelta(days=_MATURING_WINDOW_DAYS), since)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    title = f"Proyección al {as_of.strftime('%Y-%m-%d')}" if as_of else "Portafolio actual"
+    lines = [
+        f"💼 *{title}*\n",
+        f"💵 Depositado: ${portfolio.total_principal():,.2f}",
+        f"📈 Valor: ${total:,.2f}",
+        f"✨ Rendimiento: ${total - portfolio.total_principal():,.2f}\n",
+        "*Por institución:*"
+    ]
+    lines += [f"• {name}: ${value:,.2f}" for name, value in by_institution]
+    lines += ["", "*Por tipo:*"]
+    lines += [f"• {tipo}: ${value:,.2f}" for tipo, value in by_tipo.items()]
+    if maturing:
+        lines += ["", f"*Vencen en los próximos {_MATURING_WINDOW_DAYS} días:*"]
+        lines += [f"• {name}: ${value:,.2f} el {fecha.strftime('%Y-%m-%d')}" for name, fecha, value in maturing]
+    
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    logger.info(f"User {user_id} requested portfolio ({len(portfolio)} positions, {elapsed_ms:.1f} ms)")
+
+
+async def _run_admitted(update: Update, work: Callable[[], Awaitable[None]], cost: int = 1) -> None:
+    """Run a handler body in the user's admission queue, replying busy if it is shed."""
+    try:
+        await container.admission.run(update.effective_user.id, work, cost=cost)
+    except Overloaded:
+        await update.message.reply_text(
+            "⏳ Estoy ocupado en este momento. Por favor, envía tu mensaje de nuevo en unos segundos."
+        )
+
+
+def _admitted(handler):
+    """
+    Run a command through admission control, like regular messages.
+    
+    Updates are processed concurrently, so commands that call the LLM or
+    write to Sheets go through the same per-user queue and in-flight limit
+    (one at a time, in order, by default).
+    """
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await _run_admitted(update, lambda: handler(update, context))
+    return wrapper
+
+
+def _describe_movement(entry_id: str, record) -> str:
+    """One-line description of a capital movement for replies."""
+    return f"• `{entry_id}` {record.tipo} en {record.institucion}: ${record.monto:,.2f} ({record.fecha.strftime('%Y-%m-%d')})"
+
+
+async def _find_movements(update: Update, text: str, command: str):
+    """
+    Resolve the single capital movement a message refers to, replying if it cannot.
+    
+    Returns:
+        List with one (movement id, record), or None if the user was asked to clarify
+    """
+    index = container.capital_index
+    await asyncio.to_thread(index.ensure_loaded, container.sheets)
+    matches = index.find(text)
+    
+    if not matches:
+        await update.message.reply_text(
+            "🔍 No encontré ese ahorro o inversión activo.\n\n"
+            "Si lo acabas de registrar, espera unos segundos e intenta de nuevo."
+        )
+        return None
+    
+    if len(matches) > 1:
+        lines = [f"🤔 Encontré {len(matches)} movimientos, ¿cuál?\n"]
+        lines += [_describe_movement(entry_id, record) for entry_id, record in matches[:10]]
+        lines.append(f"\nUsa /{command} <id>")
+        await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+        return None
+    
+    return matches
+
+
+async def _confirm_withdrawal(update: Update, text: str) -> bool:
+    """
+    List the movements a free-text withdrawal matches and ask for their ids.
+    
+    Nothing is withdrawn from a description alone: "Retiré 50 mil del
+    cajero" must not mark a saving as withdrawn because it shares a word.
+    
+    Returns:
+        True if the user was asked to confirm, False if nothing matched
+    """
+    index = container.capital_index
+    await asyncio.to_thread(index.ensure_loaded, container.sheets)
+    matches = index.find(text)[:10]
+    if not matches:
+        return False
+    
+    ids = " ".join(entry_id for entry_id, _ in matches)
+    if len(matches) == 1:
+        lines = ["🤔 ¿Marco este movimiento como retirado?\n"]
+    else:
+        lines = [f"🤔 Encontré {len(matches)} movimientos, ¿cuáles marco como retirados?\n"]
+    lines += [_describe_movement(entry_id, record) for entry_id, record in matches]
+    lines.append(f"\nPara confirmar: `/retirar {ids}`")
+    if len(matches) > 1:
+        lines.append("(o solo los ids que quieras retirar)")
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    return True
+
+
+async def _withdraw_movements(update: Update, matches: list) -> None:
+    """Mark movements, given as (movement id, record), as withdrawn (one Sheets call)."""
+    updated = await asyncio.to_thread(
+        container.capital_index.withdraw, container.sheets, [entry_id for entry_id, _ in matches]
+    )
+    total = sum(record.get_current_value() for record in updated)
+    lines = [f"✅ Marcado como retirado ({len(updated)}):\n"]
+    lines += [_describe_movement(entry_id, record) for (entry_id, _), record in zip(matches, updated)]
+    lines.append(f"\n💵 Total retirado: ${total:,.2f}")
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+    logger.info(f"User {update.effective_user.id} withdrew {len(updated)} capital movements")
+
+
+@_admitted
+async def withdraw_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /retirar command.
+    
+    Marks savings or investments as withdrawn by id, e.g.
+    "/retirar 3fa9c2d1 7b01e4aa". A description such as
+    "/retirar cdt bancolombia" only lists the matching movements with
+    the command that confirms them.
     """
-    stats_message = (
-        "📊 *Estadísticas*\n\n"
-        "Esta función estará disponible próximamente.\n\n"
-        "Aquí podrás ver:\n"
-        "• Total de gastos\n"
-        "• Total de ingresos\n"
-        "• Presupuesto vs. gastos reales\n"
-        "• Gastos por categoría"
+    args = [arg.lower() for arg in context.args or []]
+    if not args:
+        await update.message.reply_text("✏️ Uso: /retirar <institución o id>\n\nEjemplo: /retirar cdt bancolombia")
+        return
+    
+    index = container.capital_index
+    await asyncio.to_thread(index.ensure_loaded, container.sheets)
+    matches = [(entry_id, index.get(entry_id)) for entry_id in dict.fromkeys(args)]
+    if all(record is not None and record.is_active() for _, record in matches):
+        await _withdraw_movements(update, matches)
+        return
+    
+    if not await _confirm_withdrawal(update, " ".join(args)):
+        await update.message.reply_text(
+            "🔍 No encontré ese ahorro o inversión activo.\n\n"
+            "Si lo acabas de registrar, espera unos segundos e intenta de nuevo."
+        )
+
+
+@_admitted
+async def return_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /retorno command.
+    
+    Adds returns or interest to a saving or investment, e.g.
+    "/retorno 45 mil cdt bancolombia".
+    """
+    text = " ".join(context.args or [])
+    amount = parse_spoken_amount(text)
+    if not amount or amount <= 0:
+        await update.message.reply_text("✏️ Uso: /retorno <monto> <institución o id>\n\nEjemplo: /retorno 45 mil cdt bancolombia")
+        return
+    
+    matches = await _find_movements(update, text, "retorno")
+    if not matches:
+        return
+    
+    entry_id, _ = matches[0]
+    updated = await asyncio.to_thread(container.capital_index.add_returns, container.sheets, {entry_id: amount})
+    record = updated[0]
+    await update.message.reply_text(
+        f"✅ Retorno registrado\n\n"
+        f"{_describe_movement(entry_id, record)}\n"
+        f"✨ Retorno acumulado: ${record.retorno:,.2f}\n"
+        f"📈 Valor actual: ${record.get_current_value():,.2f}",
+        parse_mode='Markdown'
     )
+    logger.info(f"User {update.effective_user.id} added return {amount} to capital movement {entry_id}")
+
+
+@_admitted
+def _materialize_recurring(rule_id: Optional[str] = None) -> Tuple[int, List[str]]:
+    """
+    Enqueue the recurring occurrences that came due, folding their gastos into the anomaly stats.
+    
+    Args:
+        rule_id: Rule whose anomaly alerts are returned (None: no alerts)
+    
+    Returns:
+        (occurrences enqueued, alert lines of that rule's gastos)
+    """
+    alerts = []
+    
+    def observe(rule, transaction) -> None:
+        if transaction.tipo != "gasto":
+            return
+        alert = container.anomalies.observe(transaction.categoria, transaction.monto)
+        if alert and rule.id == rule_id:
+            alerts.append(alert)
+    
+    return container.recurring.materialize_due(container.outbox, on_enqueued=observe), alerts
+
+
+async def recurring_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /recurrente command.
+    
+    Creates a recurring transaction from a message, parsed once with the LLM,
+    e.g. "/recurrente mensual Pago de arriendo 1.2 millones". This period's
+    occurrence is registered right away.
+    """
+    user_id = update.effective_user.id
+    args = context.args or []
+    frequencies = [f.value for f in Frequency]
+    
+    if len(args) < 2 or args[0].lower() not in frequencies:
+        await update.message.reply_text(
+            f"✏️ Uso: /recurrente <{'|'.join(frequencies)}> <mensaje>\n\n"
+            "Ejemplo: /recurrente mensual Pago de arriendo 1.2 millones"
+        )
+        return
+    
+    await update.message.chat.send_action(action="typing")
+    result, result_type = await container.llm.parse_message(" ".join(args[1:]), user_id)
+    if not result or result_type == "capital":
+        await update.message.reply_text(
+            "❌ No pude entender el movimiento. Solo gastos, ingresos y presupuestos pueden ser recurrentes."
+        )
+        return
+    
+    container.canonicalizer.apply(result, user_id)
+    rule = container.recurring.add(user_id, Frequency(args[0].lower()), result)
+    enqueued, alerts = _materialize_recurring(rule.id)
+    
+    if enqueued:
+        registered = "Ya registré el de este periodo."
+    else:
+        registered = f"El primero se registrará el {rule.occurrence_date(rule.next_index).strftime('%Y-%m-%d')}."
+    if alerts:
+        registered += f"\n\n{alerts[-1]}"
+    await update.message.reply_text(
+        f"🔁 Recurrente creado (`{rule.id}`)\n\n"
+        f"*{rule.tipo.capitalize()}* de ${rule.monto:,.2f} en {rule.categoria}, {_FREQUENCY_LABELS[rule.frecuencia]}.\n"
+        f"{registered}",
+        parse_mode='Markdown'
+    )
+    logger.info(f"User {user_id} created recurring rule {rule.id}")
+
+
+async def list_recurring_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /recurrentes command.
+    
+    Lists the user's recurring transactions with the date of the next one.
+    """
+    rules = container.recurring.for_user(update.effective_user.id)
+    if not rules:
+        await update.message.reply_text("🔁 No tienes movimientos recurrentes.\n\nCrea uno con /recurrente")
+        return
+    
+    lines = ["🔁 *Movimientos recurrentes*\n"]
+    for rule in rules:
+        next_date = rule.occurrence_date(rule.next_index).strftime('%Y-%m-%d')
+        lines.append(f"• `{rule.id}` {rule.tipo} ${rule.monto:,.2f} en {rule.categoria}, "
+                     f"{_FREQUENCY_LABELS[rule.frecuencia]} (próximo: {next_date})")
+    lines.append("\nPara borrar uno: /borrar\\_recurrente <id>")
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+
+
+async def delete_recurring_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /borrar_recurrente command.
+    
+    Deletes a recurring transaction; already registered occurrences stay.
+    """
+    user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text("✏️ Uso: /borrar_recurrente <id>\n\nUsa /recurrentes para ver los ids.")
+        return
     
-    await update.message.reply_text(stats_message, parse_mode='Markdown')
-    logger.info(f"User {update.effective_user.id} requested stats")
+    if container.recurring.remove(user_id, context.args[0]):
+        await update.message.reply_text("🗑️ Recurrente eliminado. Los movimientos ya registrados se conservan.")
+        logger.info(f"User {user_id} deleted recurring rule {context.args[0]}")
+    else:
+        await update.message.reply_text("🔍 No encontré ese recurrente. Usa /recurrentes para ver los ids.")
+
+
+async def recurring_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job queue tick: enqueue every recurring occurrence that has come due."""
+    try:
+        _materialize_recurring()
+    except Exception as e:
+        logger.error(f"Error materializing recurring transactions: {e}", exc_info=True)
+
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job queue tick: move closed years of Transacciones to their archive sheets."""
+    try:
+        archived = await asyncio.to_thread(container.archiver.run)
+    except Exception as e:
+        logger.error(f"Error archiving transactions: {e}", exc_info=True)
+        return
+    if archived:
+        logger.info(f"Archived transactions by year: {archived}")
+
+
+async def snapshot_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job queue tick: save the ledger snapshot if the ledger changed."""
+    try:
+        await asyncio.to_thread(container.ledger.save_snapshot)
+    except Exception as e:
+        logger.error(f"Error saving ledger snapshot: {e}", exc_info=True)
+
+
+async def alias_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle the /categoria and /institucion commands.
+    
+    Learns a correction so future messages are saved under the canonical
+    name, e.g. "/categoria almuerzos = comida" or
+    "/institucion banco davi = davivienda".
+    """
+    user_id = update.effective_user.id
+    command = update.message.text.split()[0].lstrip("/").split("@")[0]
+    kind = container.canonicalizer.INSTITUTION if command == "institucion" else container.canonicalizer.CATEGORY
+    text = " ".join(context.args or [])
+    
+    if "=" not in text:
+        await update.message.reply_text(
+            f"✏️ Uso: /{command} <como lo escribes> = <nombre correcto>\n\n"
+            f"Ejemplo: /{command} {'banco davi = davivienda' if command == 'institucion' else 'almuerzos = comida'}"
+        )
+        return
+    
+    alias, canonical = (part.strip() for part in text.split("=", 1))
+    if not alias or not canonical:
+        await update.message.reply_text("❌ Debes indicar ambos nombres, por ejemplo: almuerzos = comida")
+        return
+    
+    target = container.canonicalizer.learn(kind, alias, canonical, user_id)
+    await update.message.reply_text(f"✅ Listo, de ahora en adelante \"{alias}\" se guardará como \"{target}\".")
+    logger.info(f"User {user_id} added {kind} alias: {alias} → {target}")
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Handle regular text messages.
+    Handle regular text messages through admission control.
     
-    Parses the message using LLM and saves to Google Sheets.
+    Messages wait for a processing slot in their user's queue; slots are
+    shared fairly between users, and when the bot is overloaded the
+    message is answered with a busy reply instead of queued.
+    """
+    # Longer messages cost more to parse
+    cost = 1 + len(update.message.text or "") // _ADMISSION_COST_CHARS
+    await _run_admitted(update, lambda: _process_message(update, context), cost=cost)
+
+
+async def _process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Process a regular text message.
+    
+    Parses the message using LLM and records it in the durable outbox; the
+    outbox drainer writes it to Google Sheets in the background, so the reply
+    does not wait for the Google round trip.
     Handles both transactions (gastos/ingresos/presupuestos) and capital movements (ahorros/inversiones).
     """
     user_message = update.message.text
@@ -114,9 +704,19 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Show typing indicator
     await update.message.chat.send_action(action="typing")
     
+    if _WITHDRAW_PATTERN.match(user_message):
+        try:
+            if await _confirm_withdrawal(update, user_message):
+                return
+        except Exception as e:
+            logger.error(f"Error looking up capital movements to withdraw: {e}", exc_info=True)
+            await update.message.reply_text("❌ No pude buscar el retiro. Por favor, intenta de nuevo.")
+            return
+        # No saving or investment clearly matches: parse it like any other message
+    
     try:
         # Parse message with LLM - returns (object, type)
-        result, result_type = await llm_service.parse_message(user_message)
+        result, result_type = await container.llm.parse_message(user_message, user_id)
         
         if not result:
             error_message = (
@@ -131,10 +731,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text(error_message)
             return
         
-        # Save to appropriate Google Sheets location
+        # Map categoria / institucion to canonical names so aggregates stay small
+        container.canonicalizer.apply(result, user_id)
+        
+        # Durably record for the appropriate Google Sheets location
         if result_type == "capital":
             # It's a capital movement (ahorro/inversion)
-            success = sheets_service.save_capital_movement(result)
+            success = container.outbox.enqueue_record(result) is not None
             
             if success:
                 tipo_emoji = {
@@ -144,12 +747,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
                 success_message = (
                     f"✅ ¡Registrado!\n\n"
-                    f"{tipo_emoji.get(result.tipo.value, '💰')} *{result.tipo.value.capitalize()}*\n"
+                    f"{tipo_emoji.get(result.tipo, '💰')} *{result.tipo.capitalize()}*\n"
                     f"💵 Monto: ${result.monto:,.2f}\n"
                     f"🏢 Institución: {result.institucion}\n"
                     f"📝 Descripción: {result.descripcion or 'N/A'}\n"
                     f"📅 Fecha: {result.fecha.strftime('%Y-%m-%d %H:%M')}\n"
-                    f"✅ Estado: {result.estado.value}"
+                    f"✅ Estado: {result.estado}"
                 )
                 
                 await update.message.reply_text(success_message, parse_mode='Markdown')
@@ -164,7 +767,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         else:
             # It's a regular transaction (gasto/ingreso/presupuesto)
-            success = sheets_service.save_transaction(result)
+            frequency = detect_frequency(user_message)
+            alerts = []
+            if frequency:
+                # "... cada mes": save it as a rule; occurrence 0 is this transaction
+                rule = container.recurring.add(user_id, frequency, result)
+                enqueued, alerts = _materialize_recurring(rule.id)
+                success = enqueued > 0
+            else:
+                success = container.outbox.enqueue_record(result) is not None
+                if success and result.tipo == "gasto":
+                    alert = container.anomalies.observe(result.categoria, result.monto)
+                    alerts = [alert] if alert else []
             
             if success:
                 tipo_emoji = {
@@ -175,12 +789,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
                 success_message = (
                     f"✅ ¡Registrado!\n\n"
-                    f"{tipo_emoji.get(result.tipo.value, '📝')} *{result.tipo.value.capitalize()}*\n"
+                    f"{tipo_emoji.get(result.tipo, '📝')} *{result.tipo.capitalize()}*\n"
                     f"💵 Monto: ${result.monto:,.2f}\n"
                     f"📁 Categoría: {result.categoria}\n"
                     f"📝 Descripción: {result.descripcion or 'N/A'}\n"
                     f"📅 Fecha: {result.fecha.strftime('%Y-%m-%d %H:%M')}"
                 )
+                if frequency:
+                    success_message += f"\n🔁 Se repetirá {_FREQUENCY_LABELS[rule.frecuencia]} (`{rule.id}`)"
+                if alerts:
+                    success_message += f"\n\n{alerts[-1]}"
                 
                 await update.message.reply_text(success_message, parse_mode='Markdown')
                 logger.info(f"Successfully saved transaction for user {user_id}")
@@ -232,6 +850,17 @@ def setup_handlers(application: Application) -> None:
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("recalcular", rebuild_summary_command))
+    application.add_handler(CommandHandler("gastos", spending_command))
+    application.add_handler(CommandHandler("buscar", search_command))
+    application.add_handler(CommandHandler("grafico", chart_command))
+    application.add_handler(CommandHandler(["categoria", "institucion"], alias_command))
+    application.add_handler(CommandHandler("portafolio", portfolio_command))
+    application.add_handler(CommandHandler("retirar", withdraw_command))
+    application.add_handler(CommandHandler("retorno", return_command))
+    application.add_handler(CommandHandler("recurrente", recurring_command))
+    application.add_handler(CommandHandler("recurrentes", list_recurring_command))
+    application.add_handler(CommandHandler("borrar_recurrente", delete_recurring_command))
     
     # Message handler for regular text messages
     application.add_handler(
@@ -241,36 +870,102 @@ def setup_handlers(application: Application) -> None:
     # Error handler
     application.add_error_handler(error_handler)
     
+    # Recurring transactions: first tick right after startup catches up missed periods
+    if application.job_queue:
+        application.job_queue.run_repeating(recurring_job, interval=settings.RECURRING_CHECK_INTERVAL, first=5)
+        application.job_queue.run_repeating(archive_job, interval=settings.ARCHIVE_CHECK_INTERVAL, first=60)
+        application.job_queue.run_repeating(snapshot_job, interval=settings.SNAPSHOT_INTERVAL)
+    else:
+        logger.warning("Job queue not available (install python-telegram-bot[job-queue]); "
+                       "recurring transactions will not be materialized nor old years archived, "
+                       "and the ledger snapshot is only saved at shutdown")
+    
     logger.info("All handlers registered successfully")
 
 
-def initialize_services() -> bool:
+async def initialize_services() -> bool:
     """
-    Initialize external services (Google Sheets).
+    Initialize external services (Google Sheets and OpenAI).
+    
+    Services are warmed up concurrently and a startup timing breakdown
+    is logged.
     
     Returns:
         True if initialization successful, False otherwise
     """
+    # Watch for blocking calls on the event loop from the start
+    container.loop_monitor.start()
+    
     try:
-        # Authenticate with Google Sheets
-        if not sheets_service.authenticate():
-            logger.error("Failed to authenticate with Google Sheets")
-            return False
+        ready = await container.warm_up()
+        if not ready:
+            logger.error("Google Sheets is not reachable; the outbox keeps records and retries in the background")
+        
+        # Keep the capital row index current as the outbox appends rows
+        container.outbox.subscribe(container.capital_index.on_rows_written)
         
-        # Connect to spreadsheet
-        if not sheets_service.connect_spreadsheet():
-            logger.error("Failed to connect to spreadsheet")
-            return False
+        # Full-text index: rows saved before it finishes loading are buffered
+        container.outbox.subscribe(container.search.on_rows_written)
+        container.archiver.subscribe(container.search.on_archived)
         
-        # Initialize sheets structure
-        if not sheets_service.initialize_sheets():
-            logger.error("Failed to initialize sheets")
-            return False
+        # Keep the date index current; it warm-starts from its snapshot in the background
+        container.outbox.subscribe(container.ledger.on_rows_written)
+        container.capital_index.subscribe(container.ledger.on_capital_updated)
+        container.archiver.subscribe(container.ledger.on_archived)
         
-        logger.info("All services initialized successfully")
-        return True
+        if ready:
+            for load in (container.search.ensure_loaded, container.ledger.ensure_loaded):
+                task = asyncio.create_task(asyncio.to_thread(load))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            
+            # Keep the Resumen sheet current after each write batch and capital update
+            try:
+                await asyncio.to_thread(container.summary.load)
+                container.outbox.subscribe(container.summary.on_rows_written)
+                container.capital_index.subscribe(container.summary.on_capital_updated)
+            except Exception as e:
+                logger.error(f"Error loading summary sheet: {e}", exc_info=True)
+        
+        # Replay anything left in the outbox by a previous run; even without a
+        # connection, the drainer connects on its own with backoff
+        container.outbox.start(container.sheets)
+        
+        if ready:
+            logger.info("All services initialized successfully")
+        return ready
         
     except Exception as e:
         logger.error(f"Error initializing services: {e}", exc_info=True)
         return False
 
+
+async def shutdown_services() -> None:
+    """
+    Shut down background services, flushing the outbox to Google Sheets.
+    """
+    await container.outbox.stop(container.sheets)
+    await container.summary.stop()
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await container.loop_monitor.stop()
+    container.charts.close()
+    
+    if container.sheets.transport:
+        logger.info(f"Sheets connection stats: {container.sheets.transport.stats()}")
+    
+    # Persist the search index so the next start does not rebuild it
+    container.search.save()
+    container.anomalies.save()
+    container.usage.save()
+    
+    # Snapshot the ledger (after the outbox flush, so it covers every row)
+    try:
+        await asyncio.to_thread(container.ledger.save_snapshot)
+    except Exception as e:
+        logger.error(f"Error saving ledger snapshot: {e}", exc_info=True)
+    
+    # Last: stops the token refresher thread and closes the pooled connections
+    if container.sheets.transport:
+        container.sheets.transport.close()
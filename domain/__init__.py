@@ -6,12 +6,19 @@ This module contains the core business entities used throughout the application.
 
 from .transaction import Transaction, TransactionType
 from .capital import CapitalMovement, CapitalType, CapitalStatus
+from .records import TransactionRecord, BudgetRecord, CapitalRecord
+from .recurring import RecurringRule, Frequency
 
 __all__ = [
     "Transaction",
     "TransactionType",
     "CapitalMovement",
     "CapitalType",
-    "CapitalStatus"
+    "CapitalStatus",
+    "TransactionRecord",
+    "BudgetRecord",
+    "CapitalRecord",
+    "RecurringRule",
+    "Frequency"
 ]
 
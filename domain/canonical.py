@@ -0,0 +1,174 @@
+"""
+Canonical names for categories and institutions.
+
+Maps the many ways people write the same category ("Comidas", "almuerzo",
+"restaurante") or institution ("Banco Davivienda", "davivienda") to one
+canonical name, so aggregates over the ledger stay small. Lookups use a hash
+of normalized keys (lowercase, accent-free, without noise words) and fall
+back to singular and plural forms, so either matches, and then to the
+leading words of longer names ("servicios publicos del mes").
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+
+# Canonical category → known aliases
+DEFAULT_CATEGORIES: Dict[str, List[str]] = {
+    "comida": ["almuerzo", "desayuno", "cena", "onces", "restaurante", "comida rapida", "domicilio", "corrientazo"],
+    "mercado": ["supermercado", "viveres", "tienda", "plaza"],
+    "transporte": ["uber", "taxi", "didi", "bus", "buseta", "transmilenio", "metro", "pasaje", "peaje",
+                   "transporte publico"],
+    "gasolina": ["combustible", "tanqueo", "acpm"],
+    "arriendo": ["alquiler", "renta", "arrendamiento"],
+    "servicios": ["internet", "luz", "agua", "gas", "energia", "telefono", "celular", "plan de datos",
+                  "servicios publicos"],
+    "salud": ["medicamento", "medicina", "farmacia", "drogueria", "medico", "eps", "odontologo"],
+    "entretenimiento": ["cine", "salida", "ocio", "netflix", "spotify", "concierto", "fiesta"],
+    "ropa": ["zapato", "vestuario", "calzado", "tenis"],
+    "educacion": ["universidad", "colegio", "curso", "libro", "matricula"],
+    "salario": ["sueldo", "nomina", "quincena", "pago mensual"],
+}
+
+# Canonical institution → known aliases
+DEFAULT_INSTITUTIONS: Dict[str, List[str]] = {
+    "bancolombia": [],
+    "davivienda": [],
+    "banco de bogota": ["bogota"],
+    "bbva": [],
+    "nequi": [],
+    "daviplata": [],
+    "cdt": ["certificado de deposito"],
+    "acciones": ["accion", "bolsa", "bolsa de valores"],
+    "banco": ["cuenta de ahorros", "cuenta"],
+}
+
+# Words that do not change which institution is meant ("banco davivienda" = "davivienda")
+INSTITUTION_NOISE_WORDS = ("banco", "bco", "el", "la", "en", "mi", "cuenta")
+
+
+def normalize_key(text: str, noise_words: Iterable[str] = ()) -> str:
+    """
+    Build the lookup key for a name.
+    
+    Lowercases, removes accents and punctuation and drops noise words:
+    "Banco  Davivienda" and "davivienda" share a key. A name made only of
+    noise words keeps its last one, so "mi cuenta" and "cuenta" do too.
+    
+    Args:
+        text: Name as typed by the user
+        noise_words: Words to ignore
+    
+    Returns:
+        Normalized key
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+    words = re.findall(r"[a-z0-9]+", folded)
+    
+    noise = set(noise_words)
+    meaningful = [w for w in words if w not in noise] or words[-1:]
+    return " ".join(meaningful)
+
+
+def _singular_candidates(key: str) -> List[str]:
+    """
+    Candidate singular forms of a normalized key, most likely first.
+    
+    Spanish plurals add "s" (comidas), "es" (papeles) or turn "z" into
+    "ces" (luces); trying each form avoids guessing which rule applies.
+    """
+    words = key.split()
+    candidates = []
+    for strip in ("s", "es"):
+        if all(len(w) > len(strip) + 2 and w.endswith(strip) for w in words if len(w) > 3):
+            candidates.append(" ".join(w[:-len(strip)] if len(w) > 3 else w for w in words))
+    if key.endswith("ces"):
+        candidates.append(key[:-3] + "z")
+    return [c for c in candidates if c != key]
+
+
+def _plural_candidates(key: str) -> List[str]:
+    """
+    Candidate plural forms of a normalized key ("servicio" → "servicios").
+    
+    The inverse of _singular_candidates, for canonical names that are plural.
+    """
+    words = key.split()
+    candidates = [" ".join(w + suffix if len(w) > 3 else w for w in words) for suffix in ("s", "es")]
+    if key.endswith("z"):
+        candidates.append(key[:-1] + "ces")
+    return [c for c in candidates if c != key]
+
+
+class CanonicalIndex:
+    """
+    Hash index from normalized keys to canonical names.
+    
+    Unknown names are returned lowercased and trimmed, like the domain
+    validators do, so canonicalization never loses information.
+    """
+    
+    def __init__(self, canonical: Dict[str, List[str]], noise_words: Iterable[str] = ()):
+        """
+        Build the index.
+        
+        Args:
+            canonical: Canonical name → list of aliases
+            noise_words: Words ignored when building keys
+        """
+        self.noise_words = tuple(noise_words)
+        self._keys: Dict[str, str] = {}
+        for name, aliases in canonical.items():
+            self.add_alias(name, name)
+            for alias in aliases:
+                self.add_alias(alias, name)
+    
+    def add_alias(self, alias: str, canonical: str) -> None:
+        """
+        Map an alias to a canonical name.
+        
+        Args:
+            alias: Name as users write it
+            canonical: Canonical name it stands for
+        """
+        key = normalize_key(alias, self.noise_words)
+        if key:
+            self._keys[key] = canonical.lower().strip()
+    
+    def get(self, name: str) -> Optional[str]:
+        """
+        Look up the canonical name for a name.
+        
+        Args:
+            name: Name as typed
+        
+        Returns:
+            Canonical name, or None if unknown
+        """
+        words = normalize_key(name, self.noise_words).split()
+        # The whole name first, then its leading words ("transporte publico masivo")
+        for length in range(len(words), 0, -1):
+            key = " ".join(words[:length])
+            for candidate in [key] + _singular_candidates(key) + _plural_candidates(key):
+                canonical = self._keys.get(candidate)
+                if canonical is not None:
+                    return canonical
+        return None
+    
+    def canonicalize(self, name: str) -> str:
+        """
+        Map a name to its canonical form.
+        
+        Args:
+            name: Name as typed
+        
+        Returns:
+            Canonical name if known, otherwise the name lowercased and trimmed
+        """
+        return self.get(name) or name.lower().strip()
+    
+    def __len__(self) -> int:
+        """Number of indexed keys."""
+        return len(self._keys)
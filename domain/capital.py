@@ -101,10 +101,10 @@ class CapitalMovement(BaseModel):
     def to_dict(self) -> dict:
         """Convert capital movement to dictionary format."""
         return {
-            "tipo": self.tipo.value,
+            "tipo": CapitalType(self.tipo).value,
             "monto": self.monto,
             "institucion": self.institucion,
-            "estado": self.estado.value,
+            "estado": CapitalStatus(self.estado).value,
             "fecha": self.fecha.isoformat(),
             "fecha_retiro": self.fecha_retiro.isoformat() if self.fecha_retiro else None,
             "retorno": self.retorno,
@@ -122,10 +122,10 @@ class CapitalMovement(BaseModel):
         """
         return [
             self.fecha.strftime("%Y-%m-%d %H:%M:%S"),
-            self.tipo.value,
+            CapitalType(self.tipo).value,
             self.monto,
             self.institucion,
-            self.estado.value,
+            CapitalStatus(self.estado).value,
             self.fecha_retiro.strftime("%Y-%m-%d %H:%M:%S") if self.fecha_retiro else "",
             self.retorno,
             self.descripcion or ""
@@ -0,0 +1,122 @@
+"""
+Compact record types for bulk ledger data.
+
+Tuple-backed, validation-free counterparts of Transaction and CapitalMovement,
+used when decoding many trusted sheet rows at once. Untrusted input (LLM
+output) still goes through the Pydantic models.
+"""
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from .transaction import Transaction, TransactionType
+from .capital import CapitalMovement, CapitalType, CapitalStatus
+
+
+class TransactionRecord(NamedTuple):
+    """
+    A row of the Transacciones sheet (gasto or ingreso).
+    
+    Attributes:
+        fecha: Transaction date
+        monto: Amount
+        categoria: Normalized category
+        descripcion: Description (original message)
+        es_ingreso: True for income, False for expense
+    """
+    fecha: datetime
+    monto: float
+    categoria: str
+    descripcion: str
+    es_ingreso: bool
+    
+    @property
+    def tipo(self) -> TransactionType:
+        """Transaction type derived from the Es Ingreso flag."""
+        return TransactionType.INGRESO if self.es_ingreso else TransactionType.GASTO
+    
+    def to_model(self) -> Transaction:
+        """Convert to a fully validated Transaction."""
+        return Transaction(
+            tipo=self.tipo,
+            monto=self.monto,
+            categoria=self.categoria,
+            descripcion=self.descripcion or None,
+            fecha=self.fecha
+        )
+
+
+class BudgetRecord(NamedTuple):
+    """
+    A row of the Presupuestos sheet.
+    
+    Attributes:
+        fecha: Budget date
+        monto: Budgeted amount
+        categoria: Normalized category
+        descripcion: Description (original message)
+    """
+    fecha: datetime
+    monto: float
+    categoria: str
+    descripcion: str
+    
+    @property
+    def tipo(self) -> TransactionType:
+        """Always TransactionType.PRESUPUESTO."""
+        return TransactionType.PRESUPUESTO
+    
+    def to_model(self) -> Transaction:
+        """Convert to a fully validated Transaction."""
+        return Transaction(
+            tipo=TransactionType.PRESUPUESTO,
+            monto=self.monto,
+            categoria=self.categoria,
+            descripcion=self.descripcion or None,
+            fecha=self.fecha
+        )
+
+
+class CapitalRecord(NamedTuple):
+    """
+    A row of the Ahorros e Inversiones sheet.
+    
+    Attributes:
+        fecha: Deposit date
+        tipo: "ahorro" or "inversion"
+        monto: Initial amount deposited
+        institucion: Normalized institution
+        estado: "activo" or "retirado"
+        fecha_retiro: Withdrawal date, if withdrawn
+        retorno: Total returns earned
+        descripcion: Additional notes
+    """
+    fecha: datetime
+    tipo: str
+    monto: float
+    institucion: str
+    estado: str
+    fecha_retiro: Optional[datetime]
+    retorno: float
+    descripcion: str
+    
+    def get_current_value(self) -> float:
+        """Current value (principal + returns)."""
+        return self.monto + self.retorno
+    
+    def is_active(self) -> bool:
+        """True if the movement has not been withdrawn."""
+        return self.estado == CapitalStatus.ACTIVO.value
+    
+    def to_model(self) -> CapitalMovement:
+        """Convert to a fully validated CapitalMovement."""
+        return CapitalMovement(
+            tipo=CapitalType(self.tipo),
+            monto=self.monto,
+            institucion=self.institucion,
+            estado=CapitalStatus(self.estado),
+            fecha=self.fecha,
+            fecha_retiro=self.fecha_retiro,
+            retorno=self.retorno,
+            descripcion=self.descripcion or None
+        )
@@ -0,0 +1,102 @@
+"""
+Recurring transaction rule domain model.
+
+Represents a transaction that repeats on a schedule (salary, rent,
+subscriptions) so it does not have to be typed every period.
+"""
+
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Optional
+from dateutil.relativedelta import relativedelta
+from pydantic import BaseModel, Field, field_validator
+
+from .transaction import Transaction, TransactionType
+
+
+class Frequency(str, Enum):
+    """How often a recurring rule repeats."""
+    MENSUAL = "mensual"  # Monthly
+    QUINCENAL = "quincenal"  # Every two weeks
+    SEMANAL = "semanal"  # Weekly
+
+
+class RecurringRule(BaseModel):
+    """
+    A transaction that repeats on a schedule.
+    
+    Occurrence n falls n periods after the start date (monthly rules keep
+    the day of month, clamped to the month's last day). next_index is the
+    first occurrence not yet materialized, so catching up after downtime
+    never repeats an occurrence.
+    
+    Attributes:
+        id: Short rule id
+        user_id: Telegram user who created the rule
+        frecuencia: Frequency (mensual, quincenal, semanal)
+        tipo: Transaction type (gasto, ingreso, presupuesto)
+        monto: Amount of each occurrence
+        categoria: Transaction category
+        descripcion: Description written on each occurrence
+        inicio: Date of the first occurrence
+        next_index: First occurrence not yet materialized
+    """
+    id: str = Field(..., min_length=1, description="Rule id")
+    user_id: int = Field(..., description="Telegram user id")
+    frecuencia: Frequency = Field(..., description="Frequency")
+    tipo: TransactionType = Field(..., description="Transaction type")
+    monto: float = Field(..., gt=0, description="Amount of each occurrence")
+    categoria: str = Field(..., min_length=1, description="Transaction category")
+    descripcion: Optional[str] = Field(None, description="Description of each occurrence")
+    inicio: datetime = Field(default_factory=datetime.now, description="First occurrence")
+    next_index: int = Field(default=0, ge=0, description="First occurrence not yet materialized")
+    
+    @field_validator('tipo')
+    @classmethod
+    def validate_tipo(cls, v: TransactionType) -> TransactionType:
+        """Only operational transactions can recur (not ahorro/inversion)."""
+        if TransactionType(v) in (TransactionType.AHORRO, TransactionType.INVERSION):
+            raise ValueError("Only gasto, ingreso and presupuesto can be recurring")
+        return v
+    
+    def occurrence_date(self, index: int) -> datetime:
+        """
+        Date of an occurrence.
+        
+        Args:
+            index: Occurrence number (0 is the start date)
+        
+        Returns:
+            Occurrence date
+        """
+        frecuencia = Frequency(self.frecuencia)
+        if frecuencia == Frequency.MENSUAL:
+            return self.inicio + relativedelta(months=index)
+        days = 14 if frecuencia == Frequency.QUINCENAL else 7
+        return self.inicio + timedelta(days=days * index)
+    
+    def entry_id(self, index: int) -> str:
+        """Idempotency key of an occurrence in the outbox."""
+        return f"rule:{self.id}:{index}"
+    
+    def to_transaction(self, index: int) -> Transaction:
+        """
+        Build the Transaction of an occurrence.
+        
+        Args:
+            index: Occurrence number
+        
+        Returns:
+            Transaction dated at the occurrence
+        """
+        return Transaction(
+            tipo=self.tipo,
+            monto=self.monto,
+            categoria=self.categoria,
+            descripcion=self.descripcion,
+            fecha=self.occurrence_date(index)
+        )
+    
+    class Config:
+        """Pydantic configuration."""
+        use_enum_values = True
@@ -53,7 +53,7 @@ class Transaction(BaseModel):
     def to_dict(self) -> dict:
         """Convert transaction to dictionary format."""
         return {
-            "tipo": self.tipo.value,
+            "tipo": TransactionType(self.tipo).value,
             "monto": self.monto,
             "categoria": self.categoria,
             "descripcion": self.descripcion or "",
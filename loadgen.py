@@ -0,0 +1,425 @@
+"""
+Synthetic load generator and replay driver.
+
+Generates varied Spanish finance messages from templates (verbs per tipo,
+the usual amount spellings, categories and institutions with their aliases),
+each labelled with its ground truth in the corpus/parser_es.json format, and
+replays them as Telegram updates at a target rate to size the deployment.
+
+Replay targets:
+- in-process (default): the real handler stack (parser backend, outbox,
+  Google Sheets) with Telegram API calls answered locally, so no messages
+  are sent; needs the usual .env and a test spreadsheet
+- --url: a running bot's POST /replay/update route (enabled by REPLAY_TOKEN);
+  replies go to --chat-id, so use a test chat
+
+Usage:
+    python loadgen.py generate 1000 --seed 7 > data/load.json
+    python loadgen.py replay --count 500 --rate 20 --backend heuristic
+    python loadgen.py replay --input data/load.json --rate 50 --arrivals burst
+    python loadgen.py replay --url http://localhost:8000 --token SECRET --chat-id 123456 --rate 5
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from domain.canonical import DEFAULT_CATEGORIES, DEFAULT_INSTITUTIONS
+
+# Message templates per tipo; {monto} is the spelled amount, {objetivo} the
+# category or institution as typed
+TEMPLATES: Dict[str, List[str]] = {
+    "gasto": [
+        "Gasté {monto} en {objetivo}",
+        "gaste {monto} en {objetivo}",
+        "Pagué {monto} de {objetivo}",
+        "Compré {objetivo} por {monto}",
+        "Me costó {monto} el {objetivo}",
+        "Gasto de {monto} en {objetivo}",
+        "Pago de {objetivo} por {monto}",
+    ],
+    "ingreso": [
+        "Recibí {monto} de {objetivo}",
+        "Me pagaron {monto} de {objetivo}",
+        "Ingreso de {monto} por {objetivo}",
+        "Me consignaron {monto} del {objetivo}",
+        "Cobré {monto} por {objetivo}",
+        "recibi {monto} de {objetivo}",
+    ],
+    "presupuesto": [
+        "Presupuesto de {monto} para {objetivo}",
+        "Presupuesto mensual de {monto} para {objetivo}",
+        "Mi presupuesto para {objetivo} es de {monto}",
+        "presupuesto {objetivo} {monto}",
+    ],
+    "ahorro": [
+        "Ahorré {monto} en {objetivo}",
+        "Guardé {monto} en {objetivo}",
+        "Ahorro de {monto} en {objetivo}",
+        "ahorre {monto} en {objetivo}",
+    ],
+    "inversion": [
+        "Invertí {monto} en {objetivo}",
+        "Inversión de {monto} en {objetivo}",
+        "Abrí una inversión de {monto} en {objetivo}",
+        "invertí {monto} en {objetivo}",
+    ],
+}
+
+# Relative frequency of each tipo in real traffic (expenses dominate)
+TIPO_WEIGHTS = {"gasto": 0.62, "ingreso": 0.13, "presupuesto": 0.09, "ahorro": 0.10, "inversion": 0.06}
+
+# Amount range (min, max) in pesos per tipo
+AMOUNT_RANGES = {
+    "gasto": (2_000, 600_000),
+    "ingreso": (50_000, 8_000_000),
+    "presupuesto": (100_000, 3_000_000),
+    "ahorro": (50_000, 5_000_000),
+    "inversion": (200_000, 20_000_000),
+}
+
+INCOME_CATEGORIES: Dict[str, List[str]] = {
+    "salario": DEFAULT_CATEGORIES["salario"],
+    "freelance": ["proyecto", "consultoria"],
+    "ventas": ["venta"],
+    "intereses": ["rendimientos"],
+}
+
+EXPENSE_CATEGORIES: Dict[str, List[str]] = {
+    name: aliases for name, aliases in DEFAULT_CATEGORIES.items() if name != "salario"
+}
+
+
+def round_amount(amount: float) -> int:
+    """Round to the precision people type (two significant digits)."""
+    magnitude = 10 ** max(len(str(int(amount))) - 2, 0)
+    return max(int(round(amount / magnitude)) * magnitude, 1_000)
+
+
+def spell_amount(amount: int, rng: random.Random) -> str:
+    """
+    Write an amount the way people type it.
+    
+    Args:
+        amount: Amount in pesos
+        rng: Random source
+    
+    Returns:
+        "50 mil", "200k", "$45.000", "45000", "1 millón", "1.5 millones"...
+    """
+    styles = ["plain", "dots"]
+    if amount % 1_000 == 0 and amount < 1_000_000:
+        styles += ["mil", "mil", "k"]
+    if amount >= 1_000_000 and amount % 100_000 == 0:
+        styles += ["millones", "millones"]
+    style = rng.choice(styles)
+    
+    if style == "mil":
+        return f"{amount // 1_000} mil"
+    if style == "k":
+        return f"{amount // 1_000}k"
+    if style == "millones":
+        millions = amount / 1_000_000
+        number = f"{millions:g}"
+        return f"{number} millón" if millions == 1 else f"{number} millones"
+    if style == "dots":
+        return "$" + f"{amount:,}".replace(",", ".")
+    return str(amount)
+
+
+def generate_message(rng: random.Random) -> Dict[str, Any]:
+    """
+    Generate one labelled message.
+    
+    Args:
+        rng: Random source
+    
+    Returns:
+        {"message", "tipo", "monto", and "categoria" or "institucion"} with
+        canonical names as labels
+    """
+    tipo = rng.choices(list(TIPO_WEIGHTS), weights=list(TIPO_WEIGHTS.values()))[0]
+    
+    if tipo in ("ahorro", "inversion"):
+        names = DEFAULT_INSTITUTIONS
+        label_field = "institucion"
+    else:
+        names = INCOME_CATEGORIES if tipo == "ingreso" else EXPENSE_CATEGORIES
+        label_field = "categoria"
+    label = rng.choice(list(names))
+    typed = rng.choice([label, *names[label]])
+    
+    low, high = AMOUNT_RANGES[tipo]
+    # Log-uniform: small amounts are far more common than large ones
+    amount = round_amount(low * (high / low) ** rng.random())
+    
+    message = rng.choice(TEMPLATES[tipo]).format(monto=spell_amount(amount, rng), objetivo=typed)
+    return {"message": message, "tipo": tipo, "monto": amount, label_field: label}
+
+
+def generate(count: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Generate labelled messages.
+    
+    Args:
+        count: Number of messages
+        seed: Random seed, for reproducible runs
+    
+    Returns:
+        Messages in the corpus format
+    """
+    rng = random.Random(seed)
+    return [generate_message(rng) for _ in range(count)]
+
+
+def arrival_offsets(count: int, rate: float, arrivals: str, seed: Optional[int] = None) -> Iterator[float]:
+    """
+    Send times in seconds from the start of the run.
+    
+    Args:
+        count: Number of messages
+        rate: Mean messages per second
+        arrivals: "constant", "poisson" (exponential gaps) or "burst"
+            (groups of 10 at once, same mean rate)
+        seed: Random seed
+    
+    Yields:
+        Offset of each message
+    """
+    rng = random.Random(seed)
+    offset = 0.0
+    for index in range(count):
+        yield offset
+        if arrivals == "poisson":
+            offset += rng.expovariate(rate)
+        elif arrivals == "burst":
+            if index % 10 == 9:
+                offset += 10 / rate
+        else:
+            offset += 1 / rate
+
+
+def make_update(update_id: int, user_id: int, chat_id: int, text: str) -> Dict[str, Any]:
+    """Telegram Update JSON for a private text message."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Carga"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Carga"},
+            "text": text,
+        },
+    }
+
+
+def _local_api():
+    """Telegram request backend that answers every Bot API call locally."""
+    from telegram.request import BaseRequest
+    
+    class LocalBotApi(BaseRequest):
+        """Answers Bot API calls without network and records the replies."""
+        
+        def __init__(self):
+            self.calls: Counter = Counter()
+            self.replies: List[str] = []
+        
+        @property
+        def read_timeout(self) -> Optional[float]:
+            return None
+        
+        async def initialize(self) -> None:
+            pass
+        
+        async def shutdown(self) -> None:
+            pass
+        
+        async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+            api_method = url.rsplit("/", 1)[-1]
+            self.calls[api_method] += 1
+            parameters = request_data.parameters if request_data else {}
+            
+            if api_method == "getMe":
+                result: Any = {"id": 1, "is_bot": True, "first_name": "Load", "username": "loadgen_bot"}
+            elif api_method in ("sendMessage", "editMessageText"):
+                self.replies.append(str(parameters.get("text", "")))
+                result = {"message_id": len(self.replies), "date": int(time.time()),
+                          "chat": {"id": parameters.get("chat_id", 0), "type": "private"},
+                          "text": parameters.get("text", "")}
+            else:
+                result = True
+            return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+    
+    return LocalBotApi()
+
+
+async def _run_schedule(messages: List[Dict[str, Any]], rate: float, arrivals: str, seed: Optional[int],
+                        users: int, send) -> List[float]:
+    """
+    Send each message at its arrival time, without waiting for earlier ones.
+    
+    Returns:
+        End-to-end latency (ms) of each message
+    """
+    latencies: List[float] = []
+    user_ids = itertools.cycle(range(1_000_001, 1_000_001 + users))
+    started = time.perf_counter()
+    tasks = []
+    
+    async def timed(index: int, user_id: int, text: str) -> None:
+        sent = time.perf_counter()
+        await send(index, user_id, text)
+        latencies.append((time.perf_counter() - sent) * 1000)
+    
+    for index, (offset, item) in enumerate(zip(arrival_offsets(len(messages), rate, arrivals, seed), messages)):
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(timed(index + 1, next(user_ids), item["message"])))
+    
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies
+
+
+async def replay_in_process(messages: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """
+    Replay through the bot's own handler stack with a local Bot API.
+    
+    Returns:
+        Report fields
+    """
+    from telegram import Update
+    from telegram.ext import Application
+    
+    from bot.handlers import initialize_services, setup_handlers, shutdown_services
+    from services.config import settings
+    
+    if args.backend:
+        settings.LLM_BACKEND = args.backend
+    
+    api = _local_api()
+    application = Application.builder().token(settings.BOT_TOKEN).request(api).get_updates_request(api).build()
+    if not await initialize_services():
+        raise RuntimeError("Services failed to initialize (check .env and the spreadsheet)")
+    setup_handlers(application)
+    await application.initialize()
+    
+    async def send(index: int, user_id: int, text: str) -> None:
+        update = Update.de_json(make_update(index, user_id, user_id, text), application.bot)
+        await application.process_update(update)
+    
+    try:
+        started = time.perf_counter()
+        latencies = await _run_schedule(messages, args.rate, args.arrivals, args.seed, args.users, send)
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.shutdown()
+        await shutdown_services()
+    
+    outcomes = Counter("ok" if reply.startswith("✅") else "error" if reply.startswith("❌")
+                       else "busy" if reply.startswith("⏳") else "other"
+                       for reply in api.replies)
+    return {"latencies": latencies, "elapsed": elapsed, "outcomes": dict(outcomes), "api_calls": dict(api.calls)}
+
+
+async def replay_http(messages: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """
+    Replay against a running bot's POST /replay/update route.
+    
+    Returns:
+        Report fields
+    """
+    import httpx
+    
+    outcomes: Counter = Counter()
+    endpoint = args.url.rstrip("/") + "/replay/update"
+    
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=200)) as client:
+        async def send(index: int, user_id: int, text: str) -> None:
+            payload = make_update(index, user_id, args.chat_id, text)
+            try:
+                response = await client.post(endpoint, json=payload, headers={"X-Replay-Token": args.token})
+                outcomes["ok" if response.status_code == 200 else f"http {response.status_code}"] += 1
+            except httpx.HTTPError as e:
+                outcomes[type(e).__name__] += 1
+        
+        started = time.perf_counter()
+        latencies = await _run_schedule(messages, args.rate, args.arrivals, args.seed, args.users, send)
+        elapsed = time.perf_counter() - started
+    
+    return {"latencies": latencies, "elapsed": elapsed, "outcomes": dict(outcomes)}
+
+
+def print_report(messages: List[Dict[str, Any]], args, report: Dict[str, Any]) -> None:
+    """Print throughput, latency percentiles and outcomes of a replay."""
+    latencies = sorted(report["latencies"])
+    
+    def percentile(fraction: float) -> float:
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] if latencies else 0.0
+    
+    print("\n" + "=" * 70)
+    print(f"🚚 REPLAY - {len(messages)} mensajes, objetivo {args.rate:g}/s ({args.arrivals}), {args.users} usuarios")
+    print("=" * 70)
+    print(f"   Duración: {report['elapsed']:.1f}s   Tasa lograda: {len(latencies) / max(report['elapsed'], 1e-9):.1f}/s")
+    if latencies:
+        print(f"   Latencia ms: media {statistics.mean(latencies):.1f}, p50 {percentile(0.5):.1f}, "
+              f"p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, máx {latencies[-1]:.1f}")
+    print(f"   Resultados: {report['outcomes']}")
+    if "api_calls" in report:
+        print(f"   Llamadas Bot API: {report['api_calls']}")
+    print()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Synthetic load generator and replay driver")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    generate_parser = commands.add_parser("generate", help="Write labelled messages as JSON to stdout")
+    generate_parser.add_argument("count", type=int)
+    generate_parser.add_argument("--seed", type=int)
+    
+    replay_parser = commands.add_parser("replay", help="Send messages as Telegram updates")
+    replay_parser.add_argument("--input", help="Messages file (default: generate --count messages)")
+    replay_parser.add_argument("--count", type=int, default=200)
+    replay_parser.add_argument("--seed", type=int)
+    replay_parser.add_argument("--rate", type=float, default=10.0, help="Mean messages per second")
+    replay_parser.add_argument("--arrivals", choices=["constant", "poisson", "burst"], default="poisson")
+    replay_parser.add_argument("--users", type=int, default=20, help="Distinct simulated users")
+    replay_parser.add_argument("--backend", help="Parser backend for in-process replay (e.g. heuristic)")
+    replay_parser.add_argument("--url", help="Running bot base URL (uses POST /replay/update)")
+    replay_parser.add_argument("--token", default="", help="REPLAY_TOKEN of the running bot")
+    replay_parser.add_argument("--chat-id", type=int, help="Test chat that receives the replies (with --url)")
+    
+    args = parser.parse_args()
+    
+    if args.command == "generate":
+        json.dump(generate(args.count, args.seed), sys.stdout, ensure_ascii=False, indent=1)
+        print()
+        return
+    
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            messages = json.load(f)
+    else:
+        messages = generate(args.count, args.seed)
+    
+    if args.url:
+        if args.chat_id is None:
+            parser.error("--url needs --chat-id")
+        report = asyncio.run(replay_http(messages, args))
+    else:
+        report = asyncio.run(replay_in_process(messages, args))
+    print_report(messages, args, report)
+
+
+if __name__ == "__main__":
+    main()
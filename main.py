@@ -6,15 +6,21 @@ Starts the Telegram bot and optional FastAPI server.
 
 import logging
 import asyncio
+import time
 from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from telegram import Update
 from telegram.ext import Application
 
-from bot.handlers import setup_handlers, initialize_services
-from bot.bot_instance import bot_app
+from bot.handlers import setup_handlers, initialize_services, shutdown_services
+from bot.bot_instance import get_bot_app
 from services.config import settings
+from services.container import container
+from services.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +31,41 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def start_bot(bot_app: Application) -> bool:
+    """
+    Initialize services and the Telegram bot concurrently.
+    
+    Sheets/OpenAI warm-up and the Telegram handshake (get_me) are independent
+    network round trips, so they run at the same time. The per-phase timing
+    breakdown is recorded in container.startup_timings.
+    
+    Args:
+        bot_app: The Telegram Application instance
+    
+    Returns:
+        True if services initialized successfully, False otherwise
+    """
+    started = time.perf_counter()
+    
+    async def initialize_bot():
+        phase_started = time.perf_counter()
+        await bot_app.initialize()
+        container.startup_timings["telegram.initialize"] = round((time.perf_counter() - phase_started) * 1000, 1)
+    
+    services_ok, _ = await asyncio.gather(initialize_services(), initialize_bot())
+    
+    # Setup bot handlers
+    setup_handlers(bot_app)
+    
+    phase_started = time.perf_counter()
+    await bot_app.start()
+    container.startup_timings["telegram.start"] = round((time.perf_counter() - phase_started) * 1000, 1)
+    container.startup_timings["startup.total"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    logger.info(f"Startup timings (ms): {container.format_timings()}")
+    return services_ok
+
+
 # FastAPI application with lifespan events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,17 +76,12 @@ async def lifespan(app: FastAPI):
     """
     # Startup
     logger.info("Starting Dacarsoft Finance Bot...")
+    bot_app = get_bot_app()
     
-    # Initialize services (Google Sheets)
-    if not initialize_services():
+    # Initialize services (Google Sheets, OpenAI) and the bot concurrently
+    if not await start_bot(bot_app):
         logger.error("Failed to initialize services. Bot may not function correctly.")
     
-    # Setup bot handlers
-    setup_handlers(bot_app)
-    
-    # Start the bot
-    await bot_app.initialize()
-    await bot_app.start()
     await bot_app.updater.start_polling(drop_pending_updates=True)
     
     logger.info(f"Bot started successfully: @{settings.BOT_USERNAME}")
@@ -57,6 +93,7 @@ async def lifespan(app: FastAPI):
     await bot_app.updater.stop()
     await bot_app.stop()
     await bot_app.shutdown()
+    await shutdown_services()
     logger.info("Bot stopped")
 
 
@@ -86,7 +123,9 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "bot_running": bot_app.running
+        "bot_running": get_bot_app().running,
+        "startup_ms": container.startup_timings,
+        "sheets_transport": container.sheets.transport.stats() if container.sheets.transport else None
     }
 
 
@@ -94,7 +133,7 @@ async def health_check():
 async def bot_info():
     """Get bot information."""
     try:
-        bot = await bot_app.bot.get_me()
+        bot = await get_bot_app().bot.get_me()
         return {
             "id": bot.id,
             "username": bot.username,
@@ -107,6 +146,135 @@ async def bot_info():
         return {"error": str(e)}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text format."""
+    metrics.set("outbox_pending", container.outbox.pending_count)
+    return metrics.render()
+
+
+def require_admin(x_admin_token: str) -> None:
+    """
+    Guard of the routes that expose user data.
+    
+    They are only enabled when ADMIN_TOKEN is set (404 otherwise), and the
+    request must carry it in X-Admin-Token (403 otherwise).
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/debug/loop")
+async def debug_loop(x_admin_token: str = Header(default="")):
+    """
+    Event loop stall monitor: worst lag and the latest stalls with their stacks and updates.
+    
+    Stalls include message texts, so this requires the admin token (see require_admin).
+    """
+    require_admin(x_admin_token)
+    return container.loop_monitor.snapshot()
+
+
+@app.get("/admin/usage")
+async def admin_usage(days: int = 7, user_id: Optional[str] = None, x_admin_token: str = Header(default="")):
+    """
+    LLM token and cost usage per user and per model/profile over the last days.
+    
+    Requires the admin token (see require_admin). Includes each user's
+    tokens today and daily budget.
+    """
+    require_admin(x_admin_token)
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be at least 1")
+    
+    today = date.today()
+    return container.usage.report(today - timedelta(days=days - 1), today, user_id)
+
+
+@app.get("/api/ledger")
+async def ledger_query(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    periodo: Optional[str] = None,
+    tipo: Optional[str] = None,
+    categoria: Optional[str] = None,
+    limit: int = 500,
+    x_admin_token: str = Header(default="")
+):
+    """
+    Query the ledger by date range.
+    
+    Use desde/hasta (YYYY-MM-DD, hasta inclusive) or a periodo such as
+    "semana pasada", "octubre" or "2026-03"; filter by tipo (gasto, ingreso,
+    presupuesto, ahorro, inversion) and categoria (or institution).
+    Requires the admin token (see require_admin).
+    """
+    from services.ledger import parse_period, record_to_dict
+    
+    require_admin(x_admin_token)
+    
+    if periodo:
+        period = parse_period(periodo)
+        if period is None:
+            raise HTTPException(status_code=400, detail=f"Periodo no reconocido: {periodo}")
+        start, end = period
+    else:
+        start = datetime.combine(desde, datetime.min.time()) if desde else None
+        end = datetime.combine(hasta, datetime.min.time()) + timedelta(days=1) if hasta else None
+    
+    if categoria:
+        kind = container.canonicalizer.INSTITUTION if tipo in ("ahorro", "inversion") else container.canonicalizer.CATEGORY
+        categoria = container.canonicalizer.canonical(kind, categoria)
+    
+    await asyncio.to_thread(container.ledger.ensure_range, start, end)
+    records = container.ledger.query(start, end, tipo, categoria)
+    
+    return {
+        "desde": start.isoformat() if start else None,
+        "hasta": end.isoformat() if end else None,
+        "count": len(records),
+        "total": round(sum(record.monto for record in records), 2),
+        "items": [record_to_dict(record) for record in records[:limit]]
+    }
+
+
+@app.get("/api/search")
+async def search_ledger(q: str, tipo: Optional[str] = None, limit: int = 50, x_admin_token: str = Header(default="")):
+    """
+    Full-text search over transaction descriptions and categories.
+    
+    Every word of q must match (a word with no exact match also finds the
+    words it prefixes); results are newest first. Requires the admin token
+    (see require_admin).
+    """
+    require_admin(x_admin_token)
+    await asyncio.to_thread(container.search.ensure_loaded)
+    count, total, items = container.search.search(q, tipo=tipo, limit=limit)
+    return {"query": q, "count": count, "total": total, "items": items}
+
+
+@app.post("/replay/update")
+async def replay_update(payload: dict, x_replay_token: str = Header(default="")):
+    """
+    Process a Telegram update sent by the load generator (loadgen.py replay --url).
+    
+    Runs the update through the handlers and answers when they finish, so
+    the caller measures end-to-end latency. Only enabled when REPLAY_TOKEN
+    is set, and the request must carry it in X-Replay-Token.
+    """
+    if not settings.REPLAY_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_replay_token != settings.REPLAY_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid replay token")
+    
+    bot_app = get_bot_app()
+    started = time.perf_counter()
+    await bot_app.process_update(Update.de_json(payload, bot_app.bot))
+    return {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
 async def run_bot_standalone():
     """
     Run the bot in standalone mode (without FastAPI).
@@ -114,19 +282,15 @@ async def run_bot_standalone():
     Use this if you don't need the REST API.
     """
     logger.info("Starting bot in standalone mode...")
+    bot_app = get_bot_app()
     
-    # Initialize services
-    if not initialize_services():
+    # Initialize services and start the bot
+    if not await start_bot(bot_app):
         logger.error("Failed to initialize services. Exiting.")
+        await bot_app.stop()
+        await bot_app.shutdown()
         return
     
-    # Setup handlers
-    setup_handlers(bot_app)
-    
-    # Start the bot
-    await bot_app.initialize()
-    await bot_app.start()
-    
     logger.info(f"Bot started: @{settings.BOT_USERNAME}")
     logger.info("Press Ctrl+C to stop")
     
@@ -145,6 +309,7 @@ async def run_bot_standalone():
         await bot_app.updater.stop()
         await bot_app.stop()
         await bot_app.shutdown()
+        await shutdown_services()
         logger.info("Bot stopped")
 
 
@@ -0,0 +1,107 @@
+"""
+Migration of the legacy Gastos / Ingresos sheets into Transacciones.
+
+Copies every row of the old separate sheets into the unified Transacciones
+layout (see SHEETS_STRUCTURE_COMPARISON.md), in large quota-paced batches
+with a local checkpoint, then verifies the result. Stop the bot first (or
+run /recalcular afterwards) so its ledger picks up the migrated rows. The
+legacy sheets are only read; delete them once the report is OK.
+
+Usage:
+    python migrate_legacy.py run                 # start, or resume after an interruption
+    python migrate_legacy.py run --chunk-rows 5000 --rate 50
+    python migrate_legacy.py status              # checkpoint progress, no API calls
+    python migrate_legacy.py report              # row counts, totals and checksums
+    python migrate_legacy.py run --restart       # ignore the checkpoint and start over
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from services.migration import LEGACY_SHEETS, LegacyMigrator
+from services.sheets_service import SheetsService
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+logger = logging.getLogger(__name__)
+
+
+def connect() -> SheetsService:
+    """Authenticate, connect and make sure Transacciones exists, or exit."""
+    sheets = SheetsService()
+    if not (sheets.authenticate() and sheets.connect_spreadsheet() and sheets.initialize_sheets()):
+        print("❌ No se pudo conectar a Google Sheets (revisa credentials.json y SPREADSHEET_ID)")
+        sys.exit(1)
+    return sheets
+
+
+def print_progress(sheet_name: str, migrated: int, read: int) -> None:
+    """Progress line after every window."""
+    print(f"   {sheet_name}: {migrated} filas migradas ({read} leídas)", flush=True)
+
+
+def print_report(report: dict) -> None:
+    """Print a checksum report."""
+    print("\n" + "=" * 70)
+    print("🔎 VERIFICACIÓN DE LA MIGRACIÓN")
+    print("=" * 70)
+    for sheet_name, entry in report["sheets"].items():
+        source, target = entry["source"], entry["target"]
+        print(f"\n   {'✅' if entry['ok'] else '❌'} {sheet_name}")
+        print(f"      Origen:        {source['rows']} filas, {source['valid']} válidas, "
+              f"total ${source['total']:,.2f}, checksum {source['digest']}")
+        print(f"      Transacciones: {target['rows']} filas, {target['valid']} válidas, "
+              f"total ${target['total']:,.2f}, checksum {target['digest']}")
+        if entry["missing"] or entry["duplicated"]:
+            print(f"      Faltan {entry['missing']} filas, {entry['duplicated']} duplicadas")
+    if not report["sheets"]:
+        print("\n   No hay hojas Gastos / Ingresos en el spreadsheet")
+    print()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Migrate legacy Gastos/Ingresos sheets into Transacciones")
+    parser.add_argument("command", choices=["run", "status", "report"])
+    parser.add_argument("--sheets", nargs="+", choices=list(LEGACY_SHEETS), help="Legacy sheets (default: all)")
+    parser.add_argument("--chunk-rows", type=int, help="Rows per read and append (default MIGRATION_CHUNK_ROWS)")
+    parser.add_argument("--rate", type=int, help="API calls per minute (default MIGRATION_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    
+    # The checkpoint only needs the spreadsheet id, not a connection
+    sheets = SheetsService() if args.command == "status" else connect()
+    try:
+        migrator = LegacyMigrator(sheets, chunk_rows=args.chunk_rows, requests_per_minute=args.rate,
+                                  reset=args.restart)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    if args.command == "status":
+        print(json.dumps(migrator.state["sheets"], indent=2, ensure_ascii=False))
+        return
+    
+    if args.command == "run":
+        print("🚚 Migrando hojas antiguas a Transacciones...")
+        result = migrator.run(args.sheets, progress=print_progress)
+        for sheet_name, entry in result.items():
+            print(f"   ✅ {sheet_name}: {entry['migrated']} filas, total ${entry['total']:,.2f}"
+                  + (f", {entry['invalid']} con fecha o monto ilegible" if entry["invalid"] else ""))
+    
+    report = migrator.checksum_report(args.sheets)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Admission control for message processing.
+
+A bounded in-process work queue in front of parsing and persistence, so a
+user flooding the bot cannot take every LLM and Sheets slot. Each user has
+their own FIFO queue; free slots are handed out by deficit round robin
+(each visit grants a quantum of credit, and a message costs more the longer
+it is), users are capped at a number of in-flight messages, and new
+messages are shed when the queues are full or their predicted queue time
+would break the SLO. Queue depth, in-flight work, wait times and shed
+messages are exported as metrics.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from services.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Wait buckets in seconds
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+# Weight of each finished job in the service time estimate
+_SERVICE_ALPHA = 0.2
+
+metrics.describe("admission_queue_depth", "Messages waiting for a processing slot")
+metrics.describe("admission_inflight", "Messages being processed")
+metrics.describe("admission_wait_seconds", "Time messages waited for a processing slot")
+metrics.describe("admission_shed_total", "Messages rejected by admission control by reason")
+
+
+class Overloaded(Exception):
+    """Raised when a message is shed instead of queued."""
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Job:
+    """A queued message: its cost and the future resolved when it gets a slot."""
+    
+    __slots__ = ("user", "cost", "enqueued_at", "granted")
+    
+    def __init__(self, user: str, cost: int):
+        self.user = user
+        self.cost = cost
+        self.enqueued_at = time.perf_counter()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    """
+    Per-user fair queueing with in-flight limits and load shedding.
+    
+    Runs entirely on the event loop, so it needs no locks.
+    """
+    
+    def __init__(self, workers: Optional[int] = None, user_inflight: Optional[int] = None,
+                 queue_size: Optional[int] = None, user_queue_size: Optional[int] = None,
+                 queue_slo: Optional[float] = None, quantum: int = 1):
+        """
+        Initialize the controller.
+        
+        Args:
+            workers: Messages processed at once
+            user_inflight: Messages of one user processed at once (1 keeps them in order)
+            queue_size: Messages waiting in total
+            user_queue_size: Messages waiting per user
+            queue_slo: Seconds a message may wait; predicted longer waits are shed
+            quantum: Credit granted to a user on each round robin visit
+        """
+        self.workers = workers or settings.ADMISSION_WORKERS
+        self.user_inflight = user_inflight or settings.ADMISSION_USER_INFLIGHT
+        self.queue_size = queue_size or settings.ADMISSION_QUEUE_SIZE
+        self.user_queue_size = user_queue_size or settings.ADMISSION_USER_QUEUE_SIZE
+        self.queue_slo = queue_slo or settings.ADMISSION_QUEUE_SLO
+        self.quantum = quantum
+        self.service_time: Optional[float] = None  # Seconds per job, moving average
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._active: Deque[str] = deque()  # Users with queued jobs, in round robin order
+        self._deficits: Dict[str, int] = {}
+        self._inflight: Dict[str, int] = {}
+        self._running = 0
+        self._queued = 0
+    
+    @property
+    def queued(self) -> int:
+        """Messages waiting for a slot."""
+        return self._queued
+    
+    def predicted_wait(self, user: str) -> float:
+        """
+        Seconds a new job of a user would wait, under round robin.
+        
+        The job is served in the user's (len(queue) + 1)-th round, and each
+        round serves at most one job per other user with work queued; the
+        user's own jobs also go at most user_inflight at a time. Nothing is
+        predicted before the first job finishes.
+        """
+        if not self.service_time or (self._running < self.workers and not self._queued):
+            return 0.0
+        rounds = len(self._queues.get(user, ())) + 1
+        ahead = sum(min(len(queue), rounds) for other, queue in self._queues.items() if other != user)
+        return max((ahead + rounds) / self.workers, rounds / self.user_inflight) * self.service_time
+    
+    def _publish(self) -> None:
+        """Update the queue gauges."""
+        metrics.set("admission_queue_depth", self._queued)
+        metrics.set("admission_inflight", self._running)
+    
+    def _next_job(self) -> Optional[_Job]:
+        """Pick the next job by deficit round robin (None if every queued user is at their limit)."""
+        # Enough visits for every user to build up credit for the costliest head job
+        max_cost = max((self._queues[user][0].cost for user in self._active), default=0)
+        for _ in range(len(self._active) * (max_cost // self.quantum + 2)):
+            user = self._active[0]
+            queue = self._queues[user]
+            if self._inflight.get(user, 0) < self.user_inflight and queue[0].cost <= self._deficits[user]:
+                job = queue.popleft()
+                self._deficits[user] -= job.cost
+                if not queue:
+                    # An idle user keeps no credit
+                    self._active.popleft()
+                    del self._queues[user]
+                    del self._deficits[user]
+                return job
+            self._active.rotate(-1)
+            visited = self._active[0]
+            if self._inflight.get(visited, 0) < self.user_inflight:
+                self._deficits[visited] += self.quantum
+        return None
+    
+    def _dispatch(self) -> None:
+        """Hand free slots to queued jobs."""
+        while self._running < self.workers and self._active:
+            job = self._next_job()
+            if job is None:
+                break
+            self._queued -= 1
+            self._running += 1
+            self._inflight[job.user] = self._inflight.get(job.user, 0) + 1
+            job.granted.set_result(None)
+        self._publish()
+    
+    def _release(self, user: str, started: Optional[float]) -> None:
+        """Free a slot after a job finishes (started is None if it never ran)."""
+        self._running -= 1
+        self._inflight[user] -= 1
+        if not self._inflight[user]:
+            del self._inflight[user]
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self.service_time = elapsed if self.service_time is None else (
+                self.service_time + _SERVICE_ALPHA * (elapsed - self.service_time))
+        self._dispatch()
+    
+    def _discard(self, job: _Job) -> None:
+        """Remove a job that was cancelled while queued."""
+        queue = self._queues.get(job.user)
+        if queue is None or job not in queue:
+            return
+        queue.remove(job)
+        self._queued -= 1
+        if not queue:
+            self._active.remove(job.user)
+            del self._queues[job.user]
+            del self._deficits[job.user]
+        self._publish()
+    
+    def _shed(self, user: str, reason: str) -> None:
+        """Count a rejected job and raise."""
+        metrics.inc("admission_shed_total", reason=reason)
+        logger.warning(f"Shedding message of user {user} ({reason}, {self._queued} queued)")
+        raise Overloaded(reason)
+    
+    async def run(self, user_id, func: Callable[[], Awaitable[Any]], cost: int = 1) -> Any:
+        """
+        Queue a job for a user and run it when it gets a slot.
+        
+        Args:
+            user_id: Telegram user id
+            func: Coroutine function doing the work
+            cost: Relative cost of the job (in quanta)
+        
+        Returns:
+            Whatever func returns
+        
+        Raises:
+            Overloaded: If the job is shed instead of queued
+        """
+        user = str(user_id)
+        queue = self._queues.get(user)
+        if self._queued >= self.queue_size:
+            self._shed(user, "queue_full")
+        if queue is not None and len(queue) >= self.user_queue_size:
+            self._shed(user, "user_queue_full")
+        if self.predicted_wait(user) > self.queue_slo:
+            self._shed(user, "slo")
+        
+        job = _Job(user, max(cost, 1))
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._deficits[user] = 0
+            self._active.append(user)
+        queue.append(job)
+        self._queued += 1
+        self._dispatch()
+        
+        try:
+            await job.granted
+        except asyncio.CancelledError:
+            if job.granted.cancelled():
+                self._discard(job)
+            else:
+                # Granted just before the cancellation reached us
+                self._release(user, None)
+            raise
+        
+        started = time.perf_counter()
+        metrics.observe("admission_wait_seconds", started - job.enqueued_at, buckets=WAIT_BUCKETS)
+        try:
+            return await func()
+        finally:
+            self._release(user, started)
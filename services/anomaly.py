@@ -0,0 +1,206 @@
+"""
+Streaming spending-anomaly detection.
+
+Keeps running statistics of gastos per categoria: the all-time mean and
+variance (Welford) and an exponentially weighted mean and variance that
+follow recent habits. Each new gasto is compared against them and then
+folded in, in O(1) time and constant memory per categoria, so the write
+path never scans history. The state is persisted in
+DATA_DIR/anomaly_stats.json and can be rebuilt by replaying the ledger.
+
+Statistics are kept per spreadsheet, not per Telegram user: the ledger has
+no user column, so everyone writing to the same spreadsheet shares them,
+and a rebuild from the ledger gives the same numbers as the live stream.
+"""
+
+import json
+import logging
+import math
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes
+_FORMAT_VERSION = 2
+
+# Save to disk after this many updates (also saved at shutdown)
+_SAVE_EVERY = 50
+
+metrics.describe("spending_anomalies_total", "Gastos flagged as out of pattern")
+
+
+class SpendingStats:
+    """
+    Running statistics of the gastos in one categoria.
+    """
+    
+    __slots__ = ("count", "mean", "m2", "ewma", "ewm_var")
+    
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 ewma: float = 0.0, ewm_var: float = 0.0):
+        self.count = count
+        self.mean = mean        # All-time mean
+        self.m2 = m2            # Sum of squared deviations from the mean (Welford)
+        self.ewma = ewma        # Exponentially weighted mean
+        self.ewm_var = ewm_var  # Exponentially weighted variance
+    
+    @property
+    def variance(self) -> float:
+        """All-time sample variance."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+    
+    def update(self, value: float, alpha: float) -> None:
+        """
+        Fold one amount into the statistics.
+        
+        Args:
+            value: Amount of the gasto
+            alpha: Weight of the new value in the exponentially weighted stats
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        
+        if self.count == 1:
+            self.ewma, self.ewm_var = value, 0.0
+            return
+        delta = value - self.ewma
+        increment = alpha * delta
+        self.ewma += increment
+        self.ewm_var = (1 - alpha) * (self.ewm_var + delta * increment)
+    
+    def to_list(self) -> List[float]:
+        """Compact form for the JSON file."""
+        return [self.count, self.mean, self.m2, self.ewma, self.ewm_var]
+
+
+def _format_ratio(ratio: float) -> str:
+    """3.0 → "3", 2.54 → "2.5", 12.3 → "12"."""
+    if ratio >= 10:
+        return f"{ratio:.0f}"
+    return f"{ratio:.1f}".rstrip("0").rstrip(".")
+
+
+class AnomalyDetector:
+    """
+    Per-categoria spending statistics of the spreadsheet with out-of-pattern alerts.
+    
+    A gasto is flagged when the categoria has at least ANOMALY_MIN_SAMPLES
+    previous gastos and the amount is both ANOMALY_RATIO times the recent
+    (exponentially weighted) average and ANOMALY_Z_SCORE deviations above it.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the detector and load persisted statistics.
+        
+        Args:
+            path: Statistics file (defaults to DATA_DIR/anomaly_stats.json)
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "anomaly_stats.json"
+        self.alpha = settings.ANOMALY_EWMA_ALPHA
+        # categoria → statistics
+        self._stats: Dict[str, SpendingStats] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self) -> None:
+        """Load statistics from disk."""
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") != _FORMAT_VERSION:
+                return
+            self._stats = {categoria: SpendingStats(*values) for categoria, values in data["stats"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Error loading anomaly statistics from {self.path}: {e}")
+    
+    def save(self) -> None:
+        """Write the statistics to disk atomically, if they changed since the last save."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            stats = {categoria: entry.to_list() for categoria, entry in self._stats.items()}
+            self._unsaved = 0
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"version": _FORMAT_VERSION, "stats": stats}, ensure_ascii=False),
+                            encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def _alert(self, categoria: str, monto: float, entry: Optional[SpendingStats]) -> Optional[str]:
+        """Alert line for an amount compared with the statistics before it."""
+        if entry is None or entry.count < settings.ANOMALY_MIN_SAMPLES or entry.ewma <= 0:
+            return None
+        ratio = monto / entry.ewma
+        deviation = math.sqrt(entry.ewm_var)
+        z_score = (monto - entry.ewma) / deviation if deviation > 0 else math.inf
+        if ratio < settings.ANOMALY_RATIO or z_score < settings.ANOMALY_Z_SCORE:
+            return None
+        return f"⚠️ Este gasto en {categoria} es {_format_ratio(ratio)}× el promedio (${entry.ewma:,.0f})"
+    
+    def observe(self, categoria: str, monto: float) -> Optional[str]:
+        """
+        Check a new gasto against the categoria's history, then add it.
+        
+        Args:
+            categoria: Canonical categoria of the gasto
+            monto: Amount
+        
+        Returns:
+            Alert line if the gasto is out of pattern, else None
+        """
+        with self._lock:
+            entry = self._stats.get(categoria)
+            alert = self._alert(categoria, monto, entry)
+            if entry is None:
+                entry = self._stats[categoria] = SpendingStats()
+            entry.update(monto, self.alpha)
+            self._unsaved += 1
+            save = self._unsaved >= _SAVE_EVERY
+        
+        if alert:
+            metrics.inc("spending_anomalies_total")
+            logger.info(f"Spending anomaly in {categoria}: {monto}")
+        if save:
+            try:
+                self.save()
+            except OSError as e:
+                logger.error(f"Error saving anomaly statistics: {e}")
+        return alert
+    
+    def rebuild(self, gastos: Iterable[Tuple[str, float]]) -> int:
+        """
+        Replace the statistics by replaying the ledger's gastos.
+        
+        Args:
+            gastos: (categoria, monto) pairs in date order
+        
+        Returns:
+            Number of gastos replayed
+        """
+        alpha = self.alpha
+        rebuilt: Dict[str, SpendingStats] = {}
+        count = 0
+        for categoria, monto in gastos:
+            entry = rebuilt.get(categoria)
+            if entry is None:
+                entry = rebuilt[categoria] = SpendingStats()
+            entry.update(monto, alpha)
+            count += 1
+        
+        with self._lock:
+            self._stats = rebuilt
+            self._unsaved += 1
+        self.save()
+        logger.info(f"Anomaly statistics rebuilt from {count} gastos")
+        return count
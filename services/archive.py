@@ -0,0 +1,119 @@
+"""
+Yearly archival of the Transacciones sheet.
+
+Transacciones only keeps the current year: rows of closed years are moved
+into "Transacciones <year>" archive sheets with one atomic batch update of
+copyPaste + deleteDimension requests, so full reads of the hot sheet (and
+the user's own formulas over it) stay small as history grows. Readers that
+need older periods union the archives through
+SheetsService.get_transaction_rows() / get_archive_rows().
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.config import settings
+from services.row_decoder import decode_transactions
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Called after rows are archived: (year, rows moved into its archive)
+ArchiveListener = Callable[[int, List[list]], None]
+
+
+def plan_archive(rows: List[list], cutoff_year: int) -> List[Tuple[int, int, int]]:
+    """
+    Find the runs of consecutive rows that belong to closed years.
+    
+    Args:
+        rows: Transacciones rows (row i is sheet row i + 2)
+        cutoff_year: Rows dated before this year are archived
+    
+    Returns:
+        (first sheet row number, row count, year) runs, top to bottom
+    """
+    runs: List[Tuple[int, int, int]] = []
+    for position, record in enumerate(decode_transactions(rows, keep_positions=True)):
+        # Malformed rows stay in the hot sheet for the user to fix
+        if record is None or record.fecha.year >= cutoff_year:
+            continue
+        year = record.fecha.year
+        row = position + 2
+        if runs and runs[-1][2] == year and runs[-1][0] + runs[-1][1] == row:
+            first_row, count, _ = runs[-1]
+            runs[-1] = (first_row, count + 1, year)
+        else:
+            runs.append((row, 1, year))
+    return runs
+
+
+class TransactionArchiver:
+    """
+    Moves closed years of Transacciones into their archive sheets.
+    """
+    
+    def __init__(self, sheets: SheetsService):
+        """
+        Initialize the archiver.
+        
+        Args:
+            sheets: Connected SheetsService
+        """
+        self.sheets = sheets
+        self._listeners: List[ArchiveListener] = []
+    
+    def subscribe(self, listener: ArchiveListener) -> None:
+        """
+        Register a callback invoked after rows are archived.
+        
+        Args:
+            listener: Callable receiving (year, rows)
+        """
+        self._listeners.append(listener)
+    
+    @staticmethod
+    def cutoff_year(today: date) -> int:
+        """
+        First year kept in the hot sheet.
+        
+        The previous year stays for ARCHIVE_GRACE_DAYS into the new one, so
+        late entries of December still land next to their month.
+        """
+        if today - date(today.year, 1, 1) < timedelta(days=settings.ARCHIVE_GRACE_DAYS):
+            return today.year - 1
+        return today.year
+    
+    def run(self, today: Optional[date] = None) -> Dict[int, int]:
+        """
+        Archive every closed year found in the hot sheet (blocking).
+        
+        Errors are raised; the move is atomic, so a failed run can simply
+        be retried.
+        
+        Args:
+            today: Reference date (defaults to today)
+        
+        Returns:
+            year → rows archived (empty if there was nothing to move)
+        """
+        rows = self.sheets.get_rows(SheetsService.TRANSACCIONES_SHEET)
+        runs = plan_archive(rows, self.cutoff_year(today or date.today()))
+        if not runs:
+            return {}
+        
+        self.sheets.archive_rows(SheetsService.TRANSACCIONES_SHEET,
+                                 [(first_row, count, self.sheets.archive_title(year))
+                                  for first_row, count, year in runs])
+        
+        moved: Dict[int, List[list]] = {}
+        for first_row, count, year in runs:
+            moved.setdefault(year, []).extend(rows[first_row - 2:first_row - 2 + count])
+        for year, year_rows in moved.items():
+            for listener in self._listeners:
+                try:
+                    listener(year, year_rows)
+                except Exception as e:
+                    logger.error(f"Archive listener failed: {e}", exc_info=True)
+        return {year: len(year_rows) for year, year_rows in moved.items()}
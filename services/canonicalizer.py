@@ -0,0 +1,140 @@
+"""
+Category and institution canonicalization at save time.
+
+Wraps the default canonical dictionaries with aliases learned from user
+corrections, persisted in DATA_DIR/aliases.json.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from domain.canonical import (
+    CanonicalIndex,
+    DEFAULT_CATEGORIES,
+    DEFAULT_INSTITUTIONS,
+    INSTITUTION_NOISE_WORDS,
+)
+from domain.capital import CapitalMovement
+from domain.transaction import Transaction
+from services.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Canonicalizer:
+    """
+    Maps categoria / institucion of parsed records to canonical names.
+    
+    Lookups check the user's learned aliases first, then the shared defaults.
+    """
+    
+    CATEGORY = "categorias"
+    INSTITUTION = "instituciones"
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the canonicalizer and load learned aliases.
+        
+        Args:
+            path: Aliases file (defaults to DATA_DIR/aliases.json)
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "aliases.json"
+        self._defaults = {
+            self.CATEGORY: CanonicalIndex(DEFAULT_CATEGORIES),
+            self.INSTITUTION: CanonicalIndex(DEFAULT_INSTITUTIONS, INSTITUTION_NOISE_WORDS),
+        }
+        # user_id -> kind -> {alias: canonical}, as stored on disk
+        self._learned: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # (user_id, kind) -> index of that user's aliases
+        self._user_indexes: Dict[tuple, CanonicalIndex] = {}
+        self._load()
+    
+    def _load(self) -> None:
+        """Load learned aliases from disk."""
+        if not self.path.exists():
+            return
+        try:
+            self._learned = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error loading aliases from {self.path}: {e}")
+            return
+        
+        for user_id, kinds in self._learned.items():
+            for kind, aliases in kinds.items():
+                index = self._user_index(user_id, kind)
+                for alias, canonical in aliases.items():
+                    index.add_alias(alias, canonical)
+    
+    def _save(self) -> None:
+        """Write learned aliases to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._learned, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def _user_index(self, user_id: str, kind: str) -> CanonicalIndex:
+        """Get (or create) the alias index of a user."""
+        key = (user_id, kind)
+        if key not in self._user_indexes:
+            noise = INSTITUTION_NOISE_WORDS if kind == self.INSTITUTION else ()
+            self._user_indexes[key] = CanonicalIndex({}, noise)
+        return self._user_indexes[key]
+    
+    def canonical(self, kind: str, name: str, user_id: Optional[Union[int, str]] = None) -> str:
+        """
+        Get the canonical form of a category or institution.
+        
+        Args:
+            kind: Canonicalizer.CATEGORY or Canonicalizer.INSTITUTION
+            name: Name as parsed
+            user_id: Telegram user id whose learned aliases apply
+        
+        Returns:
+            Canonical name
+        """
+        if user_id is not None:
+            learned = self._user_indexes.get((str(user_id), kind))
+            if learned:
+                canonical = learned.get(name)
+                if canonical:
+                    return canonical
+        return self._defaults[kind].canonicalize(name)
+    
+    def apply(self, record: Union[Transaction, CapitalMovement], user_id: Optional[Union[int, str]] = None) -> None:
+        """
+        Canonicalize a parsed record in place before it is saved.
+        
+        Args:
+            record: Transaction (categoria) or CapitalMovement (institucion)
+            user_id: Telegram user id whose learned aliases apply
+        """
+        if isinstance(record, CapitalMovement):
+            record.institucion = self.canonical(self.INSTITUTION, record.institucion, user_id)
+        else:
+            record.categoria = self.canonical(self.CATEGORY, record.categoria, user_id)
+    
+    def learn(self, kind: str, alias: str, canonical: str, user_id: Union[int, str]) -> str:
+        """
+        Learn a user correction ("alias" should be saved as "canonical").
+        
+        Args:
+            kind: Canonicalizer.CATEGORY or Canonicalizer.INSTITUTION
+            alias: Name the user writes
+            canonical: Name it should be saved as
+            user_id: Telegram user id
+        
+        Returns:
+            The canonical name stored (itself canonicalized)
+        """
+        user_id = str(user_id)
+        # "comidas = restaurante" resolves to whatever restaurante already maps to
+        target = self.canonical(kind, canonical, user_id)
+        
+        self._user_index(user_id, kind).add_alias(alias, target)
+        self._learned.setdefault(user_id, {}).setdefault(kind, {})[alias.lower().strip()] = target
+        self._save()
+        
+        logger.info(f"Learned {kind} alias for user {user_id}: {alias} → {target}")
+        return target
@@ -0,0 +1,305 @@
+"""
+Row index for in-place capital movement updates.
+
+Maps a stable movement id to its row in the Ahorros e Inversiones sheet so
+that withdrawals and returns can be written with one batch_update, without
+reading the whole sheet again. The index is built with a single read and kept
+current from the outbox's flush notifications.
+"""
+
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from domain.canonical import normalize_key
+from domain.capital import CapitalStatus
+from domain.records import CapitalRecord
+from services.portfolio import Portfolio
+from services.row_decoder import SHEETS_DATETIME_FORMAT, decode_capital
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Called after movements are updated in the sheet: (records before, records after)
+UpdateListener = Callable[[List[CapitalRecord], List[CapitalRecord]], None]
+
+# Words ignored when matching a description like "el CDT de Bancolombia"
+_MATCH_STOPWORDS = {"el", "la", "los", "las", "de", "del", "en", "mi", "mis", "un", "una",
+                    "todo", "todos", "todas", "retire", "retirar", "retiro"}
+
+# Amount words ignored too ("45 mil", "2 millones"); tokens with digits always are
+_AMOUNT_WORDS = {"mil", "k", "millon", "millones", "peso", "pesos"}
+
+
+def movement_id(record: CapitalRecord) -> str:
+    """
+    Stable id of a capital movement.
+    
+    Hashes the columns that never change after the movement is saved
+    (Fecha, Tipo, Monto, Institución, Descripción), so the id is the same
+    whether computed from the row we appended or from the row read back.
+    """
+    key = "|".join((
+        record.fecha.strftime(SHEETS_DATETIME_FORMAT),
+        record.tipo,
+        f"{record.monto:.2f}",
+        record.institucion,
+        record.descripcion or ""
+    ))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+
+class CapitalRowIndex:
+    """
+    Movement id → (sheet row, current record) for the capital sheet.
+    
+    Identical movements (same date, amount, institution and description)
+    get "-2", "-3", ... suffixes in row order.
+    """
+    
+    def __init__(self):
+        """Initialize an empty, unloaded index."""
+        self._entries: Dict[str, Tuple[int, CapitalRecord]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Held from reading a movement to swapping in its update, so two
+        # concurrent withdrawals or returns cannot overwrite each other
+        self._write_lock = threading.Lock()
+        self._listeners: List[UpdateListener] = []
+        self._version = 0  # Bumped on every change, invalidates the portfolio
+        self._portfolio: Optional[Tuple[int, Portfolio]] = None
+    
+    def __len__(self) -> int:
+        """Number of indexed movements."""
+        return len(self._entries)
+    
+    def subscribe(self, listener: UpdateListener) -> None:
+        """
+        Register a callback invoked after movements are updated in the sheet.
+        
+        Args:
+            listener: Callable receiving (records before, records after)
+        """
+        self._listeners.append(listener)
+    
+    def _add(self, record: CapitalRecord, row: int) -> str:
+        """Index one movement, returning its id."""
+        base = entry_id = movement_id(record)
+        duplicate = 1
+        while entry_id in self._entries:
+            duplicate += 1
+            entry_id = f"{base}-{duplicate}"
+        self._entries[entry_id] = (row, record)
+        return entry_id
+    
+    def load(self, sheets: SheetsService) -> None:
+        """
+        Build the index from one read of the capital sheet (blocking).
+        
+        Args:
+            sheets: Connected SheetsService
+        """
+        records = decode_capital(sheets.get_rows(sheets.CAPITAL_SHEET), keep_positions=True)
+        
+        with self._lock:
+            self._entries.clear()
+            for offset, record in enumerate(records):
+                if record is not None:
+                    self._add(record, offset + 2)  # Row 1 is the header
+            self._loaded = True
+            self._version += 1
+        logger.info(f"Capital row index loaded: {len(self._entries)} movements")
+    
+    def ensure_loaded(self, sheets: SheetsService) -> None:
+        """Load the index if it has not been loaded or was invalidated (blocking)."""
+        if not self._loaded:
+            self.load(sheets)
+    
+    def on_rows_written(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """
+        Outbox flush listener: index rows appended to the capital sheet.
+        
+        If the sheet did not report where the rows landed, the index is
+        invalidated and rebuilt on next use.
+        """
+        if sheet_name != SheetsService.CAPITAL_SHEET or not self._loaded:
+            return
+        if first_row is None:
+            self._loaded = False
+            return
+        
+        records = decode_capital([[str(cell) for cell in row] for row in rows], keep_positions=True)
+        with self._lock:
+            for offset, record in enumerate(records):
+                if record is not None:
+                    self._add(record, first_row + offset)
+            self._version += 1
+    
+    def get(self, entry_id: str) -> Optional[CapitalRecord]:
+        """Get the current record of a movement by id."""
+        entry = self._entries.get(entry_id)
+        return entry[1] if entry else None
+    
+    def _current(self, entry_id: str) -> CapitalRecord:
+        """Get the current record of a movement, raising if a reload dropped it."""
+        record = self.get(entry_id)
+        if record is None:
+            raise RuntimeError(f"Capital movement {entry_id} is no longer in the sheet")
+        return record
+    
+    def portfolio(self) -> Portfolio:
+        """
+        Active positions as a Portfolio, rebuilt only after the index changes.
+        
+        Keeping the instance between calls lets its per-day valuations be reused.
+        """
+        with self._lock:
+            if self._portfolio is None or self._portfolio[0] != self._version:
+                self._portfolio = (self._version, Portfolio(record for _, record in self._entries.values()))
+            return self._portfolio[1]
+    
+    def find(self, text: str, only_active: bool = True) -> List[Tuple[str, CapitalRecord]]:
+        """
+        Find the movements a user is referring to.
+        
+        Accepts a movement id ("3fa9c2d1") or a description such as
+        "el CDT de Bancolombia", matched word by word. Amounts and numbers
+        in the text are ignored, and a movement only matches if a word hits
+        its tipo or institucion; descripcion words just break ties. Only the
+        best-scoring movements are returned.
+        
+        Args:
+            text: Movement id or free-text description
+            only_active: Ignore withdrawn movements
+        
+        Returns:
+            List of (movement id, record), oldest first
+        """
+        with self._lock:
+            entries = [(entry_id, record) for entry_id, (_, record) in self._entries.items()
+                       if not only_active or record.is_active()]
+        
+        query = text.strip().lower()
+        if query in self._entries:
+            return [(entry_id, record) for entry_id, record in entries if entry_id == query]
+        
+        words = {word for word in normalize_key(text).split()
+                 if word not in _MATCH_STOPWORDS and word not in _AMOUNT_WORDS
+                 and not any(c.isdigit() for c in word)}
+        if not words:
+            return []
+        
+        best, matches = (0, 0), []
+        for entry_id, record in entries:
+            strong = len(words & set(normalize_key(f"{record.tipo} {record.institucion}").split()))
+            if not strong:
+                continue
+            score = (strong, len(words & set(normalize_key(record.descripcion or "").split())))
+            if score > best:
+                best, matches = score, [(entry_id, record)]
+            elif score == best:
+                matches.append((entry_id, record))
+        return sorted(matches, key=lambda item: item[1].fecha)
+    
+    def _commit(self, sheets: SheetsService, changes: Dict[str, CapitalRecord]) -> None:
+        """
+        Write updated records in one batch_update, then update the index.
+        
+        The target rows are checked against the movement fingerprints first.
+        If the sheet was reordered since the index was built, the index is
+        reloaded and the write retried once at the new rows.
+        
+        Raises:
+            RuntimeError: If the rows still do not match after reloading
+        """
+        for attempt in range(2):
+            with self._lock:
+                missing = [entry_id for entry_id in changes if entry_id not in self._entries]
+                if missing:
+                    raise RuntimeError(f"Capital movements {missing} are no longer in the sheet")
+                rows = {entry_id: self._entries[entry_id][0] for entry_id in changes}
+            expected = {rows[entry_id]: entry_id.split("-")[0] for entry_id in changes}
+            
+            def verify(row: int, values: list) -> bool:
+                record = decode_capital([values], keep_positions=True)[0]
+                return record is not None and movement_id(record) == expected[row]
+            
+            updates = [(rows[entry_id], record.to_model().to_sheets_row()[4:7])
+                       for entry_id, record in changes.items()]
+            if not sheets.update_capital_movements(updates, verify=verify):
+                break
+            if attempt:
+                raise RuntimeError("Capital sheet rows keep moving, try again later")
+            self.load(sheets)
+        
+        with self._lock:
+            before = [self._entries[entry_id][1] for entry_id in changes]
+            for entry_id, record in changes.items():
+                self._entries[entry_id] = (rows[entry_id], record)
+            self._version += 1
+        
+        for listener in self._listeners:
+            try:
+                listener(before, list(changes.values()))
+            except Exception as e:
+                logger.error(f"Capital index listener failed: {e}", exc_info=True)
+    
+    def withdraw(self, sheets: SheetsService, entry_ids: List[str],
+                 fecha_retiro: Optional[datetime] = None) -> List[CapitalRecord]:
+        """
+        Mark movements as withdrawn with a single API call (blocking).
+        
+        Args:
+            sheets: Connected SheetsService
+            entry_ids: Movement ids
+            fecha_retiro: Withdrawal date (defaults to now)
+        
+        Returns:
+            Updated records
+        
+        Raises:
+            RuntimeError: If a movement is no longer in the sheet
+        """
+        fecha_retiro = fecha_retiro or datetime.now()
+        with self._write_lock:
+            changes = {}
+            for entry_id in entry_ids:
+                record = self._current(entry_id)
+                if not record.is_active():
+                    # Withdrawn meanwhile by a concurrent request; keep its date
+                    changes[entry_id] = record
+                    continue
+                movement = record.to_model()
+                movement.withdraw(fecha_retiro)
+                changes[entry_id] = record._replace(
+                    estado=CapitalStatus(movement.estado).value, fecha_retiro=movement.fecha_retiro)
+            
+            self._commit(sheets, changes)
+        return list(changes.values())
+    
+    def add_returns(self, sheets: SheetsService, amounts: Dict[str, float]) -> List[CapitalRecord]:
+        """
+        Add returns to movements with a single API call (blocking).
+        
+        Args:
+            sheets: Connected SheetsService
+            amounts: Movement id → return amount to add
+        
+        Returns:
+            Updated records
+        
+        Raises:
+            RuntimeError: If a movement is no longer in the sheet
+        """
+        with self._write_lock:
+            changes = {}
+            for entry_id, amount in amounts.items():
+                record = self._current(entry_id)
+                movement = record.to_model()
+                movement.add_return(amount)
+                changes[entry_id] = record._replace(retorno=movement.retorno)
+            
+            self._commit(sheets, changes)
+        return list(changes.values())
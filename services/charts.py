@@ -0,0 +1,244 @@
+"""
+Chart rendering off the event loop, with a versioned PNG cache.
+
+Chart data is aggregated from the in-memory ledger (cheap), while drawing
+with matplotlib (CPU-bound) runs in a process pool so it never blocks the
+Telegram loop nor holds the GIL of the main process. Rendered PNGs are
+cached under (chart, start, end, ledger version), so every user and every
+way of writing the same period share one entry, served from memory until
+a write bumps the ledger version.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.config import settings
+from services.ledger import Ledger, record_tipo
+from services.metrics import metrics
+from services.portfolio import Portfolio
+
+logger = logging.getLogger(__name__)
+
+# Chart kinds: categorias (pie of gastos), meses (monthly bars), capital (by institution)
+CHARTS = ("categorias", "meses", "capital")
+
+# Slices beyond this many categories are grouped as "otros"
+_PIE_SLICES = 8
+
+_MONTH_LABELS = ["ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic"]
+
+metrics.describe("chart_render_seconds", "Time to render a chart in the worker pool")
+metrics.describe("chart_requests_total", "Chart requests by cache result")
+
+CacheKey = Tuple[str, datetime, datetime, int]
+
+
+def render_chart(kind: str, title: str, data: Dict[str, Any]) -> bytes:
+    """
+    Draw a chart as PNG (runs in a worker process).
+    
+    Args:
+        kind: One of CHARTS
+        title: Chart title
+        data: labels and values (plus ingresos for "meses")
+    
+    Returns:
+        PNG bytes
+    """
+    import io
+    
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+    from matplotlib.ticker import FuncFormatter
+    
+    money = FuncFormatter(lambda value, _: f"${value:,.0f}")
+    figure, axes = pyplot.subplots(figsize=(8, 5), dpi=100)
+    try:
+        if kind == "categorias":
+            axes.pie(data["values"], labels=data["labels"], autopct="%1.0f%%", startangle=90,
+                     counterclock=False, wedgeprops={"linewidth": 1, "edgecolor": "white"})
+            axes.axis("equal")
+        elif kind == "meses":
+            positions = range(len(data["labels"]))
+            axes.bar([p - 0.2 for p in positions], data["values"], width=0.4, label="Gastos", color="#d9534f")
+            axes.bar([p + 0.2 for p in positions], data["ingresos"], width=0.4, label="Ingresos", color="#5cb85c")
+            axes.set_xticks(list(positions), data["labels"])
+            axes.yaxis.set_major_formatter(money)
+            axes.legend()
+            axes.grid(axis="y", alpha=0.3)
+        else:
+            axes.barh(data["labels"][::-1], data["values"][::-1], color="#337ab7")
+            axes.xaxis.set_major_formatter(money)
+            axes.grid(axis="x", alpha=0.3)
+        axes.set_title(title)
+        figure.tight_layout()
+        
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        pyplot.close(figure)
+
+
+class ChartService:
+    """
+    Builds chart data from the ledger and renders it in a process pool.
+    
+    The cache is a bounded LRU; entries of older ledger versions are
+    dropped as soon as a newer one is cached.
+    """
+    
+    def __init__(self, ledger: Ledger, workers: Optional[int] = None, cache_size: Optional[int] = None):
+        """
+        Initialize the service (the pool starts on the first render).
+        
+        Args:
+            ledger: Ledger the charts are drawn from
+            workers: Worker processes
+            cache_size: PNGs kept in memory
+        """
+        self.ledger = ledger
+        self.workers = workers or settings.CHART_WORKERS
+        self.cache_size = cache_size or settings.CHART_CACHE_SIZE
+        self._cache: "OrderedDict[CacheKey, Tuple[bytes, str]]" = OrderedDict()  # → (PNG, title)
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use."""
+        if self._pool is None:
+            # spawn: forking would copy the bot's threads and open sockets
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+    
+    def chart_data(self, kind: str, start: datetime, end: datetime) -> Tuple[str, Dict[str, Any]]:
+        """
+        Aggregate the data of a chart from the loaded ledger.
+        
+        Call ledger.ensure_range(start, end) first for "categorias" and "meses".
+        
+        Args:
+            kind: One of CHARTS
+            start: Inclusive lower bound of the period
+            end: Exclusive upper bound of the period
+        
+        Returns:
+            (title, data) with labels and values; empty values when there is nothing to draw
+        """
+        if kind == "categorias":
+            totals: Dict[str, float] = {}
+            for record in self.ledger.query(start, end, tipo="gasto"):
+                totals[record.categoria] = totals.get(record.categoria, 0.0) + record.monto
+            ranked = sorted(totals.items(), key=lambda item: -item[1])
+            if len(ranked) > _PIE_SLICES:
+                ranked = ranked[:_PIE_SLICES - 1] + [("otros", sum(monto for _, monto in ranked[_PIE_SLICES - 1:]))]
+            title = f"Gastos por categoría ({start:%Y-%m-%d} a {end - timedelta(days=1):%Y-%m-%d})"
+            return title, {"labels": [name for name, _ in ranked], "values": [monto for _, monto in ranked]}
+        
+        if kind == "meses":
+            months: List[Tuple[int, int]] = []
+            cursor = datetime(start.year, start.month, 1)
+            while cursor < end:
+                months.append((cursor.year, cursor.month))
+                cursor = datetime(cursor.year + (cursor.month == 12), cursor.month % 12 + 1, 1)
+            gastos = dict.fromkeys(months, 0.0)
+            ingresos = dict.fromkeys(months, 0.0)
+            for record in self.ledger.query(start, end):
+                tipo = record_tipo(record)
+                target = gastos if tipo == "gasto" else ingresos if tipo == "ingreso" else None
+                month = (record.fecha.year, record.fecha.month)
+                if target is not None and month in target:
+                    target[month] += record.monto
+            values = [gastos[month] for month in months]
+            return "Gastos e ingresos por mes", {
+                "labels": [f"{_MONTH_LABELS[month - 1]} {year % 100:02d}" for year, month in months],
+                "values": values if any(values) or any(ingresos.values()) else [],
+                "ingresos": [ingresos[month] for month in months],
+            }
+        
+        active = [record for record in self.ledger.query(tipo="ahorro") + self.ledger.query(tipo="inversion")
+                  if record.estado == "activo"]
+        by_institution = sorted(Portfolio(active).value_by_institution().items(),
+                                key=lambda item: -item[1]) if active else []
+        return "Capital activo por institución", {
+            "labels": [name for name, _ in by_institution], "values": [value for _, value in by_institution]}
+    
+    def _put(self, key: CacheKey, png: bytes, title: str) -> None:
+        """Cache a PNG, dropping older versions of the same chart and the LRU overflow."""
+        for stale in [cached for cached in self._cache if cached[:3] == key[:3] and cached[3] < key[3]]:
+            del self._cache[stale]
+        self._cache[key] = (png, title)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    async def render(self, user_id, kind: str, start: datetime, end: datetime) -> Tuple[Optional[bytes], str]:
+        """
+        Get a chart PNG, from the cache or rendered in the pool.
+        
+        Concurrent requests for the same chart share one render.
+        
+        Args:
+            user_id: Telegram user id (for the log only; charts are shared)
+            kind: One of CHARTS
+            start: Inclusive lower bound of the period
+            end: Exclusive upper bound of the period (both ignored by "capital")
+        
+        Returns:
+            (PNG bytes or None if there is no data, title)
+        """
+        if kind != "capital":
+            await asyncio.to_thread(self.ledger.ensure_range, start, end)
+        else:
+            await asyncio.to_thread(self.ledger.ensure_loaded)
+            # Capital is valued as of today, whatever the period
+            start = datetime.combine(datetime.now().date(), datetime.min.time())
+            end = start + timedelta(days=1)
+        
+        key = (kind, start, end, self.ledger.version)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            metrics.inc("chart_requests_total", cache="hit")
+            return cached
+        
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.inc("chart_requests_total", cache="shared")
+            return await asyncio.shield(future)
+        
+        title, data = self.chart_data(kind, start, end)
+        if not data["values"]:
+            return None, title
+        
+        metrics.inc("chart_requests_total", cache="miss")
+        started = time.perf_counter()
+        render = asyncio.get_running_loop().run_in_executor(self._get_pool(), render_chart, kind, title, data)
+        future = asyncio.ensure_future(self._finish(key, render, title, started, user_id))
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _finish(self, key: CacheKey, render: asyncio.Future, title: str, started: float,
+                      user_id) -> Tuple[bytes, str]:
+        """Wait for a render and cache its PNG."""
+        png = await render
+        metrics.observe("chart_render_seconds", time.perf_counter() - started)
+        self._put(key, png, title)
+        logger.info(f"Rendered {key[0]} chart for user {user_id} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return png, title
+    
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -7,7 +7,7 @@ Loads configuration from environment variables and .env file.
 import os
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -34,6 +34,17 @@ class Settings(BaseSettings):
     
     # OpenAI Configuration
     OPENAI_API_KEY: str
+    LLM_MODEL: str = "gpt-4o-mini"  # Using the faster, cheaper model
+    LLM_PROMPT_PROFILE: str = "compact"  # "compact" or "full"
+    LLM_OUTPUT_MODE: str = "json_schema"  # "json_schema", "json_object" or "text"
+    
+    # Parser backend: "openai", "local" (OpenAI-compatible server), "heuristic",
+    # "record" (call OpenAI and save recordings) or "replay" (recordings only)
+    LLM_BACKEND: str = "openai"
+    LLM_LOCAL_BASE_URL: str = "http://localhost:11434/v1"
+    LLM_LOCAL_MODEL: str = "llama3.1"
+    LLM_LOCAL_API_KEY: str = "local"
+    LLM_RECORDINGS_FILE: str = "data/llm_recordings.json"
     
     # FastAPI Configuration
     API_HOST: str = "0.0.0.0"
@@ -43,6 +54,90 @@ class Settings(BaseSettings):
     TIMEZONE: str = "America/Bogota"
     DEBUG: bool = False
     
+    # Local storage (outbox, indexes, caches)
+    DATA_DIR: str = "data"
+    
+    # Google Sheets HTTP transport: keep-alive connections per host, and seconds
+    # before expiry at which the OAuth token is refreshed in the background
+    SHEETS_POOL_SIZE: int = 10
+    SHEETS_TOKEN_REFRESH_MARGIN: float = 300.0
+    
+    # Check the spreadsheet's Drive revision before whole-sheet reads and serve
+    # them from memory while it is unchanged (needs the Drive API enabled)
+    SHEETS_CHANGE_DETECTION: bool = True
+    
+    # Outbox Configuration (durable write-ahead log in front of Google Sheets)
+    OUTBOX_BATCH_SIZE: int = 200
+    OUTBOX_FLUSH_INTERVAL: float = 2.0
+    
+    # Capital portfolio: annual effective rates and fixed terms (days), keyed by
+    # institucion first and tipo second (JSON in the environment)
+    CAPITAL_RATES: Dict[str, float] = {"cdt": 0.11, "inversion": 0.08, "ahorro": 0.01}
+    CAPITAL_TERM_DAYS: Dict[str, int] = {"cdt": 360}
+    
+    # Recurring transactions: seconds between scheduler ticks, and the most
+    # missed occurrences a rule may catch up in one tick
+    RECURRING_CHECK_INTERVAL: float = 300.0
+    RECURRING_MAX_CATCH_UP: int = 60
+    
+    # Yearly archival of Transacciones: seconds between checks, and days into a
+    # new year before the previous one is archived
+    ARCHIVE_CHECK_INTERVAL: float = 21600.0
+    ARCHIVE_GRACE_DAYS: int = 7
+    
+    # Seconds between ledger snapshots (written under DATA_DIR/snapshot, only if changed)
+    SNAPSHOT_INTERVAL: float = 600.0
+    
+    # Legacy Gastos/Ingresos migration (migrate_legacy.py): rows read and appended
+    # per API call, API calls per minute (the per-user quota is 60 reads and 60
+    # writes, so leave room for the bot), and retries on quota or server errors
+    MIGRATION_CHUNK_ROWS: int = 2000
+    MIGRATION_REQUESTS_PER_MINUTE: int = 30
+    MIGRATION_MAX_RETRIES: int = 6
+    
+    # Spending anomaly alerts: previous gastos a categoria needs before alerting,
+    # times the recent average and standard deviations above it that trigger an
+    # alert, and the weight of each new gasto in the recent average
+    ANOMALY_MIN_SAMPLES: int = 5
+    ANOMALY_RATIO: float = 3.0
+    ANOMALY_Z_SCORE: float = 2.0
+    ANOMALY_EWMA_ALPHA: float = 0.1
+    
+    # /grafico: worker processes that render charts, and PNGs kept in the cache
+    CHART_WORKERS: int = 2
+    CHART_CACHE_SIZE: int = 64
+    
+    # Event loop monitor: lag (seconds) that counts as a stall, seconds between
+    # heartbeats, and stalls kept for /debug/loop
+    LOOP_STALL_THRESHOLD: float = 0.1
+    LOOP_MONITOR_INTERVAL: float = 0.1
+    LOOP_STALL_BUFFER: int = 50
+    
+    # Load testing: shared secret of POST /replay/update (disabled when empty)
+    REPLAY_TOKEN: str = ""
+    
+    # LLM accounting: USD prices per million tokens as [prompt, completion] by
+    # model, days of usage kept, and daily token budgets per user (0 = none;
+    # LLM_USER_TOKEN_BUDGETS overrides by user id, as JSON). Users over budget
+    # are parsed with the heuristic backend.
+    LLM_PRICES: Dict[str, List[float]] = {"gpt-4o-mini": [0.15, 0.60], "gpt-4o": [2.50, 10.00]}
+    LLM_USAGE_RETENTION_DAYS: int = 90
+    LLM_DAILY_TOKEN_BUDGET: int = 0
+    LLM_USER_TOKEN_BUDGETS: Dict[str, int] = {}
+    
+    # Admission control of incoming messages: messages processed at once (and per
+    # user; 1 keeps a user's messages in order), messages waiting in total and per
+    # user, and seconds a message may wait before new ones are shed
+    ADMISSION_WORKERS: int = 8
+    ADMISSION_USER_INFLIGHT: int = 1
+    ADMISSION_QUEUE_SIZE: int = 200
+    ADMISSION_USER_QUEUE_SIZE: int = 10
+    ADMISSION_QUEUE_SLO: float = 10.0
+    
+    # Admin and data routes (/admin/*, /api/*, /debug/loop): shared secret sent in X-Admin-Token
+    # (disabled when empty)
+    ADMIN_TOKEN: str = ""
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,242 @@
+"""
+Service container with lazy construction.
+
+Builds LLMService and SheetsService on first access instead of at import
+time, and warms up their connections concurrently during startup.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Lazily constructed holder for the bot's external services.
+    
+    Importing a module that uses the container costs nothing: heavy client
+    libraries (openai, gspread, google.auth) are only imported when a service
+    is first accessed or when warm_up() runs.
+    """
+    
+    def __init__(self):
+        """Initialize an empty container."""
+        self._llm = None
+        self._sheets = None
+        self._outbox = None
+        self._canonicalizer = None
+        self._capital_index = None
+        self._recurring = None
+        self._summary = None
+        self._ledger = None
+        self._search = None
+        self._loop_monitor = None
+        self._archiver = None
+        self._anomalies = None
+        self._charts = None
+        self._usage = None
+        self._admission = None
+        self.startup_timings: Dict[str, float] = {}
+    
+    @property
+    def llm(self):
+        """Get the LLM service, constructing it on first access."""
+        if self._llm is None:
+            from services.llm_service import LLMService
+            self._llm = LLMService(usage=self.usage)
+        return self._llm
+    
+    @property
+    def sheets(self):
+        """Get the Sheets service, constructing it on first access."""
+        if self._sheets is None:
+            from services.sheets_service import SheetsService
+            self._sheets = SheetsService()
+        return self._sheets
+    
+    @property
+    def usage(self):
+        """Get the LLM token accounting."""
+        if self._usage is None:
+            from services.usage import UsageTracker
+            self._usage = UsageTracker()
+        return self._usage
+    
+    @property
+    def admission(self):
+        """Get the admission controller in front of message processing."""
+        if self._admission is None:
+            from services.admission import AdmissionController
+            self._admission = AdmissionController()
+        return self._admission
+    
+    @property
+    def outbox(self):
+        """Get the durable outbox, recovering pending entries on first access."""
+        if self._outbox is None:
+            from services.outbox import Outbox
+            self._outbox = Outbox()
+        return self._outbox
+    
+    @property
+    def canonicalizer(self):
+        """Get the category/institution canonicalizer, loading learned aliases on first access."""
+        if self._canonicalizer is None:
+            from services.canonicalizer import Canonicalizer
+            self._canonicalizer = Canonicalizer()
+        return self._canonicalizer
+    
+    @property
+    def capital_index(self):
+        """Get the capital sheet row index (loaded from Sheets on first use by callers)."""
+        if self._capital_index is None:
+            from services.capital_index import CapitalRowIndex
+            self._capital_index = CapitalRowIndex()
+        return self._capital_index
+    
+    @property
+    def recurring(self):
+        """Get the recurring rules store, loading rules on first access."""
+        if self._recurring is None:
+            from services.recurring import RecurringRules
+            self._recurring = RecurringRules()
+        return self._recurring
+    
+    @property
+    def summary(self):
+        """Get the Resumen sheet mirror (loaded by initialize_services)."""
+        if self._summary is None:
+            from services.summary import SummarySheet
+            self._summary = SummarySheet(self.sheets)
+        return self._summary
+    
+    @property
+    def ledger(self):
+        """Get the date-indexed ledger (warm-started from its snapshot by initialize_services)."""
+        if self._ledger is None:
+            from services.ledger import Ledger
+            from services.snapshot import LedgerSnapshot
+            self._ledger = Ledger(self.sheets, LedgerSnapshot())
+        return self._ledger
+    
+    @property
+    def search(self):
+        """Get the full-text search index (loaded by initialize_services)."""
+        if self._search is None:
+            from services.search import SearchIndex
+            self._search = SearchIndex(self.sheets)
+        return self._search
+    
+    @property
+    def loop_monitor(self):
+        """Get the event loop stall monitor (started by initialize_services)."""
+        if self._loop_monitor is None:
+            from services.loop_monitor import LoopMonitor
+            self._loop_monitor = LoopMonitor()
+        return self._loop_monitor
+    
+    @property
+    def archiver(self):
+        """Get the Transacciones yearly archiver."""
+        if self._archiver is None:
+            from services.archive import TransactionArchiver
+            self._archiver = TransactionArchiver(self.sheets)
+        return self._archiver
+    
+    @property
+    def anomalies(self):
+        """Get the spending anomaly detector."""
+        if self._anomalies is None:
+            from services.anomaly import AnomalyDetector
+            self._anomalies = AnomalyDetector()
+        return self._anomalies
+    
+    @property
+    def charts(self):
+        """Get the chart renderer (its worker pool starts on the first chart)."""
+        if self._charts is None:
+            from services.charts import ChartService
+            self._charts = ChartService(self.ledger)
+        return self._charts
+    
+    def _timed(self, phase: str, func, *args):
+        """
+        Run a blocking startup phase and record its duration.
+        
+        Args:
+            phase: Name of the phase for the timing report
+            func: Callable to run
+        
+        Returns:
+            Whatever func returns
+        """
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.startup_timings[phase] = round((time.perf_counter() - started) * 1000, 1)
+    
+    def _warm_up_sheets(self) -> bool:
+        """Authenticate, connect and initialize the spreadsheet (blocking)."""
+        sheets = self._timed("sheets.construct", lambda: self.sheets)
+        
+        if not self._timed("sheets.authenticate", sheets.authenticate):
+            logger.error("Failed to authenticate with Google Sheets")
+            return False
+        
+        if not self._timed("sheets.connect", sheets.connect_spreadsheet):
+            logger.error("Failed to connect to spreadsheet")
+            return False
+        
+        if not self._timed("sheets.initialize", sheets.initialize_sheets):
+            logger.error("Failed to initialize sheets")
+            return False
+        
+        return True
+    
+    def _warm_up_llm(self) -> bool:
+        """Construct the LLM backend client so the first message does not pay for it (blocking)."""
+        llm = self._timed("llm.construct", lambda: self.llm)
+        self._timed("llm.client", llm.backend.warm_up)
+        return True
+    
+    async def warm_up(self) -> bool:
+        """
+        Warm up all services concurrently.
+        
+        Sheets (authenticate → connect → initialize) and the OpenAI client run
+        in worker threads at the same time, so total startup time is the
+        slowest of the two instead of their sum.
+        
+        Returns:
+            True if the Sheets service is ready, False otherwise
+        """
+        started = time.perf_counter()
+        
+        sheets_ok, llm_ok = await asyncio.gather(
+            asyncio.to_thread(self._warm_up_sheets),
+            asyncio.to_thread(self._warm_up_llm),
+            return_exceptions=True
+        )
+        
+        self.startup_timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        if isinstance(llm_ok, Exception):
+            logger.error(f"Error warming up LLM service: {llm_ok}", exc_info=llm_ok)
+        if isinstance(sheets_ok, Exception):
+            logger.error(f"Error warming up Sheets service: {sheets_ok}", exc_info=sheets_ok)
+            sheets_ok = False
+        
+        logger.info(f"Startup timings (ms): {self.format_timings()}")
+        return bool(sheets_ok)
+    
+    def format_timings(self) -> str:
+        """Format the startup timing breakdown as a single log-friendly line."""
+        return ", ".join(f"{phase}={ms}" for phase, ms in self.startup_timings.items())
+
+
+# Global service container
+container = ServiceContainer()
@@ -0,0 +1,506 @@
+"""
+Time-ordered index and date-range queries over the ledger.
+
+Keeps Transacciones, Presupuestos and Ahorros e Inversiones records sorted
+by date, with their timestamps in a parallel array, so a date range is found
+with two binary searches: O(log n + k) instead of downloading and scanning
+whole sheets. The index is loaded once and kept current from the outbox's
+flush notifications. Transacciones archives of closed years are read only
+when a query's range reaches into them.
+
+The append-only sheets are saved to a columnar snapshot on disk (see
+services/snapshot.py), so a restart reads the snapshot and fetches only the
+rows appended since, instead of every sheet.
+"""
+
+import logging
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from domain.records import BudgetRecord, CapitalRecord, TransactionRecord
+from services.row_decoder import decode_budgets, decode_capital, decode_transactions
+from services.sheets_service import SheetsService
+from services.snapshot import LedgerSnapshot, SnapshotTable
+
+logger = logging.getLogger(__name__)
+
+LedgerRecord = Union[TransactionRecord, BudgetRecord, CapitalRecord]
+
+_MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+           "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def row_fingerprint(row: List) -> List[str]:
+    """
+    Identify a Transacciones/Presupuestos row by Fecha, Categoría and Descripción.
+    
+    Monto is left out because the sheet may format it differently from the
+    value that was written.
+    """
+    return [str(row[column]).strip() if column < len(row) else "" for column in (0, 2, 3)]
+
+
+class TimeIndex:
+    """
+    Records sorted by fecha, with their timestamps in an array('d').
+    
+    Appends in date order (the common case) are O(1); out-of-order inserts
+    fall back to a binary insertion.
+    """
+    
+    def __init__(self, records: Iterable[LedgerRecord] = ()):
+        """
+        Build the index.
+        
+        Args:
+            records: Records in any order
+        """
+        ordered = sorted(records, key=lambda record: record.fecha)
+        self._keys = array("d", (record.fecha.timestamp() for record in ordered))
+        self._records: List[LedgerRecord] = ordered
+    
+    def __len__(self) -> int:
+        """Number of records."""
+        return len(self._records)
+    
+    def insert(self, record: LedgerRecord) -> None:
+        """Add a record, keeping date order."""
+        key = record.fecha.timestamp()
+        if not self._keys or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._records.append(record)
+            return
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._records.insert(position, record)
+    
+    def replace(self, old: LedgerRecord, new: LedgerRecord) -> bool:
+        """
+        Replace a record that kept its fecha (e.g. a withdrawn capital movement).
+        
+        Returns:
+            True if the old record was found
+        """
+        key = old.fecha.timestamp()
+        for position in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+            if self._records[position] == old:
+                self._records[position] = new
+                return True
+        return False
+    
+    def remove(self, record: LedgerRecord) -> bool:
+        """
+        Remove one occurrence of a record.
+        
+        Returns:
+            True if it was found
+        """
+        key = record.fecha.timestamp()
+        for position in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+            if self._records[position] == record:
+                del self._keys[position]
+                del self._records[position]
+                return True
+        return False
+    
+    def range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[LedgerRecord]:
+        """
+        Records with start <= fecha < end.
+        
+        Args:
+            start: Inclusive lower bound (None for the beginning)
+            end: Exclusive upper bound (None for the end)
+        
+        Returns:
+            Records in date order
+        """
+        low = bisect_left(self._keys, start.timestamp()) if start else 0
+        high = bisect_left(self._keys, end.timestamp()) if end else len(self._keys)
+        return self._records[low:high]
+
+
+def record_tipo(record: LedgerRecord) -> str:
+    """Tipo of any ledger record as a plain string."""
+    return getattr(record.tipo, "value", record.tipo)
+
+
+def record_to_dict(record: LedgerRecord) -> Dict[str, Any]:
+    """Convert a ledger record to a JSON-friendly dict."""
+    data = record._asdict()
+    data["tipo"] = record_tipo(record)
+    for field in ("fecha", "fecha_retiro"):
+        if data.get(field):
+            data[field] = data[field].isoformat()
+    return data
+
+
+def parse_period(text: str, today: Optional[date] = None) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Turn a Spanish period expression into a [start, end) date range.
+    
+    Understands "hoy", "ayer", "esta semana", "la semana pasada", "este mes",
+    "el mes pasado", "este año", "el año pasado", a year ("2025"), month
+    names ("octubre", "octubre 2025", "marzo del año pasado") and "YYYY-MM".
+    Month names and years are looked at before the relative keywords, and
+    all of them must be whole words ("mesa" is not "mes").
+    
+    Args:
+        text: Period expression
+        today: Reference date (defaults to today)
+    
+    Returns:
+        (start, end) or None if not understood
+    """
+    today = today or date.today()
+    text = text.lower().strip()
+    midnight = datetime.combine(today, datetime.min.time())
+    words = re.findall(r"[a-zñáéíóúü0-9]+", text)
+    previous = "pasado" in words or "pasada" in words or "anterior" in words
+    
+    def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+        start = datetime(year, month, 1)
+        end = datetime(year + (month == 12), month % 12 + 1, 1)
+        return start, end
+    
+    if text in ("hoy", ""):
+        return midnight, midnight + timedelta(days=1)
+    if text == "ayer":
+        return midnight - timedelta(days=1), midnight
+    
+    match = re.fullmatch(r"(\d{4})-(\d{2})", text)
+    if match:
+        return month_range(int(match.group(1)), int(match.group(2)))
+    
+    years = [int(word) for word in words if re.fullmatch(r"\d{4}", word)]
+    months = [number for number, name in enumerate(_MONTHS, start=1) if name in words]
+    if months:
+        if years:
+            year = years[0]
+        elif previous and ("año" in words or "ano" in words):
+            year = today.year - 1
+        else:
+            # A month name alone means its latest occurrence
+            year = today.year if months[0] <= today.month else today.year - 1
+        return month_range(year, months[0])
+    if years:
+        return datetime(years[0], 1, 1), datetime(years[0] + 1, 1, 1)
+    
+    if "semana" in words:
+        monday = midnight - timedelta(days=today.weekday())
+        if previous:
+            return monday - timedelta(days=7), monday
+        return monday, monday + timedelta(days=7)
+    if "mes" in words:
+        if previous:
+            year, month = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+            return month_range(year, month)
+        return month_range(today.year, today.month)
+    if "año" in words or "ano" in words:
+        year = today.year - 1 if previous else today.year
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    return None
+
+
+class Ledger:
+    """
+    Date-indexed view of the whole ledger.
+    
+    Loaded lazily, from the snapshot plus the rows appended since when there
+    is one, or with one read per sheet; appends arriving while the load is in
+    progress are buffered and applied afterwards, so none are lost.
+    """
+    
+    # Sheets kept in the snapshot (append-only, so new rows are always at the end)
+    SNAPSHOT_SHEETS = (SheetsService.TRANSACCIONES_SHEET, SheetsService.PRESUPUESTOS_SHEET)
+    
+    def __init__(self, sheets: SheetsService, snapshot: Optional[LedgerSnapshot] = None):
+        """
+        Initialize an unloaded ledger.
+        
+        Args:
+            sheets: SheetsService used to load the sheets
+            snapshot: Snapshot store for warm starts (None to always read the sheets)
+        """
+        self.sheets = sheets
+        self.snapshot = snapshot
+        self.transactions = TimeIndex()
+        self.budgets = TimeIndex()
+        self.capital = TimeIndex()
+        self.archive = TimeIndex()  # Transacciones read from archive sheets
+        self.version = 0  # Bumped on every change, for caches built on the ledger
+        self._loaded = False
+        self._loading = False
+        self._buffered: List[Tuple[str, List[list], Optional[int]]] = []
+        self._archive_years: Set[int] = set()  # Archives already read into self.archive
+        # Sheet rows covered by the index and fingerprint of the last one, per
+        # snapshot sheet (rows None when a write landed at an unknown row)
+        self._synced_rows: Dict[str, Optional[int]] = {}
+        self._last_rows: Dict[str, Optional[List[str]]] = {}
+        self._saved_version = 0  # Version written to the snapshot
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # One lazy load at a time
+    
+    def _index_for(self, sheet_name: str) -> Optional[Tuple[TimeIndex, Any]]:
+        """Index and decoder of a sheet."""
+        return {
+            SheetsService.TRANSACCIONES_SHEET: (self.transactions, decode_transactions),
+            SheetsService.PRESUPUESTOS_SHEET: (self.budgets, decode_budgets),
+            SheetsService.CAPITAL_SHEET: (self.capital, decode_capital),
+        }.get(sheet_name)
+    
+    def _read_sheet(self, sheet_name: str, rows: Optional[List[list]] = None) -> Tuple[int, TimeIndex, Any]:
+        """Read (unless given) and index a whole sheet: (rows read, index, last row fingerprint)."""
+        if rows is None:
+            rows = self.sheets.get_rows(sheet_name)
+        _, decode = self._index_for(sheet_name)
+        return len(rows), TimeIndex(decode(rows)), row_fingerprint(rows[-1]) if rows else None
+    
+    def _load_from_snapshot(self) -> Optional[Dict[str, Tuple[int, TimeIndex, Any]]]:
+        """
+        Load the snapshot sheets from disk plus their rows appended since.
+        
+        The new rows of every sheet (and all of Ahorros e Inversiones, which
+        is not in the snapshot) come from a single read. A sheet whose last
+        snapshot row is no longer where it was (edited by hand, archived) is
+        read whole instead.
+        
+        Returns:
+            Same as the full load, or None if there is no usable snapshot
+        """
+        tables = self.snapshot.load()
+        if not tables or any(sheet_name not in tables for sheet_name in self.SNAPSHOT_SHEETS):
+            return None
+        
+        # Start at the last covered row, to check it is still there
+        first_rows = {sheet_name: tables[sheet_name].rows + 1 if tables[sheet_name].rows else 2
+                      for sheet_name in self.SNAPSHOT_SHEETS}
+        first_rows[SheetsService.CAPITAL_SHEET] = 2
+        fetched = self.sheets.get_rows_from(first_rows)
+        
+        loaded = {SheetsService.CAPITAL_SHEET: self._read_sheet(
+            SheetsService.CAPITAL_SHEET, fetched.get(SheetsService.CAPITAL_SHEET, []))}
+        for sheet_name in self.SNAPSHOT_SHEETS:
+            table = tables[sheet_name]
+            rows = fetched.get(sheet_name, [])
+            if table.rows:
+                if not rows or row_fingerprint(rows[0]) != table.last_row:
+                    logger.info(f"{sheet_name} changed since the snapshot; reading it whole")
+                    loaded[sheet_name] = self._read_sheet(sheet_name)
+                    continue
+                rows = rows[1:]
+            
+            index = TimeIndex(table.records)
+            _, decode = self._index_for(sheet_name)
+            for record in decode(rows):
+                index.insert(record)
+            loaded[sheet_name] = (table.rows + len(rows), index,
+                                  row_fingerprint(rows[-1]) if rows else table.last_row)
+            logger.info(f"{sheet_name}: {table.rows} rows from snapshot, {len(rows)} new")
+        return loaded
+    
+    def load(self, use_snapshot: bool = True) -> None:
+        """
+        Load all ledger sheets, without Transacciones archives (blocking).
+        
+        Args:
+            use_snapshot: Start from the snapshot if there is one (False reads
+                every sheet whole, e.g. after hand edits)
+        """
+        with self._lock:
+            self._loading = True
+            self._buffered = []
+        
+        try:
+            loaded = None
+            if use_snapshot and self.snapshot is not None:
+                loaded = self._load_from_snapshot()
+            if loaded is None:
+                loaded = {sheet_name: self._read_sheet(sheet_name)
+                          for sheet_name in (SheetsService.TRANSACCIONES_SHEET, SheetsService.PRESUPUESTOS_SHEET,
+                                             SheetsService.CAPITAL_SHEET)}
+        except Exception:
+            with self._lock:
+                self._loading = False
+            raise
+        
+        with self._lock:
+            self.transactions = loaded[SheetsService.TRANSACCIONES_SHEET][1]
+            self.budgets = loaded[SheetsService.PRESUPUESTOS_SHEET][1]
+            self.capital = loaded[SheetsService.CAPITAL_SHEET][1]
+            self.archive = TimeIndex()
+            self._synced_rows = {sheet_name: loaded[sheet_name][0] for sheet_name in self.SNAPSHOT_SHEETS}
+            self._last_rows = {sheet_name: loaded[sheet_name][2] for sheet_name in self.SNAPSHOT_SHEETS}
+            # Apply batches written during the load that the read did not include
+            for sheet_name, rows, first_row in self._buffered:
+                read_rows = loaded[sheet_name][0] if sheet_name in loaded else 0
+                if first_row is None or first_row - 2 >= read_rows:
+                    self._insert_rows(sheet_name, rows, first_row)
+            self._buffered = []
+            self._archive_years = set()
+            self._loading = False
+            self._loaded = True
+            self.version += 1
+        
+        logger.info(f"Ledger loaded: {len(self.transactions)} transacciones, "
+                    f"{len(self.budgets)} presupuestos, {len(self.capital)} movimientos de capital")
+    
+    def save_snapshot(self) -> bool:
+        """
+        Write the snapshot if the ledger changed since the last one (blocking).
+        
+        Returns:
+            True if a snapshot was written
+        """
+        if self.snapshot is None:
+            return False
+        with self._lock:
+            if not self._loaded or self.version == self._saved_version:
+                return False
+            version = self.version
+            tables = {sheet_name: SnapshotTable(index.range(), self._synced_rows[sheet_name],
+                                                self._last_rows.get(sheet_name))
+                      for sheet_name, index in ((SheetsService.TRANSACCIONES_SHEET, self.transactions),
+                                                (SheetsService.PRESUPUESTOS_SHEET, self.budgets))
+                      if self._synced_rows.get(sheet_name) is not None}
+        
+        # A sheet left out reads whole on the next start
+        self.snapshot.save(tables)
+        self._saved_version = version
+        return True
+    
+    def ensure_loaded(self) -> None:
+        """Load the ledger if it has not been loaded (blocking)."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.load()
+    
+    def ensure_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> None:
+        """
+        Make sure every record in [start, end) is loaded (blocking).
+        
+        Loads the ledger if needed, plus the Transacciones archives of the
+        years the range reaches into, all in one read.
+        
+        Args:
+            start: Inclusive lower bound (None for all history)
+            end: Exclusive upper bound (None for no bound)
+        """
+        self.ensure_loaded()
+        years = [year for year in self.sheets.archive_years
+                 if year not in self._archive_years
+                 and (start is None or year >= start.year) and (end is None or datetime(year, 1, 1) < end)]
+        if not years:
+            return
+        
+        archives = self.sheets.get_archive_rows(years)
+        with self._lock:
+            for year, rows in archives.items():
+                if year in self._archive_years:
+                    continue
+                for record in decode_transactions(rows):
+                    self.archive.insert(record)
+                self._archive_years.add(year)
+            self.version += 1
+        logger.info(f"Ledger loaded archives: {', '.join(map(str, sorted(archives)))}")
+    
+    def on_archived(self, year: int, rows: List[list]) -> None:
+        """
+        Archiver listener: move archived rows out of the hot index.
+        
+        They go to the archive index if that year is loaded, and are
+        otherwise forgotten until a query needs that year (keeping them
+        would count them twice).
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            for record in decode_transactions(rows):
+                if self.transactions.remove(record) and year in self._archive_years:
+                    self.archive.insert(record)
+            synced = self._synced_rows.get(SheetsService.TRANSACCIONES_SHEET)
+            if synced is not None:
+                self._synced_rows[SheetsService.TRANSACCIONES_SHEET] = max(synced - len(rows), 0)
+            self.version += 1
+    
+    def _insert_rows(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """Decode rows, add them to their index and track synced rows (lock held by caller)."""
+        target = self._index_for(sheet_name)
+        if target is None:
+            return
+        index, decode = target
+        rows = [[str(cell) for cell in row] for row in rows]
+        for record in decode(rows):
+            index.insert(record)
+        
+        if sheet_name in self.SNAPSHOT_SHEETS and rows:
+            synced = self._synced_rows.get(sheet_name)
+            if first_row is None or synced is None or first_row - 2 > synced:
+                # Unknown position, or rows added by someone else in between
+                self._synced_rows[sheet_name] = None
+            elif first_row - 2 + len(rows) > synced:
+                self._synced_rows[sheet_name] = first_row - 2 + len(rows)
+                self._last_rows[sheet_name] = row_fingerprint(rows[-1])
+    
+    def on_rows_written(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """Outbox flush listener: add written rows to the index."""
+        with self._lock:
+            if self._loading:
+                self._buffered.append((sheet_name, rows, first_row))
+            elif self._loaded:
+                self._insert_rows(sheet_name, rows, first_row)
+                self.version += 1
+    
+    def on_capital_updated(self, before: List[CapitalRecord], after: List[CapitalRecord]) -> None:
+        """Capital index listener: replace withdrawn/updated movements."""
+        with self._lock:
+            if not self._loaded:
+                return
+            for old, new in zip(before, after):
+                self.capital.replace(old, new)
+            self.version += 1
+    
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              tipo: Optional[str] = None, categoria: Optional[str] = None) -> List[LedgerRecord]:
+        """
+        Records in a date range, optionally filtered by tipo and categoria.
+        
+        Only loaded records are searched: call ensure_range() first so the
+        archives the range needs are read.
+        
+        Args:
+            start: Inclusive lower bound (None for the beginning)
+            end: Exclusive upper bound (None for the end)
+            tipo: gasto, ingreso, presupuesto, ahorro or inversion (None for all)
+            categoria: Category, or institution for capital movements
+        
+        Returns:
+            Matching records in date order
+        """
+        with self._lock:
+            if tipo in ("gasto", "ingreso"):
+                sources = [self.archive, self.transactions]
+            elif tipo == "presupuesto":
+                sources = [self.budgets]
+            elif tipo in ("ahorro", "inversion"):
+                sources = [self.capital]
+            else:
+                sources = [self.archive, self.transactions, self.budgets, self.capital]
+            ranges = [index.range(start, end) for index in sources]
+        
+        records = ranges[0] if len(ranges) == 1 else sorted(
+            (record for found in ranges for record in found), key=lambda record: record.fecha)
+        
+        if tipo:
+            records = [record for record in records if record_tipo(record) == tipo]
+        if categoria:
+            categoria = categoria.lower().strip()
+            records = [record for record in records
+                       if getattr(record, "categoria", None) == categoria
+                       or getattr(record, "institucion", None) == categoria]
+        return records
@@ -7,12 +7,17 @@ Uses OpenAI's GPT models to parse Spanish financial messages into structured dat
 import json
 import logging
 from typing import Optional, Dict, Any
-from openai import OpenAI
 from datetime import datetime
 
+from pydantic import ValidationError
+
 from domain.transaction import Transaction, TransactionType
 from domain.capital import CapitalMovement, CapitalType, CapitalStatus
 from services.config import settings
+from services.prompts import get_profile, build_output_schema
+from services.parser_backends import HeuristicBackend, ParserBackend, OpenAIBackend, create_backend
+from services.metrics import metrics
+from services.usage import UsageTracker
 
 logger = logging.getLogger(__name__)
 
@@ -24,74 +29,105 @@ class LLMService:
     Converts messages like "Gasté 50 mil en comida" into structured Transaction objects.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, profile: Optional[str] = None,
+                 output_mode: Optional[str] = None, backend: Optional[ParserBackend] = None,
+                 usage: Optional[UsageTracker] = None):
         """
         Initialize the LLM service.
         
         Args:
             api_key: OpenAI API key (defaults to settings.OPENAI_API_KEY)
+            profile: Prompt profile name (defaults to settings.LLM_PROMPT_PROFILE)
+            output_mode: "json_schema", "json_object" or "text"
+                (defaults to settings.LLM_OUTPUT_MODE)
+            backend: Completion backend (defaults to settings.LLM_BACKEND;
+                api_key is used when it is the OpenAI backend)
+            usage: Token accounting and budgets (None to disable)
         """
-        self.client = OpenAI(api_key=api_key or settings.OPENAI_API_KEY)
+        if backend is None:
+            backend = OpenAIBackend(api_key=api_key) if api_key else create_backend()
+        self.backend = backend
+        self.usage = usage
+        self.fallback = HeuristicBackend()  # For users over their daily token budget
+        self.profile = get_profile(profile or settings.LLM_PROMPT_PROFILE)
+        self.output_mode = output_mode or settings.LLM_OUTPUT_MODE
+        self.output_schema = build_output_schema()
         self.system_prompt = self._build_system_prompt()
     
     def _build_system_prompt(self) -> str:
-        """Build the system prompt for the LLM."""
-        return """Eres un asistente financiero que ayuda a parsear mensajes en español sobre finanzas personales.
-
-Tu tarea es convertir mensajes de texto en un objeto JSON estructurado.
-
-HAY DOS TIPOS DE MENSAJES:
-
-1. TRANSACCIONES OPERATIVAS (gastos, ingresos, presupuestos):
-{
-    "tipo": "gasto" | "ingreso" | "presupuesto",
-    "monto": <número>,
-    "categoria": <string>,
-    "descripcion": <string>
-}
-
-2. MOVIMIENTOS DE CAPITAL (ahorros, inversiones):
-{
-    "tipo": "ahorro" | "inversion",
-    "monto": <número>,
-    "institucion": <string>,
-    "descripcion": <string>
-}
-
-REGLAS IMPORTANTES:
-1. "tipo" debe ser exactamente: "gasto", "ingreso", "presupuesto", "ahorro" o "inversion"
-2. "monto" debe ser un número. Si ves "mil" o "k", conviértelo (ej: "50 mil" = 50000)
-3. Para transacciones operativas usa "categoria" (comida, transporte, salario)
-4. Para movimientos de capital usa "institucion" (banco, cdt, acciones, davivienda)
-5. "descripcion" usa el mensaje original
-6. Si el mensaje es ambiguo, responde con {"error": "mensaje de error"}
-
-CLASIFICACIÓN:
-- Palabras clave para AHORRO: "ahorré", "guardé", "ahorrar", "guardar dinero", "ahorro"
-- Palabras clave para INVERSION: "invertí", "inversión", "CDT", "acciones", "bolsa", "plazo fijo"
-- Palabras clave para GASTO: "gasté", "compré", "pagué", "me costó"
-- Palabras clave para INGRESO: "recibí", "me pagaron", "salario", "ganancia", "ingreso"
-- Palabras clave para PRESUPUESTO: "presupuesto", "planear", "asignar"
-
-EJEMPLOS TRANSACCIONES:
-- "Gasté 50 mil en comida" → {"tipo": "gasto", "monto": 50000, "categoria": "comida", "descripcion": "Gasté 50 mil en comida"}
-- "Recibí 100 mil de salario" → {"tipo": "ingreso", "monto": 100000, "categoria": "salario", "descripcion": "Recibí 100 mil de salario"}
-- "Presupuesto de 300 mil para transporte" → {"tipo": "presupuesto", "monto": 300000, "categoria": "transporte", "descripcion": "Presupuesto de 300 mil para transporte"}
-
-EJEMPLOS CAPITAL:
-- "Ahorré 100 mil en el banco" → {"tipo": "ahorro", "monto": 100000, "institucion": "banco", "descripcion": "Ahorré 100 mil en el banco"}
-- "Invertí 500 mil en CDT" → {"tipo": "inversion", "monto": 500000, "institucion": "cdt", "descripcion": "Invertí 500 mil en CDT"}
-- "Guardé 200k en Davivienda" → {"tipo": "ahorro", "monto": 200000, "institucion": "davivienda", "descripcion": "Guardé 200k en Davivienda"}
-- "Inversión de 1 millón en acciones" → {"tipo": "inversion", "monto": 1000000, "institucion": "acciones", "descripcion": "Inversión de 1 millón en acciones"}
-
-Responde SOLO con el JSON, sin texto adicional."""
+        """Build the system prompt for the LLM from the active profile."""
+        return self.profile.system_prompt
+    
+    def _build_request(self, message: str) -> Dict[str, Any]:
+        """
+        Build the chat completion request for a message.
+        
+        The system prompt comes first, followed by the user message.
+        
+        Args:
+            message: User message
+        
+        Returns:
+            Keyword arguments for chat.completions.create()
+        """
+        request = {
+            "model": settings.LLM_MODEL,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": message}
+            ],
+            "temperature": 0.1,  # Low temperature for consistent parsing
+            "max_tokens": self.profile.max_tokens
+        }
+        
+        if self.output_mode == "json_schema":
+            request["response_format"] = self.output_schema
+        elif self.output_mode == "json_object":
+            request["response_format"] = {"type": "json_object"}
+        
+        return request
     
-    async def parse_message(self, message: str):
+    @staticmethod
+    def _decode_content(content: str) -> Optional[Dict[str, Any]]:
+        """
+        Decode the model output into a dict of non-null fields.
+        
+        Tolerates code fences around the JSON (seen in "text" mode).
+        
+        Args:
+            content: Raw completion text
+        
+        Returns:
+            Parsed fields, or None if the output is not a JSON object
+        """
+        text = content.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("{"):] if "{" in text else text
+        
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Malformed LLM output (invalid JSON: {e}): {content!r}")
+            return None
+        
+        if not isinstance(parsed, dict):
+            logger.warning(f"Malformed LLM output (not an object): {content!r}")
+            return None
+        
+        # Structured output returns every key; null means "not applicable"
+        return {key: value for key, value in parsed.items() if value is not None}
+    
+    async def parse_message(self, message: str, user_id=None):
         """
         Parse a natural language message into a Transaction or CapitalMovement object.
         
+        The call's tokens are charged to the user; a user over their daily
+        token budget is parsed with the heuristic backend instead.
+        
         Args:
             message: Natural language message in Spanish
+            user_id: Telegram user id the call is charged to
             
         Returns:
             Transaction or CapitalMovement object if parsing successful, None otherwise
@@ -104,29 +140,50 @@ Responde SOLO con el JSON, sin texto adicional."""
             >>> print(obj.monto)  # 50000
         """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Using the faster, cheaper model
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                temperature=0.1,  # Low temperature for consistent parsing
-                max_tokens=300
-            )
+            backend = self.backend
+            if self.usage is not None and self.usage.over_budget(user_id):
+                backend = self.fallback
+                metrics.inc("llm_budget_fallbacks_total")
+                logger.info(f"User {user_id} is over the daily token budget, parsing heuristically")
             
-            content = response.choices[0].message.content.strip()
-            logger.info(f"LLM Response: {content}")
+            completion = await backend.complete(self._build_request(message))
+            if self.usage is not None and not completion.replayed:
+                self.usage.record(user_id, completion.model or backend.name, self.profile.name,
+                                  completion.prompt_tokens, completion.completion_tokens, completion.latency_ms)
             
-            # Parse the JSON response
-            parsed_data = json.loads(content)
+            content = completion.content.strip()
+            logger.info(f"LLM Response ({backend.name}, {completion.latency_ms:.0f} ms): {content}")
             
-            # Check for errors
-            if "error" in parsed_data:
-                logger.warning(f"LLM returned error: {parsed_data['error']}")
+            # Parse the JSON response
+            parsed_data = self._decode_content(content)
+            if parsed_data is None:
                 return None, None
             
-            tipo = parsed_data.get("tipo", "").lower()
+            return self._to_domain(parsed_data, message)
             
+        except Exception as e:
+            logger.error(f"Error parsing message with LLM: {e}")
+            return None, None
+    
+    def _to_domain(self, parsed_data: Dict[str, Any], message: str):
+        """
+        Convert decoded LLM fields into a validated domain object.
+        
+        Args:
+            parsed_data: Non-null fields decoded from the model output
+            message: Original user message (descripcion when the model leaves it out)
+        
+        Returns:
+            tuple: (object, "transaction" | "capital") or (None, None)
+        """
+        # Check for errors
+        if "error" in parsed_data:
+            logger.warning(f"LLM returned error: {parsed_data['error']}")
+            return None, None
+        
+        tipo = str(parsed_data.get("tipo", "")).lower()
+        
+        try:
             # Determine if it's a capital movement or transaction
             if tipo in ["ahorro", "inversion"]:
                 # Create CapitalMovement object
@@ -134,7 +191,7 @@ Responde SOLO con el JSON, sin texto adicional."""
                     "tipo": tipo,
                     "monto": parsed_data.get("monto"),
                     "institucion": parsed_data.get("institucion", "general"),
-                    "descripcion": parsed_data.get("descripcion"),
+                    "descripcion": parsed_data.get("descripcion") or message,
                     "fecha": datetime.now(),
                     "estado": "activo",
                     "retorno": 0.0
@@ -144,18 +201,18 @@ Responde SOLO con el JSON, sin texto adicional."""
                 return capital, "capital"
             else:
                 # Create Transaction object
-                if "fecha" not in parsed_data:
-                    parsed_data["fecha"] = datetime.now().isoformat()
-                
-                transaction = Transaction(**parsed_data)
+                transaction_data = {
+                    "tipo": tipo,
+                    "monto": parsed_data.get("monto"),
+                    "categoria": parsed_data.get("categoria"),
+                    "descripcion": parsed_data.get("descripcion") or message,
+                    "fecha": parsed_data.get("fecha", datetime.now())
+                }
+                transaction = Transaction(**transaction_data)
                 logger.info(f"Successfully parsed transaction: {transaction}")
                 return transaction, "transaction"
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {e}")
-            return None, None
-        except Exception as e:
-            logger.error(f"Error parsing message with LLM: {e}")
+        except ValidationError as e:
+            logger.warning(f"Malformed LLM output (failed validation): {parsed_data} - {e}")
             return None, None
     
     def get_example_messages(self) -> list[str]:
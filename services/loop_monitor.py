@@ -0,0 +1,197 @@
+"""
+Event-loop stall detector.
+
+A heartbeat task measures how late the event loop wakes it up (scheduling
+lag), and a watchdog thread notices when the heartbeat stops while the loop
+is blocked. During a stall the watchdog captures the loop thread's stack with
+sys._current_frames() and walks it for the Telegram update being handled, so
+a blocking call hidden in async code is attributed to its handler and
+message. Lag goes to the metrics registry; stalls to a ring buffer served by
+the /debug/loop route.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+from services.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lag buckets in seconds
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Innermost stack frames kept per stall
+_STACK_DEPTH = 30
+
+metrics.describe("loop_lag_seconds", "Event loop scheduling delay of the heartbeat")
+metrics.describe("loop_stalls_total", "Event loop stalls longer than the threshold")
+metrics.describe("loop_stall_seconds_max", "Longest event loop stall since startup")
+
+
+def _find_update(frame: Optional[FrameType]) -> Optional[Dict[str, Any]]:
+    """
+    Find the Telegram update being handled in a stack.
+    
+    Handlers receive it as their "update" argument. The walk starts at the
+    innermost frame and skips the telegram package, whose dispatcher
+    (Application.process_update) holds the same update further out, so
+    the first frame found is the handler code that was running.
+    """
+    while frame is not None:
+        module = frame.f_globals.get("__name__") or ""
+        update = frame.f_locals.get("update")
+        if update is not None and hasattr(update, "update_id") and module.split(".")[0] != "telegram":
+            message = getattr(update, "effective_message", None)
+            user = getattr(update, "effective_user", None)
+            return {
+                "handler": f"{module}.{frame.f_code.co_name}",
+                "update_id": update.update_id,
+                "user_id": user.id if user else None,
+                "text": (message.text or "")[:100] if message else None,
+            }
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    """
+    Heartbeat on the event loop plus a watchdog thread.
+    
+    Stalls are kept in a bounded deque, newest last.
+    """
+    
+    def __init__(self, threshold: Optional[float] = None, interval: Optional[float] = None,
+                 capacity: Optional[int] = None):
+        """
+        Initialize a stopped monitor.
+        
+        Args:
+            threshold: Seconds of lag that count as a stall
+            interval: Seconds between heartbeats
+            capacity: Stalls kept in the ring buffer
+        """
+        self.threshold = threshold or settings.LOOP_STALL_THRESHOLD
+        self.interval = interval or settings.LOOP_MONITOR_INTERVAL
+        self.stalls: deque = deque(maxlen=capacity or settings.LOOP_STALL_BUFFER)
+        self.max_lag = 0.0
+        self._heartbeat = 0.0
+        self._captured_for: Optional[float] = None  # Heartbeat whose stall was captured
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+    
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Loop monitor started (stall threshold {self.threshold * 1000:.0f} ms)")
+    
+    async def stop(self) -> None:
+        """Stop the heartbeat and the watchdog."""
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        """Heartbeat: sleep one interval and measure how late the loop woke us."""
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(now - expected, 0.0)
+            self._heartbeat = now
+            
+            metrics.observe("loop_lag_seconds", lag, buckets=LAG_BUCKETS)
+            if lag < self.threshold:
+                continue
+            
+            metrics.inc("loop_stalls_total")
+            if lag > self.max_lag:
+                self.max_lag = lag
+                metrics.set("loop_stall_seconds_max", lag)
+            self._finish_stall(lag)
+    
+    def _finish_stall(self, lag: float) -> None:
+        """Record the duration of a stall once the loop is running again."""
+        with self._lock:
+            if self._captured_for is not None and self.stalls and self.stalls[-1]["duration_ms"] is None:
+                event = self.stalls[-1]
+            else:
+                # Too short for the watchdog to catch: no stack
+                event = self._new_event(None)
+                self.stalls.append(event)
+            event["duration_ms"] = round(lag * 1000, 1)
+            self._captured_for = None
+        logger.warning(f"Event loop stalled {lag * 1000:.0f} ms"
+                       + (f" in {event['update']['handler']}" if event["update"] else ""))
+    
+    def _new_event(self, frame: Optional[FrameType]) -> Dict[str, Any]:
+        """A ring buffer entry, with the stack of the loop thread when given."""
+        stack = None
+        if frame is not None:
+            stack = traceback.format_list(traceback.extract_stack(frame)[-_STACK_DEPTH:])
+        return {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": None,  # Set when the loop recovers
+            "update": _find_update(frame),
+            "stack": [line.rstrip() for line in stack] if stack else None,
+        }
+    
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop's stack while the heartbeat is overdue."""
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.perf_counter() - heartbeat - self.interval
+            if overdue < self.threshold or self._captured_for == heartbeat:
+                continue
+            
+            frame = sys._current_frames().get(self._loop_thread_id)
+            try:
+                event = self._new_event(frame)
+            except Exception as e:
+                # The stack moved on while being read
+                logger.debug(f"Could not capture loop stack: {e}")
+                continue
+            finally:
+                del frame
+            with self._lock:
+                self.stalls.append(event)
+                self._captured_for = heartbeat
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        State for the debug route.
+        
+        Returns:
+            Settings, the worst lag and the buffered stalls (newest first)
+        """
+        with self._lock:
+            stalls: List[Dict[str, Any]] = list(reversed(self.stalls))
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls_total": int(metrics.get("loop_stalls_total")),
+            "stalls": stalls,
+        }
@@ -0,0 +1,142 @@
+"""
+In-process metrics registry.
+
+Counters, gauges and histograms with labels, kept in memory and rendered in
+the Prometheus text exposition format by the /metrics route. Thread-safe, so
+worker threads (Sheets writes, watchdogs) can record metrics too.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default histogram buckets in seconds (upper bounds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> LabelSet:
+    """Hashable, ordered label set."""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render {key="value",...} (empty string without labels)."""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Histogram:
+    """Cumulative histogram of one label set."""
+    
+    __slots__ = ("buckets", "counts", "total", "count")
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Named metrics with labels.
+    
+    Metrics are created on first use; describe() adds the HELP line.
+    """
+    
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+        self._values: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, _Histogram]] = {}
+        self._collectors: List[Callable[[], None]] = []
+    
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that updates its gauges right before each render."""
+        self._collectors.append(collector)
+    
+    def unregister_collector(self, collector: Callable[[], None]) -> None:
+        """Remove a collector registered with register_collector (no-op if it is not registered)."""
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+    
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the HELP text of a metric."""
+        self._help[name] = help_text
+    
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add to a counter."""
+        key = _labels(labels)
+        with self._lock:
+            self._types.setdefault(name, "counter")
+            values = self._values.setdefault(name, {})
+            values[key] = values.get(key, 0.0) + value
+    
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge."""
+        key = _labels(labels)
+        with self._lock:
+            self._types.setdefault(name, "gauge")
+            self._values.setdefault(name, {})[key] = value
+    
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS, **labels) -> None:
+        """Record a value in a histogram."""
+        key = _labels(labels)
+        with self._lock:
+            self._types.setdefault(name, "histogram")
+            histograms = self._histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+    
+    def get(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 if never set)."""
+        with self._lock:
+            return self._values.get(name, {}).get(_labels(labels), 0.0)
+    
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+        
+        Returns:
+            Exposition text
+        """
+        for collector in list(self._collectors):
+            collector()
+        
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._types):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {self._types[name]}")
+                
+                for labels, value in sorted(self._values.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                
+                for labels, histogram in sorted(self._histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        bound_text = bound if isinstance(bound, str) else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound_text))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,359 @@
+"""
+Migration of the legacy Gastos / Ingresos sheets into Transacciones.
+
+Spreadsheets created before the unified layout keep gastos and ingresos in
+separate "Gastos" and "Ingresos" sheets (Fecha, Tipo, Monto, Categoría,
+Descripción). The migrator streams them in fixed windows of rows, converts
+each row to TRANSACCIONES_HEADER (Es Ingreso from Tipo, or from the sheet
+it came from) and appends every window with a single append_rows call,
+pacing API calls under the per-user quota and backing off on 429/5xx.
+A sheet is finished once the windows pass the last row of its grid, since
+a window that comes back short may just end in blank rows.
+
+Progress is checkpointed in DATA_DIR/migration_checkpoint.json after every
+window, so an interrupted run resumes where it stopped. The window being
+written is recorded before the append; on resume it is looked up in
+Transacciones and only appended again if it never landed, so a crash
+between the append and the checkpoint does not duplicate rows.
+checksum_report() compares row counts, totals and an order-independent
+digest of the legacy sheets with the migrated rows.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.config import settings
+from services.row_decoder import parse_amount, parse_bool, parse_timestamp
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Bump when the checkpoint layout changes
+_FORMAT_VERSION = 1
+
+# Legacy sheets and the Es Ingreso value of rows without a usable Tipo
+LEGACY_SHEETS = {"Gastos": False, "Ingresos": True}
+
+# HTTP statuses worth retrying (quota exceeded, transient server errors)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# (legacy sheet, rows migrated so far, rows read so far)
+ProgressCallback = Callable[[str, int, int], None]
+
+RowKey = Tuple[str, str, str, bool, Any]
+
+
+def convert_legacy_row(row: List, default_ingreso: bool) -> Optional[list]:
+    """
+    Convert a legacy row (Fecha, Tipo, Monto, Categoría, Descripción) to TRANSACCIONES_HEADER.
+    
+    Monto is written as a number when it parses; otherwise the cell is
+    copied as is, so nothing is lost and the user can fix it in place.
+    
+    Args:
+        row: Legacy sheet row
+        default_ingreso: Es Ingreso when Tipo is neither "gasto" nor "ingreso"
+    
+    Returns:
+        Transacciones row, or None for a blank row
+    """
+    cells = [str(cell).strip() for cell in row[:5]] + [""] * (5 - len(row[:5]))
+    fecha, tipo, monto, categoria, descripcion = cells
+    if not any(cells):
+        return None
+    tipo = tipo.lower()
+    es_ingreso = tipo == "ingreso" if tipo in ("gasto", "ingreso") else default_ingreso
+    amount = parse_amount(monto)
+    return [fecha, amount if amount is not None else monto, categoria.lower(), descripcion, es_ingreso]
+
+
+def is_valid_row(row: list) -> bool:
+    """True if a converted row has a readable Fecha and Monto."""
+    return parse_timestamp(str(row[0])) is not None and isinstance(row[1], float)
+
+
+def row_key(row: List) -> RowKey:
+    """
+    Compare a converted row with a Transacciones row as read back from the sheet.
+    
+    Text cells are stripped and Categoría lowercased; Monto is compared as
+    a parsed amount, since the sheet may format it differently.
+    """
+    padded = list(row[:5]) + [""] * (5 - len(row[:5]))
+    cells = [str(cell).strip() for cell in padded]
+    amount = padded[1] if isinstance(padded[1], float) else parse_amount(cells[1])
+    return (cells[0], cells[2].lower(), cells[3],
+            padded[4] if isinstance(padded[4], bool) else parse_bool(cells[4]),
+            amount if amount is not None else cells[1])
+
+
+def _digest(keys: Counter) -> str:
+    """Order-independent checksum of a multiset of row keys (sum of 64-bit hashes)."""
+    total = 0
+    for key, count in keys.items():
+        value = int.from_bytes(hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).digest(), "big")
+        total = (total + value * count) % (1 << 64)
+    return f"{total:016x}"
+
+
+class LegacyMigrator:
+    """
+    Resumable, quota-paced copy of the legacy sheets into Transacciones.
+    
+    Run it with the bot stopped (or follow it with /recalcular), since the
+    bot's ledger does not see rows written by another process until it
+    reloads.
+    """
+    
+    def __init__(self, sheets: SheetsService, checkpoint_path: Optional[str] = None,
+                 chunk_rows: Optional[int] = None, requests_per_minute: Optional[int] = None,
+                 reset: bool = False):
+        """
+        Initialize the migrator and load its checkpoint.
+        
+        Args:
+            sheets: Connected SheetsService (with initialize_sheets done)
+            checkpoint_path: Checkpoint file (defaults to DATA_DIR/migration_checkpoint.json)
+            chunk_rows: Legacy rows read and appended per API call
+            requests_per_minute: Most API calls the migrator makes per minute
+            reset: Start over, ignoring the checkpoint (rows already migrated stay in Transacciones)
+        
+        Raises:
+            ValueError: If the checkpoint belongs to another spreadsheet and reset is False
+        """
+        self.sheets = sheets
+        self.path = Path(checkpoint_path) if checkpoint_path else Path(settings.DATA_DIR) / "migration_checkpoint.json"
+        self.chunk_rows = chunk_rows or settings.MIGRATION_CHUNK_ROWS
+        self.interval = 60.0 / (requests_per_minute or settings.MIGRATION_REQUESTS_PER_MINUTE)
+        self._last_call = 0.0
+        self.state = self._new_state() if reset else self._load()
+    
+    def _new_state(self) -> Dict[str, Any]:
+        """Checkpoint of a migration that has not started."""
+        return {
+            "version": _FORMAT_VERSION,
+            "spreadsheet_id": self.sheets.spreadsheet_id,
+            "sheets": {},
+            "pending": None,
+        }
+    
+    def _load(self) -> Dict[str, Any]:
+        """
+        Load the checkpoint from disk.
+        
+        Raises:
+            ValueError: If the checkpoint belongs to another spreadsheet
+        """
+        if not self.path.exists():
+            return self._new_state()
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading migration checkpoint from {self.path}: {e}")
+            return self._new_state()
+        if state.get("version") != _FORMAT_VERSION:
+            return self._new_state()
+        if state.get("spreadsheet_id") != self.sheets.spreadsheet_id:
+            raise ValueError(f"{self.path} belongs to spreadsheet {state.get('spreadsheet_id')}; "
+                             f"start over to migrate {self.sheets.spreadsheet_id}")
+        return state
+    
+    def save(self) -> None:
+        """Write the checkpoint to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def _sheet_state(self, sheet_name: str) -> Dict[str, Any]:
+        """Progress of one legacy sheet."""
+        return self.state["sheets"].setdefault(sheet_name, {
+            "next_row": 2,    # Next legacy sheet row to read (row 1 is the header)
+            "read": 0,        # Legacy rows read, blank ones included
+            "migrated": 0,    # Rows appended to Transacciones
+            "invalid": 0,     # Migrated rows whose Fecha or Monto does not parse
+            "total": 0.0,     # Sum of the valid Montos migrated
+            "done": False,
+        })
+    
+    def _call(self, func: Callable, *args, **kwargs):
+        """
+        Make a Sheets API call, spaced out by the request rate and retried on quota or server errors.
+        
+        Raises:
+            gspread.exceptions.APIError: If the call still fails after MIGRATION_MAX_RETRIES retries
+        """
+        from gspread.exceptions import APIError
+        
+        backoff = max(self.interval, 1.0)
+        for attempt in range(settings.MIGRATION_MAX_RETRIES + 1):
+            wait = self._last_call + self.interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_call = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            except APIError as e:
+                status = getattr(e.response, "status_code", None)
+                if status not in _RETRY_STATUSES or attempt == settings.MIGRATION_MAX_RETRIES:
+                    raise
+                logger.warning(f"Sheets API returned {status}, retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 120)
+    
+    def _commit(self, pending: Dict[str, Any]) -> None:
+        """Count a window as migrated and move past it."""
+        entry = self._sheet_state(pending["sheet"])
+        valid = [row for row in pending["rows"] if is_valid_row(row)]
+        entry["next_row"] = pending["first_row"] + pending["read"]
+        entry["read"] += pending["read"]
+        entry["migrated"] += len(pending["rows"])
+        entry["invalid"] += len(pending["rows"]) - len(valid)
+        entry["total"] = round(entry["total"] + sum(row[1] for row in valid), 2)
+        # The sheet's real end: a short window may just end in blank rows
+        if pending.get("last_row") and entry["next_row"] > pending["last_row"]:
+            entry["done"] = True
+    
+    def _resolve_pending(self) -> None:
+        """Finish a window whose append was interrupted: commit it if it landed, else drop it."""
+        pending = self.state.get("pending")
+        if not pending:
+            return
+        
+        target_row = pending.get("target_row") or 2
+        written = self._call(self.sheets.get_rows_from,
+                             {SheetsService.TRANSACCIONES_SHEET: target_row})[SheetsService.TRANSACCIONES_SHEET]
+        found = Counter(row_key(row) for row in written)
+        wanted = Counter(row_key(row) for row in pending["rows"])
+        if all(found[key] >= count for key, count in wanted.items()):
+            logger.info(f"Interrupted window of {pending['sheet']} at row {pending['first_row']} "
+                        f"was written; resuming after it")
+            self._commit(pending)
+        else:
+            logger.info(f"Interrupted window of {pending['sheet']} at row {pending['first_row']} "
+                        f"was not written; migrating it again")
+        self.state["pending"] = None
+        self.save()
+    
+    def run(self, sheet_names: Optional[List[str]] = None,
+            progress: Optional[ProgressCallback] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Migrate legacy sheets, resuming from the checkpoint (blocking).
+        
+        Errors are raised; progress up to the last finished window is kept,
+        so a failed run can simply be started again.
+        
+        Args:
+            sheet_names: Legacy sheets to migrate (defaults to LEGACY_SHEETS)
+            progress: Called after every window
+        
+        Returns:
+            Legacy sheet → its checkpoint entry
+        """
+        sizes = self._call(self.sheets.get_sheet_row_counts)
+        self._resolve_pending()
+        
+        # First free Transacciones row, so an interrupted window can be looked up from there
+        target_row: Optional[int] = None
+        for sheet_name in sheet_names or list(LEGACY_SHEETS):
+            if sheet_name not in sizes:
+                logger.info(f"No legacy sheet {sheet_name}; nothing to migrate")
+                continue
+            last_row = sizes[sheet_name]
+            entry = self._sheet_state(sheet_name)
+            while not entry["done"]:
+                if target_row is None:
+                    target_row = self._call(self.sheets.get_row_count, SheetsService.TRANSACCIONES_SHEET) + 1
+                
+                first_row = entry["next_row"]
+                rows = self._call(self.sheets.get_row_chunk, sheet_name, first_row, self.chunk_rows)
+                converted = [row for row in (convert_legacy_row(row, LEGACY_SHEETS.get(sheet_name, False))
+                                             for row in rows) if row is not None]
+                # The whole window was covered, even if its last rows came back blank
+                read = max(min(self.chunk_rows, last_row - first_row + 1), len(rows))
+                pending = {"sheet": sheet_name, "first_row": first_row, "read": read,
+                           "last_row": last_row, "target_row": target_row, "rows": converted}
+                if converted:
+                    self.state["pending"] = pending
+                    self.save()
+                    appended_at = self._call(self.sheets.append_rows, SheetsService.TRANSACCIONES_SHEET, converted)
+                    target_row = appended_at + len(converted) if appended_at else None
+                
+                self._commit(pending)
+                self.state["pending"] = None
+                self.save()
+                logger.info(f"Migrated {sheet_name} rows {first_row}-{first_row + read - 1} "
+                            f"({entry['migrated']} so far)")
+                if progress:
+                    progress(sheet_name, entry["migrated"], entry["read"])
+        return dict(self.state["sheets"])
+    
+    def _legacy_keys(self, sheet_name: str, last_row: int) -> Tuple[Counter, int]:
+        """Keys of every non-blank row of a legacy sheet, read window by window up to last_row, and the rows read."""
+        keys: Counter = Counter()
+        first_row = 2
+        while first_row <= last_row:
+            rows = self._call(self.sheets.get_row_chunk, sheet_name, first_row, self.chunk_rows)
+            for row in rows:
+                converted = convert_legacy_row(row, LEGACY_SHEETS.get(sheet_name, False))
+                if converted is not None:
+                    keys[row_key(converted)] += 1
+            first_row += self.chunk_rows
+        return keys, max(min(first_row, last_row + 1) - 2, 0)
+    
+    def checksum_report(self, sheet_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Verify the migration: every legacy row must be in Transacciones (or its archives) once.
+        
+        Rows are matched by Fecha, Categoría, Descripción, Es Ingreso and
+        parsed Monto; rows the bot wrote itself are ignored. Digests are an
+        order-independent hash of the matched keys, equal on both sides
+        when nothing is missing.
+        
+        Args:
+            sheet_names: Legacy sheets to check (defaults to LEGACY_SHEETS)
+        
+        Returns:
+            Per legacy sheet: rows, valid rows, total and digest on each
+            side, missing and duplicated rows, the checkpoint counters, and
+            "ok"; plus an overall "ok"
+        """
+        sizes = self._call(self.sheets.get_sheet_row_counts)
+        target = Counter(row_key(row) for row in self._call(self.sheets.get_transaction_rows) if any(row))
+        
+        report: Dict[str, Any] = {"sheets": {}, "ok": True}
+        for sheet_name in sheet_names or list(LEGACY_SHEETS):
+            if sheet_name not in sizes:
+                continue
+            source, read = self._legacy_keys(sheet_name, sizes[sheet_name])
+            matched = Counter({key: min(count, target[key]) for key, count in source.items()})
+            missing = sum(count - matched[key] for key, count in source.items())
+            duplicated = sum(max(target[key] - count, 0) for key, count in source.items())
+            
+            def side(keys: Counter) -> Dict[str, Any]:
+                valid = {key: count for key, count in keys.items() if isinstance(key[4], float)}
+                return {
+                    "rows": sum(keys.values()),
+                    "valid": sum(valid.values()),
+                    "total": round(sum(key[4] * count for key, count in valid.items()), 2),
+                    "digest": _digest(keys),
+                }
+            
+            entry = self.state["sheets"].get(sheet_name, {})
+            report["sheets"][sheet_name] = {
+                "rows_read": read,
+                "source": side(source),
+                "target": side(matched),
+                "missing": missing,
+                "duplicated": duplicated,
+                "checkpoint": {"migrated": entry.get("migrated", 0), "total": entry.get("total", 0.0),
+                               "done": entry.get("done", False)},
+                "ok": missing == 0 and duplicated == 0,
+            }
+            report["ok"] = report["ok"] and missing == 0 and duplicated == 0
+        return report
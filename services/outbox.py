@@ -0,0 +1,391 @@
+"""
+Durable local outbox (write-ahead log) for records bound to Google Sheets.
+
+Parsed records are appended and fsync'd to a local JSON-lines file before the
+user is acknowledged. A background drainer replays pending entries to Sheets
+in per-sheet batches and survives restarts.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from domain.transaction import Transaction
+from domain.capital import CapitalMovement
+from services.config import settings
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Acked ids remembered for idempotent enqueues (compaction forgets older ones anyway)
+_ACKED_MEMORY = 10000
+
+# Called after rows are written: (sheet_name, rows, first_row_number)
+FlushListener = Callable[[str, List[list], Optional[int]], None]
+
+
+class Outbox:
+    """
+    Append-only log of rows waiting to be written to Google Sheets.
+    
+    The log contains three kinds of lines:
+    - {"op": "put", "id": ..., "sheet": ..., "row": [...]}: a pending row
+    - {"op": "begin", "ids": [...]}: a batch is about to be appended
+    - {"op": "ack", "ids": [...]}: the batch was written to Sheets
+    
+    A batch that was begun but never acked (the process died mid-write) is
+    checked against the tail of its sheet on the next drain, so replay never
+    duplicates rows.
+    """
+    
+    def __init__(self, path: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        """
+        Initialize the outbox and recover pending entries from disk.
+        
+        Args:
+            path: Path to the outbox file (defaults to DATA_DIR/outbox.jsonl)
+            batch_size: Maximum rows per append_rows call
+            flush_interval: Seconds between drains when idle
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "outbox.jsonl"
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.OUTBOX_FLUSH_INTERVAL
+        
+        self._pending: "OrderedDict[str, Tuple[str, list]]" = OrderedDict()
+        self._in_flight: Set[str] = set()  # Begun but not acked before a restart
+        self._acked: "OrderedDict[str, None]" = OrderedDict()  # Most recent last, bounded
+        self._listeners: List[FlushListener] = []
+        self._lines = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._recover()
+        self._file = open(self.path, "a", encoding="utf-8")
+    
+    def _recover(self) -> None:
+        """Rebuild pending state by replaying the log file."""
+        if not self.path.exists():
+            return
+        
+        begun: Set[str] = set()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write: nothing was acked for it
+                    logger.warning(f"Skipping corrupt outbox line: {line[:80]}")
+                    continue
+                
+                self._lines += 1
+                op = entry.get("op")
+                if op == "put":
+                    self._pending[entry["id"]] = (entry["sheet"], entry["row"])
+                elif op == "begin":
+                    begun.update(entry["ids"])
+                elif op == "ack":
+                    for entry_id in entry["ids"]:
+                        self._pending.pop(entry_id, None)
+                        begun.discard(entry_id)
+                        self._remember_acked(entry_id)
+        
+        self._in_flight = begun & set(self._pending)
+        if self._pending:
+            logger.info(f"Recovered {len(self._pending)} pending outbox entries "
+                        f"({len(self._in_flight)} possibly written)")
+    
+    def _remember_acked(self, entry_id: str) -> None:
+        """Remember an acked id, forgetting the oldest beyond _ACKED_MEMORY."""
+        self._acked[entry_id] = None
+        self._acked.move_to_end(entry_id)
+        while len(self._acked) > _ACKED_MEMORY:
+            self._acked.popitem(last=False)
+    
+    def _write(self, entry: dict) -> None:
+        """Append one line to the log and fsync it."""
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._lines += 1
+    
+    def subscribe(self, listener: FlushListener) -> None:
+        """
+        Register a callback invoked after each batch is written to Sheets.
+        
+        Args:
+            listener: Callable receiving (sheet_name, rows, first_row_number)
+        """
+        self._listeners.append(listener)
+    
+    def enqueue(self, sheet_name: str, row: list, entry_id: Optional[str] = None) -> Optional[str]:
+        """
+        Durably record a row for later writing to Sheets.
+        
+        Args:
+            sheet_name: Target sheet title
+            row: Row values
+            entry_id: Optional idempotency key; a known id is not enqueued twice
+        
+        Returns:
+            The entry id, or None if the row could not be persisted
+        """
+        entry_id = entry_id or uuid.uuid4().hex
+        if entry_id in self._pending or entry_id in self._acked:
+            return entry_id
+        
+        try:
+            self._write({"op": "put", "id": entry_id, "sheet": sheet_name, "row": row})
+        except OSError as e:
+            logger.error(f"Error writing to outbox: {e}")
+            return None
+        
+        self._pending[entry_id] = (sheet_name, row)
+        if self._wakeup:
+            self._wakeup.set()
+        return entry_id
+    
+    def enqueue_record(self, record: Union[Transaction, CapitalMovement],
+                       entry_id: Optional[str] = None) -> Optional[str]:
+        """
+        Durably record a Transaction or CapitalMovement.
+        
+        Args:
+            record: Domain record to save
+            entry_id: Optional idempotency key
+        
+        Returns:
+            The entry id, or None if the record could not be persisted
+        """
+        try:
+            sheet_name, row = SheetsService.row_for_record(record)
+        except ValueError as e:
+            logger.warning(str(e))
+            return None
+        return self.enqueue(sheet_name, row, entry_id)
+    
+    @property
+    def pending_count(self) -> int:
+        """Number of entries not yet written to Sheets."""
+        return len(self._pending)
+    
+    @staticmethod
+    def _fingerprint(row: list, reference: list) -> tuple:
+        """
+        Build a comparable key for a row using the text columns of a reference row.
+        
+        Numbers and booleans come back from Sheets formatted, while text cells
+        (fecha, categoría, descripción...) round-trip unchanged, so only those
+        are compared.
+        """
+        return tuple(
+            str(row[i]).strip() if i < len(row) else ""
+            for i, value in enumerate(reference)
+            if isinstance(value, str)
+        )
+    
+    def _already_written(self, sheets: SheetsService, sheet_name: str,
+                         batch: List[Tuple[str, list]]) -> Set[str]:
+        """
+        Find in-flight entries whose rows are already at the end of the sheet.
+        
+        Args:
+            sheets: Connected SheetsService
+            sheet_name: Sheet the batch targets
+            batch: (entry_id, row) pairs
+        
+        Returns:
+            Ids of entries that were written before the last crash
+        """
+        suspects = [(entry_id, row) for entry_id, row in batch if entry_id in self._in_flight]
+        if not suspects:
+            return set()
+        
+        # Rows of other batches may have landed after ours, so look a bit further back
+        tail = sheets.get_tail_rows(sheet_name, len(batch) + 50)
+        written = set()
+        for entry_id, row in suspects:
+            fingerprint = self._fingerprint(row, row)
+            if any(self._fingerprint(existing, row) == fingerprint for existing in tail):
+                written.add(entry_id)
+        return written
+    
+    def _drain_sheet(self, sheets: SheetsService, sheet_name: str,
+                     batch: List[Tuple[str, list]]) -> Tuple[List[list], Optional[int]]:
+        """
+        Write one batch to a sheet (blocking).
+        
+        Returns:
+            Tuple (rows actually appended, first row number)
+        """
+        skipped = self._already_written(sheets, sheet_name, batch)
+        if skipped:
+            logger.info(f"Skipping {len(skipped)} outbox entries already in {sheet_name}")
+        
+        to_write = [(entry_id, row) for entry_id, row in batch if entry_id not in skipped]
+        first_row = None
+        if to_write:
+            first_row = sheets.append_rows(sheet_name, [row for _, row in to_write])
+        return [row for _, row in to_write], first_row
+    
+    async def drain(self, sheets: SheetsService) -> int:
+        """
+        Write all pending entries to Sheets, one append_rows per sheet and batch.
+        
+        Args:
+            sheets: Connected SheetsService
+        
+        Returns:
+            Number of entries acknowledged
+        """
+        by_sheet: Dict[str, List[Tuple[str, list]]] = {}
+        for entry_id, (sheet_name, row) in self._pending.items():
+            by_sheet.setdefault(sheet_name, []).append((entry_id, row))
+        
+        acked = 0
+        for sheet_name, entries in by_sheet.items():
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start:start + self.batch_size]
+                # A cancelled drain (stop() cancels the drainer) still lets the
+                # batch being appended get its ack, so it is not written twice
+                write = asyncio.ensure_future(self._write_batch(sheets, sheet_name, batch))
+                try:
+                    acked += await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    await asyncio.gather(write, return_exceptions=True)
+                    raise
+        
+        self._compact()
+        return acked
+    
+    async def _write_batch(self, sheets: SheetsService, sheet_name: str, batch: List[Tuple[str, list]]) -> int:
+        """
+        Append one batch between its begin and ack log lines.
+        
+        Returns:
+            Number of entries acknowledged
+        """
+        ids = [entry_id for entry_id, _ in batch]
+        self._write({"op": "begin", "ids": ids})
+        try:
+            rows, first_row = await asyncio.to_thread(self._drain_sheet, sheets, sheet_name, batch)
+        except Exception:
+            # The append may have reached Sheets even if we saw an error
+            self._in_flight.update(ids)
+            raise
+        self._write({"op": "ack", "ids": ids})
+        
+        for entry_id in ids:
+            self._pending.pop(entry_id, None)
+            self._in_flight.discard(entry_id)
+            self._remember_acked(entry_id)
+        
+        if rows:
+            self._notify(sheet_name, rows, first_row)
+        return len(ids)
+    
+    def _notify(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """Call every flush listener, isolating their failures."""
+        for listener in self._listeners:
+            try:
+                listener(sheet_name, rows, first_row)
+            except Exception as e:
+                logger.error(f"Outbox listener failed: {e}", exc_info=True)
+    
+    def _compact(self) -> None:
+        """Rewrite the log keeping only pending entries once it has grown."""
+        if self._pending and self._lines < 1000:
+            return
+        if not self._pending and self._lines == 0:
+            return
+        
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry_id, (sheet_name, row) in self._pending.items():
+                f.write(json.dumps({"op": "put", "id": entry_id, "sheet": sheet_name, "row": row},
+                                   ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lines = len(self._pending)
+    
+    async def run(self, sheets: SheetsService) -> None:
+        """
+        Drain the outbox forever, waking up on new entries or every flush_interval.
+        
+        Failed drains are retried with exponential backoff (capped at 60s).
+        If Google Sheets was unreachable at startup, each retry first tries
+        to connect again.
+        
+        Args:
+            sheets: SheetsService (connected, or connected on the first drain)
+        """
+        self._wakeup = asyncio.Event()
+        backoff = self.flush_interval
+        
+        while True:
+            if self._pending:
+                try:
+                    if not await asyncio.to_thread(sheets.ensure_connected):
+                        raise RuntimeError("Google Sheets is not reachable")
+                    await self.drain(sheets)
+                    backoff = self.flush_interval
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error draining outbox ({len(self._pending)} pending): {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                    continue
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    def start(self, sheets: SheetsService) -> None:
+        """
+        Start the background drainer on the running event loop.
+        
+        Args:
+            sheets: SheetsService (it connects on the first drain if needed)
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(sheets))
+            logger.info("Outbox drainer started")
+    
+    async def stop(self, sheets: SheetsService) -> None:
+        """
+        Stop the drainer, making a last attempt to flush pending entries.
+        
+        Args:
+            sheets: Connected SheetsService
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        if self._pending:
+            try:
+                await self.drain(sheets)
+            except Exception as e:
+                logger.warning(f"Outbox still has {len(self._pending)} pending entries: {e}")
+        
+        self._file.close()
@@ -0,0 +1,324 @@
+"""
+Pluggable completion backends for the LLM parser.
+
+LLMService builds an OpenAI-style chat completion request and hands it to a
+backend. Backends available:
+- OpenAIBackend: the OpenAI API, or any OpenAI-compatible server (Ollama,
+  llama.cpp, vLLM) through base_url
+- HeuristicBackend: an offline, rule-based stand-in that answers in the
+  same JSON format, with no network or token cost
+- RecordReplayBackend: records completions of another backend to disk and
+  replays them, for offline benchmarks and regression runs
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from services.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Completion:
+    """
+    Result of a backend call.
+    
+    Attributes:
+        content: Completion text (the JSON answer)
+        model: Model that produced it
+        prompt_tokens: Input tokens billed
+        completion_tokens: Output tokens billed
+        latency_ms: Wall time of the call
+        replayed: True if served from a recording
+    """
+    content: str
+    model: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+    replayed: bool = False
+
+
+class ParserBackend(ABC):
+    """Interface of a chat completion backend used by LLMService."""
+    
+    name = "base"
+    
+    @abstractmethod
+    async def complete(self, request: Dict[str, Any]) -> Completion:
+        """
+        Run a chat completion request.
+        
+        Args:
+            request: Keyword arguments for chat.completions.create()
+        
+        Returns:
+            Completion with the answer and usage
+        """
+    
+    def warm_up(self) -> None:
+        """Prepare clients/connections ahead of the first request (blocking)."""
+
+
+class OpenAIBackend(ParserBackend):
+    """Backend for the OpenAI API or an OpenAI-compatible server."""
+    
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: Optional[str] = None, name: str = "openai"):
+        """
+        Initialize the backend.
+        
+        Args:
+            api_key: API key (defaults to settings.OPENAI_API_KEY)
+            base_url: Server URL for OpenAI-compatible servers (None for OpenAI)
+            model: Model to use instead of the one in the request
+            name: Backend name for reports
+        """
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.base_url = base_url
+        self.model = model
+        self.name = name
+        self._client = None
+    
+    @property
+    def client(self):
+        """
+        Get the OpenAI client, creating it on first use.
+        
+        The openai package is imported here instead of at module level so
+        that importing this module stays cheap.
+        """
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+    
+    def warm_up(self) -> None:
+        """Create the client (imports openai and builds the HTTP pool)."""
+        self.client
+    
+    async def complete(self, request: Dict[str, Any]) -> Completion:
+        """Run the request in a worker thread so the event loop is never blocked."""
+        if self.model:
+            request = {**request, "model": self.model}
+        
+        started = time.perf_counter()
+        response = await asyncio.to_thread(self.client.chat.completions.create, **request)
+        latency_ms = (time.perf_counter() - started) * 1000
+        
+        usage = response.usage
+        return Completion(
+            content=response.choices[0].message.content or "",
+            model=response.model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            latency_ms=latency_ms
+        )
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+# Keywords per tipo, checked in order (capital before gasto: "guardé" is not a gasto)
+_TIPO_KEYWORDS = [
+    ("presupuesto", ("presupuesto", "planear", "asignar", "asigno")),
+    ("inversion", ("inverti", "invertir", "inversion", "cdt", "acciones", "bolsa", "plazo fijo", "fiducia")),
+    ("ahorro", ("ahorre", "ahorrar", "ahorro", "guarde", "guardar", "aparte")),
+    ("ingreso", ("recibi", "me pagaron", "salario", "ganancia", "ingreso", "gane", "cobre", "me consignaron")),
+    ("gasto", ("gaste", "gast ", "compre", "pague", "me costo", "gasto", "pago")),
+]
+
+# "50 mil", "200k", "$45.000", "1 millón", "1.5 millones", "15000"
+_AMOUNT_PATTERN = re.compile(
+    r"\$?\s*(\d+(?:[.,]\d+)*)\s*(millones|millon|mil|k|m)?\b"
+)
+
+_STOPWORDS = {"el", "la", "los", "las", "un", "una", "mi", "mis", "de", "del", "en", "para", "por", "con", "al"}
+
+
+def parse_spoken_amount(text: str) -> Optional[float]:
+    """
+    Extract an amount written the way people type it in Spanish.
+    
+    Args:
+        text: Message, folded here so "1 millón" and "1 millon" agree
+    
+    Returns:
+        Amount, or None if no number is found
+    """
+    match = _AMOUNT_PATTERN.search(_fold(text))
+    if not match:
+        return None
+    
+    number, unit = match.group(1), match.group(2)
+    if unit:
+        # With a multiplier the separator is decimal: "1.5 millones", "2,5 mil"
+        value = float(number.replace(",", "."))
+    else:
+        # Without one, separators group thousands: "$45.000", "1,200,000"
+        value = float(re.sub(r"[.,]", "", number))
+    
+    multiplier = {"mil": 1_000, "k": 1_000, "m": 1_000_000, "millon": 1_000_000, "millones": 1_000_000}
+    return value * multiplier.get(unit, 1)
+
+
+class HeuristicBackend(ParserBackend):
+    """
+    Offline rule-based stand-in for the LLM.
+    
+    Answers with the same JSON the model would produce, using keyword
+    classification and regex amount extraction. Less accurate than the LLM
+    but free and instant, which makes it a baseline for benchmarks and a
+    fallback when the LLM budget is exhausted.
+    """
+    
+    name = "heuristic"
+    
+    def parse(self, message: str) -> Dict[str, Any]:
+        """
+        Parse a message into the parser's JSON fields.
+        
+        Args:
+            message: Original user message
+        
+        Returns:
+            Dict with tipo, monto, categoria/institucion and descripcion, or error
+        """
+        text = _fold(message)
+        
+        tipo = next((t for t, words in _TIPO_KEYWORDS if any(w in text for w in words)), None)
+        monto = parse_spoken_amount(text)
+        if tipo is None or monto is None:
+            return {"error": "No se reconoce el tipo o el monto"}
+        
+        # The target is the first meaningful word after the last en/de/para/por
+        target = None
+        for match in re.finditer(r"\b(?:en|de|para|por)\s+([a-zñ ]+)", text):
+            words = [w for w in match.group(1).split() if w not in _STOPWORDS and not w.isdigit()
+                     and w not in ("mil", "k", "millon", "millones")]
+            if words:
+                target = words[0]
+        
+        if tipo == "inversion" and "cdt" in text and target != "cdt":
+            target = target or "cdt"
+        
+        result = {"tipo": tipo, "monto": monto, "descripcion": message}
+        if tipo in ("ahorro", "inversion"):
+            result["institucion"] = target or "general"
+        else:
+            result["categoria"] = target or "general"
+        return result
+    
+    async def complete(self, request: Dict[str, Any]) -> Completion:
+        """Answer from the last user message of the request."""
+        started = time.perf_counter()
+        message = request["messages"][-1]["content"]
+        content = json.dumps(self.parse(message), ensure_ascii=False)
+        return Completion(content=content, model=self.name,
+                          latency_ms=(time.perf_counter() - started) * 1000)
+
+
+class RecordReplayBackend(ParserBackend):
+    """
+    Records completions of another backend and replays them from disk.
+    
+    Modes:
+    - "record": always call the inner backend and save the result
+    - "replay": only serve recordings (missing ones raise KeyError)
+    - "auto": replay when recorded, otherwise call and record
+    """
+    
+    def __init__(self, inner: Optional[ParserBackend], path: Optional[str] = None, mode: str = "auto"):
+        """
+        Initialize the backend.
+        
+        Args:
+            inner: Backend to record from (may be None in "replay" mode)
+            path: JSON file with recordings (defaults to settings.LLM_RECORDINGS_FILE)
+            mode: "record", "replay" or "auto"
+        """
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"Unknown record/replay mode: {mode}")
+        if inner is None and mode != "replay":
+            raise ValueError("An inner backend is required to record")
+        
+        self.inner = inner
+        self.path = Path(path or settings.LLM_RECORDINGS_FILE)
+        self.mode = mode
+        self.name = f"replay({inner.name})" if inner else "replay"
+        self._recordings: Dict[str, dict] = {}
+        if self.path.exists():
+            self._recordings = json.loads(self.path.read_text(encoding="utf-8"))
+    
+    @staticmethod
+    def request_key(request: Dict[str, Any]) -> str:
+        """Stable hash of a request (model, messages, parameters, schema)."""
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def warm_up(self) -> None:
+        """Warm up the inner backend if it will be called."""
+        if self.inner and self.mode != "replay":
+            self.inner.warm_up()
+    
+    def _save(self) -> None:
+        """Write recordings to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._recordings, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    async def complete(self, request: Dict[str, Any]) -> Completion:
+        """Replay a recorded completion or record a new one."""
+        key = self.request_key(request)
+        
+        if self.mode != "record" and key in self._recordings:
+            return Completion(**{**self._recordings[key], "replayed": True})
+        if self.mode == "replay":
+            raise KeyError(f"No recording for request {key[:12]}")
+        
+        completion = await self.inner.complete(request)
+        self._recordings[key] = {k: v for k, v in asdict(completion).items() if k != "replayed"}
+        self._save()
+        return completion
+
+
+def create_backend(name: Optional[str] = None) -> ParserBackend:
+    """
+    Create a backend by name.
+    
+    Args:
+        name: "openai", "local", "heuristic", "record" or "replay"
+            (defaults to settings.LLM_BACKEND)
+    
+    Returns:
+        The backend instance
+    """
+    name = name or settings.LLM_BACKEND
+    
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "local":
+        return OpenAIBackend(api_key=settings.LLM_LOCAL_API_KEY, base_url=settings.LLM_LOCAL_BASE_URL,
+                             model=settings.LLM_LOCAL_MODEL, name="local")
+    if name == "heuristic":
+        return HeuristicBackend()
+    if name == "record":
+        return RecordReplayBackend(OpenAIBackend(), mode="record")
+    if name == "replay":
+        return RecordReplayBackend(None, mode="replay")
+    
+    raise ValueError(f"Unknown LLM backend: {name}")
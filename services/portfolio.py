@@ -0,0 +1,210 @@
+"""
+Capital portfolio valuation.
+
+Loads active Ahorros e Inversiones movements into parallel arrays (one slot
+per position) indexed by institucion and tipo, and accrues returns for all
+positions in a single pass. Rates are annual effective (the way CDTs are
+quoted in Colombia) and fixed-term instruments stop accruing at maturity.
+"""
+
+import logging
+from array import array
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from domain.records import CapitalRecord
+from services.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sentinel maturity (in days) for instruments without a fixed term
+_NO_MATURITY = float("inf")
+
+
+def _day_number(value) -> float:
+    """Days since 0001-01-01, with the time of day as a fraction."""
+    if isinstance(value, datetime):
+        return value.toordinal() + (value.hour * 3600 + value.minute * 60 + value.second) / 86400
+    return float(value.toordinal())
+
+
+class Portfolio:
+    """
+    Array-backed portfolio of active capital positions.
+    
+    Each position occupies one slot in the parallel arrays; institutions and
+    tipos are interned to small integer ids so per-group totals are a single
+    pass over the arrays. Valuations are cached per date.
+    """
+    
+    def __init__(self, records: Iterable[CapitalRecord],
+                 rates: Optional[Dict[str, float]] = None,
+                 term_days: Optional[Dict[str, int]] = None):
+        """
+        Build the portfolio.
+        
+        Args:
+            records: Capital movements (withdrawn ones are skipped)
+            rates: Annual effective rate per institucion or tipo
+                (defaults to settings.CAPITAL_RATES)
+            term_days: Fixed term in days per institucion or tipo
+                (defaults to settings.CAPITAL_TERM_DAYS)
+        """
+        self.rates = settings.CAPITAL_RATES if rates is None else rates
+        self.term_days = settings.CAPITAL_TERM_DAYS if term_days is None else term_days
+        
+        self.institutions: List[str] = []
+        self.tipos: List[str] = []
+        self._institution_ids: Dict[str, int] = {}
+        self._tipo_ids: Dict[str, int] = {}
+        
+        self.principal = array("d")
+        self.recorded_return = array("d")
+        self.start = array("d")
+        self.maturity = array("d")
+        self.rate = array("d")
+        self.institution = array("l")
+        self.tipo = array("l")
+        
+        self._values: Dict[float, array] = {}
+        
+        for record in records:
+            if record.is_active():
+                self.add(record)
+    
+    def __len__(self) -> int:
+        """Number of positions."""
+        return len(self.principal)
+    
+    @staticmethod
+    def _intern(name: str, names: List[str], ids: Dict[str, int]) -> int:
+        """Get the id of a name, assigning the next one if new."""
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+    
+    def _lookup(self, table: Dict, record: CapitalRecord):
+        """Look up a per-instrument setting by institucion, then by tipo."""
+        value = table.get(record.institucion)
+        return table.get(record.tipo) if value is None else value
+    
+    def add(self, record: CapitalRecord) -> None:
+        """
+        Add an active position.
+        
+        Args:
+            record: Capital movement to add
+        """
+        start = _day_number(record.fecha)
+        term = self._lookup(self.term_days, record)
+        
+        self.principal.append(record.monto)
+        self.recorded_return.append(record.retorno)
+        self.start.append(start)
+        self.maturity.append(start + term if term else _NO_MATURITY)
+        self.rate.append(self._lookup(self.rates, record) or 0.0)
+        self.institution.append(self._intern(record.institucion, self.institutions, self._institution_ids))
+        self.tipo.append(self._intern(record.tipo, self.tipos, self._tipo_ids))
+        self._values.clear()
+    
+    def accrue(self, as_of: Optional[date] = None) -> array:
+        """
+        Value every position at a date in one pass.
+        
+        Growth is compounded at the annual effective rate from the deposit
+        date until as_of or maturity, whichever comes first. Returns already
+        recorded in the sheet act as a floor, so a position is never valued
+        below what the user registered.
+        
+        Args:
+            as_of: Valuation date (defaults to now)
+        
+        Returns:
+            Array with the value of each position
+        """
+        # Valuations are per calendar day, which keeps the cache small
+        day = float((as_of or date.today()).toordinal())
+        cached = self._values.get(day)
+        if cached is not None:
+            return cached
+        
+        values = array("d", bytes(8 * len(self)))
+        for i, (principal, recorded, start, maturity, rate) in enumerate(
+                zip(self.principal, self.recorded_return, self.start, self.maturity, self.rate)):
+            elapsed = (min(day, maturity) - start) / 365.0
+            accrued = principal * ((1.0 + rate) ** elapsed - 1.0) if elapsed > 0 and rate else 0.0
+            values[i] = principal + (accrued if accrued > recorded else recorded)
+        
+        self._values[day] = values
+        return values
+    
+    def _group_totals(self, ids: array, names: List[str], as_of: Optional[date]) -> Dict[str, float]:
+        """Sum position values per group id."""
+        totals = [0.0] * len(names)
+        for group, value in zip(ids, self.accrue(as_of)):
+            totals[group] += value
+        return {name: round(total, 2) for name, total in zip(names, totals)}
+    
+    def total_principal(self) -> float:
+        """Total amount deposited in active positions."""
+        return round(sum(self.principal), 2)
+    
+    def total_value(self, as_of: Optional[date] = None) -> float:
+        """
+        Total portfolio value at a date (projected if in the future).
+        
+        Args:
+            as_of: Valuation date (defaults to now)
+        
+        Returns:
+            Sum of all position values
+        """
+        return round(sum(self.accrue(as_of)), 2)
+    
+    def value_by_institution(self, as_of: Optional[date] = None) -> Dict[str, float]:
+        """
+        Portfolio value per institucion at a date.
+        
+        Args:
+            as_of: Valuation date (defaults to now)
+        
+        Returns:
+            Dict institucion → value
+        """
+        return self._group_totals(self.institution, self.institutions, as_of)
+    
+    def value_by_tipo(self, as_of: Optional[date] = None) -> Dict[str, float]:
+        """
+        Portfolio value per tipo (ahorro / inversion) at a date.
+        
+        Args:
+            as_of: Valuation date (defaults to now)
+        
+        Returns:
+            Dict tipo → value
+        """
+        return self._group_totals(self.tipo, self.tipos, as_of)
+    
+    def maturing(self, until: date, since: Optional[date] = None) -> List[Tuple[str, datetime, float]]:
+        """
+        Positions that reach maturity in a date range.
+        
+        Args:
+            until: End of the range
+            since: Start of the range (defaults to now)
+        
+        Returns:
+            List of (institucion, maturity date, value at maturity), soonest first
+        """
+        low = _day_number(since or datetime.now())
+        high = _day_number(until)
+        result = []
+        for i, maturity in enumerate(self.maturity):
+            if low <= maturity <= high:
+                principal = self.principal[i]
+                accrued = principal * ((1.0 + self.rate[i]) ** ((maturity - self.start[i]) / 365.0) - 1.0)
+                value = principal + max(accrued, self.recorded_return[i])
+                result.append((self.institutions[self.institution[i]],
+                               datetime.fromordinal(int(maturity)), round(value, 2)))
+        return sorted(result, key=lambda item: item[1])
@@ -0,0 +1,234 @@
+"""
+Prompt profiles and structured output schema for the LLM parser.
+
+A profile bundles the system prompt and generation limits sent with every
+message. The compact profile saves input tokens by dropping the worked
+examples; it also asks for a null descripcion, which the bot fills in with
+the original message, so long messages are not echoed back within its
+small completion limit. The JSON schema used for structured output is
+generated from the Transaction and CapitalMovement fields.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from domain.transaction import Transaction
+from domain.capital import CapitalMovement
+
+
+@dataclass(frozen=True)
+class PromptProfile:
+    """
+    A system prompt variant for the parser.
+    
+    Attributes:
+        name: Profile identifier (used in settings and reports)
+        system_prompt: Static system prompt text
+        max_tokens: Completion token limit
+    """
+    name: str
+    system_prompt: str
+    max_tokens: int
+
+
+# Original prompt: detailed rules plus worked examples
+FULL_PROMPT = """Eres un asistente financiero que ayuda a parsear mensajes en español sobre finanzas personales.
+
+Tu tarea es convertir mensajes de texto en un objeto JSON estructurado.
+
+HAY DOS TIPOS DE MENSAJES:
+
+1. TRANSACCIONES OPERATIVAS (gastos, ingresos, presupuestos):
+{
+    "tipo": "gasto" | "ingreso" | "presupuesto",
+    "monto": <número>,
+    "categoria": <string>,
+    "descripcion": <string>
+}
+
+2. MOVIMIENTOS DE CAPITAL (ahorros, inversiones):
+{
+    "tipo": "ahorro" | "inversion",
+    "monto": <número>,
+    "institucion": <string>,
+    "descripcion": <string>
+}
+
+REGLAS IMPORTANTES:
+1. "tipo" debe ser exactamente: "gasto", "ingreso", "presupuesto", "ahorro" o "inversion"
+2. "monto" debe ser un número. Si ves "mil" o "k", conviértelo (ej: "50 mil" = 50000)
+3. Para transacciones operativas usa "categoria" (comida, transporte, salario)
+4. Para movimientos de capital usa "institucion" (banco, cdt, acciones, davivienda)
+5. "descripcion" usa el mensaje original
+6. Si el mensaje es ambiguo, responde con {"error": "mensaje de error"}
+
+CLASIFICACIÓN:
+- Palabras clave para AHORRO: "ahorré", "guardé", "ahorrar", "guardar dinero", "ahorro"
+- Palabras clave para INVERSION: "invertí", "inversión", "CDT", "acciones", "bolsa", "plazo fijo"
+- Palabras clave para GASTO: "gasté", "compré", "pagué", "me costó"
+- Palabras clave para INGRESO: "recibí", "me pagaron", "salario", "ganancia", "ingreso"
+- Palabras clave para PRESUPUESTO: "presupuesto", "planear", "asignar"
+
+EJEMPLOS TRANSACCIONES:
+- "Gasté 50 mil en comida" → {"tipo": "gasto", "monto": 50000, "categoria": "comida", "descripcion": "Gasté 50 mil en comida"}
+- "Recibí 100 mil de salario" → {"tipo": "ingreso", "monto": 100000, "categoria": "salario", "descripcion": "Recibí 100 mil de salario"}
+- "Presupuesto de 300 mil para transporte" → {"tipo": "presupuesto", "monto": 300000, "categoria": "transporte", "descripcion": "Presupuesto de 300 mil para transporte"}
+
+EJEMPLOS CAPITAL:
+- "Ahorré 100 mil en el banco" → {"tipo": "ahorro", "monto": 100000, "institucion": "banco", "descripcion": "Ahorré 100 mil en el banco"}
+- "Invertí 500 mil en CDT" → {"tipo": "inversion", "monto": 500000, "institucion": "cdt", "descripcion": "Invertí 500 mil en CDT"}
+- "Guardé 200k en Davivienda" → {"tipo": "ahorro", "monto": 200000, "institucion": "davivienda", "descripcion": "Guardé 200k en Davivienda"}
+- "Inversión de 1 millón en acciones" → {"tipo": "inversion", "monto": 1000000, "institucion": "acciones", "descripcion": "Inversión de 1 millón en acciones"}
+
+Responde SOLO con el JSON, sin texto adicional."""
+
+# Compact prompt: same rules with no worked examples, relies on the JSON schema
+COMPACT_PROMPT = """Convierte mensajes de finanzas personales en español a JSON.
+tipo: gasto (gasté, compré, pagué), ingreso (recibí, salario, me pagaron), presupuesto (presupuesto, asignar), ahorro (ahorré, guardé), inversion (invertí, CDT, acciones, bolsa).
+monto: número; "mil"/"k" = ×1000, "millón" = ×1000000.
+gasto/ingreso/presupuesto: categoria en minúsculas (comida, transporte, salario); institucion null.
+ahorro/inversion: institucion en minúsculas (banco, cdt, davivienda); categoria null.
+descripcion: null. Si es ambiguo, solo {"error": "<motivo>"}.
+Responde solo con el JSON."""
+
+PROFILES: Dict[str, PromptProfile] = {
+    "full": PromptProfile(name="full", system_prompt=FULL_PROMPT, max_tokens=300),
+    "compact": PromptProfile(name="compact", system_prompt=COMPACT_PROMPT, max_tokens=120),
+}
+
+# Fields the LLM fills in; everything else (fecha, estado, retorno) is set by the bot
+LLM_FIELDS = ["tipo", "monto", "categoria", "institucion", "descripcion"]
+
+
+def get_profile(name: str) -> PromptProfile:
+    """
+    Get a prompt profile by name.
+    
+    Args:
+        name: Profile name ("full" or "compact")
+    
+    Returns:
+        The PromptProfile
+    
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown prompt profile: {name}. Available: {', '.join(PROFILES)}")
+
+
+def _field_schema(model, name: str) -> Optional[dict]:
+    """Get the JSON schema of one model field, with enum references resolved."""
+    schema = model.model_json_schema()
+    prop = schema["properties"].get(name)
+    if prop is None:
+        return None
+    if "allOf" in prop:
+        # Fields with a description wrap their $ref in allOf
+        prop = prop["allOf"][0]
+    if "$ref" in prop:
+        prop = schema["$defs"][prop["$ref"].split("/")[-1]]
+    if "anyOf" in prop:
+        # Optional[str] → first non-null branch
+        prop = next(p for p in prop["anyOf"] if p.get("type") != "null")
+    result = {"type": prop["type"]}
+    if "enum" in prop:
+        result["enum"] = prop["enum"]
+    return result
+
+
+def build_output_schema() -> dict:
+    """
+    Build the structured-output JSON schema from the domain models.
+    
+    The result is a single object (strict mode does not allow unions at the
+    top level): tipo covers both transaction and capital types, and every
+    field is nullable so that ambiguous messages can be answered with just
+    "error".
+    
+    Returns:
+        A response_format "json_schema" payload
+    """
+    properties = {}
+    for name in LLM_FIELDS:
+        transaction_field = _field_schema(Transaction, name)
+        capital_field = _field_schema(CapitalMovement, name)
+        field = dict(transaction_field or capital_field)
+        
+        if transaction_field and capital_field and "enum" in field:
+            field["enum"] = list(dict.fromkeys(transaction_field["enum"] + capital_field["enum"]))
+        if "enum" in field:
+            # Strict mode requires null to be listed among enum values too
+            field["enum"] = field["enum"] + [None]
+        field["type"] = [field["type"], "null"]
+        properties[name] = field
+    
+    properties["error"] = {"type": ["string", "null"]}
+    
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "mensaje_financiero",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Count tokens in a text.
+    
+    Uses tiktoken when it is installed (optional dependency) and falls back
+    to the usual ~4 characters per token approximation.
+    
+    Args:
+        text: Text to measure
+    
+    Returns:
+        Token count (exact with tiktoken, approximate otherwise)
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text))
+    except ImportError:
+        return max(1, round(len(text) / 4))
+
+
+def token_report(messages: List[str]) -> List[dict]:
+    """
+    Compare input tokens per message across profiles and output modes.
+    
+    Args:
+        messages: Sample user messages
+    
+    Returns:
+        One row per (profile, output mode) with system, schema, average user
+        and total input tokens per message
+    """
+    average_user = sum(estimate_tokens(m) for m in messages) / max(1, len(messages))
+    schema_tokens = estimate_tokens(json.dumps(build_output_schema()))
+    
+    rows = []
+    for profile in PROFILES.values():
+        system_tokens = estimate_tokens(profile.system_prompt)
+        for mode, extra in (("text", 0), ("json_schema", schema_tokens)):
+            rows.append({
+                "profile": profile.name,
+                "output_mode": mode,
+                "system_tokens": system_tokens,
+                "schema_tokens": extra,
+                "user_tokens": round(average_user, 1),
+                "input_tokens": round(system_tokens + extra + average_user, 1),
+                "max_tokens": profile.max_tokens
+            })
+    return rows
@@ -0,0 +1,178 @@
+"""
+Recurring transactions scheduler.
+
+Rules are stored in DATA_DIR/recurring.json. On each scheduler tick every
+occurrence that has come due is turned into a Transaction and enqueued in
+the outbox, without calling the LLM; since the tick enqueues everything
+before yielding to the event loop, the drainer writes them with one
+append_rows per sheet.
+"""
+
+import json
+import logging
+import re
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from domain.recurring import Frequency, RecurringRule
+from domain.transaction import Transaction
+from services.config import settings
+from services.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Phrases in a message that make it recurring ("pago arriendo cada mes")
+_FREQUENCY_PATTERNS = [
+    (Frequency.QUINCENAL, re.compile(r"\b(cada quincena|quincenal(mente)?|cada dos semanas)\b", re.IGNORECASE)),
+    (Frequency.SEMANAL, re.compile(r"\b(cada semana|semanal(mente)?|todas las semanas)\b", re.IGNORECASE)),
+    (Frequency.MENSUAL, re.compile(r"\b(cada mes|todos los meses|mensualmente)\b", re.IGNORECASE)),
+]
+
+
+def detect_frequency(message: str) -> Optional[Frequency]:
+    """
+    Detect a recurrence phrase in a message.
+    
+    "Presupuesto mensual" alone does not count: budgets are monthly by
+    nature, so only explicit phrases like "cada mes" make a rule.
+    
+    Args:
+        message: Original user message
+    
+    Returns:
+        Frequency, or None if the message is not recurring
+    """
+    for frequency, pattern in _FREQUENCY_PATTERNS:
+        if pattern.search(message):
+            return frequency
+    return None
+
+
+class RecurringRules:
+    """
+    Local store of recurring rules and their materialization state.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the store and load rules from disk.
+        
+        Args:
+            path: Rules file (defaults to DATA_DIR/recurring.json)
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "recurring.json"
+        self._rules: Dict[str, RecurringRule] = {}
+        self._load()
+    
+    def _load(self) -> None:
+        """Load rules from disk."""
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error loading recurring rules from {self.path}: {e}")
+            return
+        self._rules = {item["id"]: RecurringRule(**item) for item in data}
+    
+    def _save(self) -> None:
+        """Write rules to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        data = [rule.model_dump(mode="json") for rule in self._rules.values()]
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def __len__(self) -> int:
+        """Number of rules."""
+        return len(self._rules)
+    
+    def add(self, user_id: int, frequency: Frequency, transaction: Transaction) -> RecurringRule:
+        """
+        Create a rule from a parsed transaction.
+        
+        The transaction itself is occurrence 0; it is materialized by the
+        next call to materialize_due().
+        
+        Args:
+            user_id: Telegram user id
+            frequency: How often it repeats
+            transaction: Parsed transaction (its fecha is the start date)
+        
+        Returns:
+            The new rule
+        """
+        rule = RecurringRule(
+            id=uuid.uuid4().hex[:6],
+            user_id=user_id,
+            frecuencia=frequency,
+            tipo=transaction.tipo,
+            monto=transaction.monto,
+            categoria=transaction.categoria,
+            descripcion=transaction.descripcion,
+            inicio=transaction.fecha
+        )
+        self._rules[rule.id] = rule
+        self._save()
+        logger.info(f"Added recurring rule {rule.id} for user {user_id}: {rule.frecuencia} {rule.tipo} {rule.monto}")
+        return rule
+    
+    def remove(self, user_id: int, rule_id: str) -> bool:
+        """
+        Delete a rule of a user.
+        
+        Returns:
+            True if the rule existed and belonged to the user
+        """
+        rule = self._rules.get(rule_id)
+        if rule is None or rule.user_id != user_id:
+            return False
+        del self._rules[rule_id]
+        self._save()
+        return True
+    
+    def for_user(self, user_id: int) -> List[RecurringRule]:
+        """Rules of a user, oldest first."""
+        return sorted((r for r in self._rules.values() if r.user_id == user_id), key=lambda r: r.inicio)
+    
+    def materialize_due(self, outbox: Outbox, now: Optional[datetime] = None,
+                        on_enqueued: Optional[Callable[[RecurringRule, Transaction], None]] = None) -> int:
+        """
+        Enqueue every occurrence due up to now, catching up missed periods.
+        
+        Each occurrence uses a deterministic outbox id (rule:<id>:<n>) and
+        next_index is saved right after enqueueing, with no await in between,
+        so an occurrence is never written twice even across restarts.
+        
+        Args:
+            outbox: Outbox to enqueue into
+            now: Current time (defaults to now)
+            on_enqueued: Called with (rule, transaction) for each enqueued occurrence
+        
+        Returns:
+            Number of occurrences enqueued
+        """
+        now = now or datetime.now()
+        enqueued = 0
+        
+        for rule in self._rules.values():
+            caught_up = 0
+            while rule.occurrence_date(rule.next_index) <= now and caught_up < settings.RECURRING_MAX_CATCH_UP:
+                transaction = rule.to_transaction(rule.next_index)
+                if outbox.enqueue_record(transaction, rule.entry_id(rule.next_index)) is None:
+                    break
+                rule.next_index += 1
+                caught_up += 1
+                if on_enqueued:
+                    try:
+                        on_enqueued(rule, transaction)
+                    except Exception as e:
+                        logger.error(f"Recurring occurrence listener failed: {e}", exc_info=True)
+            enqueued += caught_up
+        
+        if enqueued:
+            self._save()
+            logger.info(f"Materialized {enqueued} recurring occurrences")
+        return enqueued
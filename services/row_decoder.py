@@ -0,0 +1,298 @@
+"""
+Fast decoder from Google Sheets rows to compact domain records.
+
+Converts the raw string rows returned by get_all_values() for the
+TRANSACCIONES_HEADER, PRESUPUESTOS_HEADER and CAPITAL_HEADER layouts into
+TransactionRecord / BudgetRecord / CapitalRecord tuples without running
+Pydantic validation. Sheet data was validated when it was written, so this
+trusted path only normalizes and coerces types: fixed-format timestamps
+with a memo of date prefixes, locale-tolerant amounts and booleans.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from domain.records import TransactionRecord, BudgetRecord, CapitalRecord
+
+logger = logging.getLogger(__name__)
+
+# Format written by Transaction.to_sheets_row() / CapitalMovement.to_sheets_row()
+SHEETS_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# Fallback formats for cells edited by hand or reformatted by Sheets
+_FALLBACK_DATETIME_FORMATS = (
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+)
+
+# Memo of "YYYY-MM-DD" prefixes → (year, month, day); ledgers have many rows per day
+_date_prefix_cache: Dict[str, Tuple[int, int, int]] = {}
+_DATE_PREFIX_CACHE_LIMIT = 20000
+
+
+def _parse_timestamp_slow(value: str) -> Optional[datetime]:
+    """Parse a timestamp that is not in the canonical fixed format."""
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in _FALLBACK_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """
+    Parse a sheet timestamp.
+    
+    Timestamps written by the domain models always use the fixed
+    "%Y-%m-%d %H:%M:%S" layout, so they are decoded by slicing instead of
+    strptime, with the date part memoized. Other layouts fall back to
+    slower parsing.
+    
+    Args:
+        value: Timestamp string like "2025-11-04 10:32:11"
+        
+    Returns:
+        datetime, or None if the cell is empty or malformed
+    """
+    if not value:
+        return None
+    
+    if len(value) == 19 and value[4] == "-" and value[7] == "-" and value[10] == " ":
+        prefix = value[:10]
+        ymd = _date_prefix_cache.get(prefix)
+        try:
+            if ymd is None:
+                ymd = (int(value[0:4]), int(value[5:7]), int(value[8:10]))
+                if len(_date_prefix_cache) >= _DATE_PREFIX_CACHE_LIMIT:
+                    _date_prefix_cache.clear()
+                _date_prefix_cache[prefix] = ymd
+            return datetime(ymd[0], ymd[1], ymd[2],
+                            int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            return None
+    
+    return _parse_timestamp_slow(value)
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """
+    Parse a sheet amount, tolerating Spanish and English number formats.
+    
+    Accepts "50000", "50000.5", "$45.000", "1.234.567,89", "1,234,567.89"
+    and "COP 50 000". A single separator followed by exactly three digits
+    ("1.500", "1,500") is read as a thousands separator, as is usual for
+    Colombian pesos.
+    
+    Args:
+        value: Amount string
+        
+    Returns:
+        float rounded to 2 decimals, or None if malformed
+    """
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    
+    text = value.strip().replace("$", "").replace("COP", "").replace(" ", "").replace("\u00a0", "")
+    negative = text.startswith("-")
+    if negative:
+        text = text[1:]
+    
+    dots = text.count(".")
+    commas = text.count(",")
+    if dots and commas:
+        # The separator that appears last is the decimal one
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif dots + commas > 1:
+        # Repeated single separator: thousands grouping
+        text = text.replace(".", "").replace(",", "")
+    elif dots + commas == 1:
+        separator = "." if dots else ","
+        decimals = text.split(separator)[1]
+        if len(decimals) == 3:
+            text = text.replace(separator, "")
+        else:
+            text = text.replace(",", ".")
+    
+    try:
+        amount = round(float(text), 2)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def parse_bool(value: str) -> bool:
+    """
+    Parse a sheet boolean ("TRUE"/"FALSE", "True"/"False").
+    
+    Args:
+        value: Cell value
+    
+    Returns:
+        True only for truthy spellings
+    """
+    return str(value).strip().lower() in ("true", "1", "sí", "si", "verdadero")
+
+
+def normalize_column(values: Iterable[str]) -> List[str]:
+    """
+    Lowercase and strip a whole column, normalizing each distinct value once.
+    
+    Categories and institutions repeat heavily, so memoizing per distinct
+    value turns thousands of string operations into a dictionary lookup.
+    
+    Args:
+        values: Column values
+    
+    Returns:
+        Normalized values in the same order
+    """
+    memo: Dict[str, str] = {}
+    result = []
+    for value in values:
+        normalized = memo.get(value)
+        if normalized is None:
+            normalized = memo[value] = value.lower().strip()
+        result.append(normalized)
+    return result
+
+
+def _columns(rows: Sequence[Sequence[str]], width: int) -> List[tuple]:
+    """Transpose rows into columns, padding short rows with empty strings."""
+    if not rows:
+        return [() for _ in range(width)]
+    padded = [row if len(row) >= width else list(row) + [""] * (width - len(row)) for row in rows]
+    return list(zip(*(row[:width] for row in padded)))
+
+
+def _build_records(columns: List[list], build: Callable[[tuple], Optional[tuple]],
+                   sheet_name: str, keep_positions: bool = False) -> list:
+    """
+    Zip decoded columns back into records, dropping the ones that cannot be built.
+    
+    Args:
+        columns: Decoded columns of the layout
+        build: Function turning one tuple of decoded cells into a record (or None)
+        sheet_name: Sheet name for logging
+        keep_positions: Keep None in place of malformed rows, so that
+            record i is sheet row i + 2
+    
+    Returns:
+        List of records
+    """
+    records = []
+    skipped = 0
+    for cells in zip(*columns):
+        record = build(cells)
+        if record is None:
+            skipped += 1
+            if keep_positions:
+                records.append(None)
+        else:
+            records.append(record)
+    
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed rows in {sheet_name}")
+    return records
+
+
+def decode_transactions(rows: Sequence[Sequence[str]], keep_positions: bool = False) -> List[TransactionRecord]:
+    """
+    Decode Transacciones rows (Fecha, Monto, Categoría, Descripción, Es Ingreso).
+    
+    Args:
+        rows: Raw sheet rows (without header)
+        keep_positions: Keep None in place of malformed rows
+    
+    Returns:
+        List of TransactionRecord
+    """
+    fechas, montos, categorias, descripciones, es_ingresos = _columns(rows, 5)
+    columns = [
+        [parse_timestamp(v) for v in fechas],
+        [parse_amount(v) for v in montos],
+        normalize_column(categorias),
+        descripciones,
+        [parse_bool(v) for v in es_ingresos]
+    ]
+    
+    def build(cells):
+        if cells[0] is None or cells[1] is None:
+            return None
+        return TransactionRecord(*cells)
+    
+    return _build_records(columns, build, "Transacciones", keep_positions)
+
+
+def decode_budgets(rows: Sequence[Sequence[str]], keep_positions: bool = False) -> List[BudgetRecord]:
+    """
+    Decode Presupuestos rows (Fecha, Monto, Categoría, Descripción).
+    
+    Args:
+        rows: Raw sheet rows (without header)
+        keep_positions: Keep None in place of malformed rows
+    
+    Returns:
+        List of BudgetRecord
+    """
+    fechas, montos, categorias, descripciones = _columns(rows, 4)
+    columns = [
+        [parse_timestamp(v) for v in fechas],
+        [parse_amount(v) for v in montos],
+        normalize_column(categorias),
+        descripciones
+    ]
+    
+    def build(cells):
+        if cells[0] is None or cells[1] is None:
+            return None
+        return BudgetRecord(*cells)
+    
+    return _build_records(columns, build, "Presupuestos", keep_positions)
+
+
+def decode_capital(rows: Sequence[Sequence[str]], keep_positions: bool = False) -> List[CapitalRecord]:
+    """
+    Decode Ahorros e Inversiones rows
+    (Fecha, Tipo, Monto, Institución, Estado, Fecha Retiro, Retorno, Descripción).
+    
+    Args:
+        rows: Raw sheet rows (without header)
+        keep_positions: Keep None in place of malformed rows
+    
+    Returns:
+        List of CapitalRecord
+    """
+    fechas, tipos, montos, instituciones, estados, retiros, retornos, descripciones = _columns(rows, 8)
+    columns = [
+        [parse_timestamp(v) for v in fechas],
+        normalize_column(tipos),
+        [parse_amount(v) for v in montos],
+        normalize_column(instituciones),
+        normalize_column(estados),
+        [parse_timestamp(v) for v in retiros],
+        [parse_amount(v) or 0.0 for v in retornos],
+        descripciones
+    ]
+    
+    def build(cells):
+        if cells[0] is None or cells[2] is None:
+            return None
+        return CapitalRecord(*cells)
+    
+    return _build_records(columns, build, "Ahorros e Inversiones", keep_positions)
@@ -0,0 +1,437 @@
+"""
+Full-text search over the ledger.
+
+An in-memory inverted index from accent-folded, lowercase tokens of
+descripcion and categoria (or institucion) to posting lists of documents
+sorted by time. Documents are kept in parallel arrays; the whole index is
+persisted as one compressed binary file for a fast warm start, and new rows
+are indexed as the outbox writes them. The file records how many rows of
+each sheet it covers, so a warm start fetches the rows saved after it (for
+instance, before a crash) instead of losing them.
+"""
+
+import json
+import logging
+import struct
+import threading
+import zlib
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from domain.canonical import normalize_key
+from services.config import settings
+from services.row_decoder import decode_budgets, decode_capital, decode_transactions
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Document tipos, stored as one byte per document
+TIPOS = ["gasto", "ingreso", "presupuesto", "ahorro", "inversion"]
+
+_STOPWORDS = {"el", "la", "los", "las", "un", "una", "de", "del", "en", "para", "por",
+              "con", "al", "y", "a", "mi", "mis", "que", "me", "lo"}
+
+# Bump when the on-disk layout changes
+_FORMAT_VERSION = 2
+
+# Save to disk after this many new documents (also saved at shutdown)
+_SAVE_EVERY = 200
+
+
+# Sheets whose covered row counts are tracked, and the columns that identify
+# a row (Monto is left out because the sheet may format it differently)
+_FINGERPRINT_COLUMNS = {
+    SheetsService.TRANSACCIONES_SHEET: (0, 2, 3),
+    SheetsService.PRESUPUESTOS_SHEET: (0, 2, 3),
+    SheetsService.CAPITAL_SHEET: (0, 3, 7),
+}
+
+
+def row_fingerprint(sheet_name: str, row: List) -> List[str]:
+    """Identify a row of a tracked sheet by its fixed text columns."""
+    return [str(row[column]).strip() if column < len(row) else "" for column in _FINGERPRINT_COLUMNS[sheet_name]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Accent-folded, lowercase tokens of a text, without stopwords."""
+    return [token for token in normalize_key(text or "").split() if token not in _STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index over ledger descriptions and categories.
+    
+    Document i is described by epochs[i], amounts[i], tipos[i], labels[i]
+    (an index into label_names) and descriptions[i]. Posting lists hold
+    document ids ordered by epoch, so results come out in time order
+    without sorting.
+    """
+    
+    def __init__(self, sheets: SheetsService, path: Optional[str] = None):
+        """
+        Initialize an empty index.
+        
+        Args:
+            sheets: SheetsService used for a full build
+            path: Index file (defaults to DATA_DIR/search_index.bin)
+        """
+        self.sheets = sheets
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "search_index.bin"
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._building = False
+        self._buffered: List[Tuple[str, List[list], Optional[int]]] = []
+        self._archived_while_building = False
+        self._unsaved = 0
+        # Sheet rows covered by the index and fingerprint of the last one, per
+        # tracked sheet (rows None when a write landed at an unknown row)
+        self._synced_rows: Dict[str, Optional[int]] = {}
+        self._last_rows: Dict[str, Optional[List[str]]] = {}
+        self._reset()
+    
+    def _reset(self) -> None:
+        """Clear all documents and postings."""
+        self.epochs = array("d")
+        self.amounts = array("d")
+        self.tipos = array("b")
+        self.labels = array("I")
+        self.descriptions: List[str] = []
+        self.label_names: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self.postings: Dict[str, array] = {}
+    
+    def __len__(self) -> int:
+        """Number of indexed documents."""
+        return len(self.epochs)
+    
+    def _add(self, fecha: datetime, tipo: str, monto: float, label: str, descripcion: str) -> None:
+        """Index one document (lock held by caller)."""
+        doc = len(self.epochs)
+        epoch = fecha.timestamp()
+        label_id = self._label_ids.get(label)
+        if label_id is None:
+            label_id = self._label_ids[label] = len(self.label_names)
+            self.label_names.append(label)
+        
+        self.epochs.append(epoch)
+        self.amounts.append(monto)
+        self.tipos.append(TIPOS.index(tipo))
+        self.labels.append(label_id)
+        self.descriptions.append(descripcion or "")
+        
+        for token in set(tokenize(f"{label} {descripcion}")) | {tipo}:
+            posting = self.postings.get(token)
+            if posting is None:
+                self.postings[token] = array("I", [doc])
+            elif self.epochs[posting[-1]] <= epoch:
+                posting.append(doc)
+            else:
+                # Out-of-order date (e.g. a caught-up recurring row): binary insert by epoch
+                low, high = 0, len(posting)
+                while low < high:
+                    middle = (low + high) // 2
+                    if self.epochs[posting[middle]] <= epoch:
+                        low = middle + 1
+                    else:
+                        high = middle
+                posting.insert(low, doc)
+    
+    def _add_rows(self, sheet_name: str, rows: List[list]) -> int:
+        """Decode and index rows of a ledger sheet (lock held by caller)."""
+        if sheet_name == SheetsService.TRANSACCIONES_SHEET:
+            records = [(r.fecha, r.tipo.value, r.monto, r.categoria, r.descripcion) for r in decode_transactions(rows)]
+        elif sheet_name == SheetsService.PRESUPUESTOS_SHEET:
+            records = [(r.fecha, "presupuesto", r.monto, r.categoria, r.descripcion) for r in decode_budgets(rows)]
+        elif sheet_name == SheetsService.CAPITAL_SHEET:
+            records = [(r.fecha, r.tipo, r.monto, r.institucion, r.descripcion) for r in decode_capital(rows)]
+        else:
+            return 0
+        
+        # Index in date order so posting lists mostly grow by appending
+        for record in sorted(records, key=lambda item: item[0]):
+            if record[1] in TIPOS:
+                self._add(*record)
+        return len(records)
+    
+    def _apply_batch(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> int:
+        """
+        Index a written batch, skipping rows already covered, and track synced rows (lock held by caller).
+        
+        Returns:
+            Number of rows indexed
+        """
+        rows = [[str(cell) for cell in row] for row in rows]
+        if sheet_name not in _FINGERPRINT_COLUMNS:
+            return self._add_rows(sheet_name, rows)
+        
+        synced = self._synced_rows.get(sheet_name)
+        if first_row is not None and synced is not None and synced > first_row - 2:
+            # Part of the batch came with a read of the sheet already
+            skip = synced - (first_row - 2)
+            rows, first_row = rows[skip:], first_row + skip
+        if not rows:
+            return 0
+        
+        if first_row is None or synced is None or first_row - 2 > synced:
+            # Unknown position, or rows added by someone else in between
+            self._synced_rows[sheet_name] = None
+        else:
+            self._synced_rows[sheet_name] = first_row - 2 + len(rows)
+            self._last_rows[sheet_name] = row_fingerprint(sheet_name, rows[-1])
+        return self._add_rows(sheet_name, rows)
+    
+    def rebuild(self) -> int:
+        """
+        Build the index from the ledger sheets, archives included, and save it (blocking).
+        
+        Returns:
+            Number of documents
+        """
+        with self._lock:
+            self._building = True
+            self._buffered = []
+            self._archived_while_building = False
+        try:
+            archived = self.sheets.get_archive_rows()
+            sheet_rows = self.sheets.get_cached_rows([SheetsService.TRANSACCIONES_SHEET,
+                                                      SheetsService.PRESUPUESTOS_SHEET,
+                                                      SheetsService.CAPITAL_SHEET])
+        except Exception:
+            with self._lock:
+                self._building = False
+            raise
+        
+        with self._lock:
+            self._reset()
+            for rows in archived.values():
+                self._add_rows(SheetsService.TRANSACCIONES_SHEET, rows)
+            for sheet_name, rows in sheet_rows.items():
+                self._add_rows(sheet_name, rows)
+                self._synced_rows[sheet_name] = len(rows)
+                self._last_rows[sheet_name] = row_fingerprint(sheet_name, rows[-1]) if rows else None
+            # Rows written while the sheets were being read, unless the read included them
+            for sheet_name, rows, first_row in self._buffered:
+                self._apply_batch(sheet_name, rows, first_row)
+            self._buffered = []
+            if self._archived_while_building:
+                # The read may or may not have seen the archived rows
+                self._synced_rows[SheetsService.TRANSACCIONES_SHEET] = None
+                self._archived_while_building = False
+            self._building = False
+            self._loaded = True
+        self.save()
+        logger.info(f"Search index built: {len(self)} documents, {len(self.postings)} terms")
+        return len(self)
+    
+    def ensure_loaded(self) -> None:
+        """Load the index from disk, or build it from the sheets if there is none (blocking)."""
+        if self._loaded:
+            return
+        if not self.load():
+            self.rebuild()
+    
+    def on_rows_written(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """Outbox flush listener: index rows as they are saved."""
+        with self._lock:
+            if self._building or not self._loaded:
+                # Applied once the index is loaded or built
+                self._buffered.append((sheet_name, rows, first_row))
+                return
+            self._unsaved += self._apply_batch(sheet_name, rows, first_row)
+            save = self._unsaved >= _SAVE_EVERY
+        if save:
+            self.save()
+    
+    def on_archived(self, year: int, rows: List[list]) -> None:
+        """
+        Archiver listener: account for rows moved out of Transacciones.
+        
+        The documents stay searchable (archives are indexed too), but the
+        rows no longer count towards the sheet's covered rows, or later
+        batches would land below that count and be skipped as covered. If
+        the last covered row itself was moved, or the index was being
+        built, where the sheet ends becomes unknown.
+        """
+        sheet_name = SheetsService.TRANSACCIONES_SHEET
+        with self._lock:
+            if self._building:
+                self._archived_while_building = True
+                return
+            synced = self._synced_rows.get(sheet_name)
+            if not self._loaded or synced is None:
+                return
+            last = self._last_rows.get(sheet_name)
+            if any(row_fingerprint(sheet_name, [str(cell) for cell in row]) == last for row in rows):
+                self._synced_rows[sheet_name] = None
+                return
+            self._synced_rows[sheet_name] = max(synced - len(rows), 0)
+            if not self._synced_rows[sheet_name]:
+                self._last_rows[sheet_name] = None
+    
+    def search(self, query: str, tipo: Optional[str] = None, limit: int = 20) -> Tuple[int, float, List[Dict[str, Any]]]:
+        """
+        Find documents containing every token of the query.
+        
+        A token with no exact match is expanded to the terms that start
+        with it ("pag" finds "pague", "pago").
+        
+        Args:
+            query: Search text, e.g. "uber" or "pagué arriendo"
+            tipo: Only this tipo (gasto, ingreso, ...)
+            limit: Maximum documents returned
+        
+        Returns:
+            (total matches, total amount of matches, newest matches first)
+        """
+        tokens = tokenize(query)
+        if tipo:
+            tokens.append(tipo)
+        if not tokens:
+            return 0, 0.0, []
+        
+        with self._lock:
+            postings = []
+            for token in set(tokens):
+                posting = self.postings.get(token)
+                if posting is None:
+                    expanded = [p for term, p in self.postings.items() if term.startswith(token)]
+                    if not expanded:
+                        return 0, 0.0, []
+                    posting = array("I", sorted({doc for p in expanded for doc in p},
+                                                key=lambda doc: self.epochs[doc]))
+                postings.append(posting)
+            
+            # Intersect starting from the shortest list; its time order is kept
+            postings.sort(key=len)
+            matches = postings[0]
+            for other in postings[1:]:
+                others = set(other)
+                matches = [doc for doc in matches if doc in others]
+            
+            total_amount = round(sum(self.amounts[doc] for doc in matches), 2)
+            results = [self._document(doc) for doc in reversed(matches[-limit:])] if limit > 0 else []
+        return len(matches), total_amount, results
+    
+    def _document(self, doc: int) -> Dict[str, Any]:
+        """A document as a JSON-friendly dict."""
+        return {
+            "fecha": datetime.fromtimestamp(self.epochs[doc]).isoformat(),
+            "tipo": TIPOS[self.tipos[doc]],
+            "monto": self.amounts[doc],
+            "categoria": self.label_names[self.labels[doc]],
+            "descripcion": self.descriptions[doc]
+        }
+    
+    def save(self) -> None:
+        """
+        Persist the index in a compact binary form.
+        
+        Layout (zlib-compressed): a length-prefixed JSON header with the
+        strings (labels, descriptions, terms and posting lengths) and the
+        rows covered per sheet with the fingerprint of the last one,
+        followed by the raw numeric arrays and the concatenated posting
+        lists. Does nothing until the index is loaded or built, so an
+        empty index never overwrites a saved one.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            terms = list(self.postings)
+            header = json.dumps({
+                "version": _FORMAT_VERSION,
+                "synced_rows": self._synced_rows,
+                "last_rows": self._last_rows,
+                "labels": self.label_names,
+                "descriptions": self.descriptions,
+                "terms": terms,
+                "lengths": [len(self.postings[term]) for term in terms]
+            }, ensure_ascii=False).encode("utf-8")
+            postings = array("I")
+            for term in terms:
+                postings.extend(self.postings[term])
+            parts = [struct.pack("<I", len(header)), header, self.epochs.tobytes(), self.amounts.tobytes(),
+                     self.tipos.tobytes(), self.labels.tobytes(), postings.tobytes()]
+            self._unsaved = 0
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_bytes(zlib.compress(b"".join(parts), 6))
+        tmp_path.replace(self.path)
+    
+    def load(self) -> bool:
+        """
+        Load the index saved by save() plus the rows appended since (blocking).
+        
+        The rows after the covered ones come from a single read, which
+        starts at the last covered row of each sheet to check that it is
+        still there. A sheet changed in other ways (edited by hand,
+        archived) makes the file unusable.
+        
+        Returns:
+            True if loaded, False if there is no usable file
+        """
+        if not self.path.exists():
+            return False
+        try:
+            data = zlib.decompress(self.path.read_bytes())
+            (header_size,) = struct.unpack_from("<I", data)
+            header = json.loads(data[4:4 + header_size].decode("utf-8"))
+            if header.get("version") != _FORMAT_VERSION:
+                return False
+            
+            count = len(header["descriptions"])
+            offset = 4 + header_size
+            arrays = []
+            for typecode in ("d", "d", "b", "I"):
+                values = array(typecode)
+                size = values.itemsize * count
+                values.frombytes(data[offset:offset + size])
+                arrays.append(values)
+                offset += size
+            postings = array("I")
+            postings.frombytes(data[offset:])
+            synced_rows, last_rows = header["synced_rows"], header["last_rows"]
+        except (OSError, ValueError, KeyError, zlib.error, struct.error) as e:
+            logger.error(f"Error loading search index from {self.path}: {e}")
+            return False
+        
+        if any(synced_rows.get(sheet_name) is None for sheet_name in _FINGERPRINT_COLUMNS):
+            logger.info("Search index file does not know where its rows end; rebuilding")
+            return False
+        
+        # Start at the last covered row, to check it is still there
+        fetched = self.sheets.get_rows_from({sheet_name: synced_rows[sheet_name] + 1 if synced_rows[sheet_name] else 2
+                                             for sheet_name in _FINGERPRINT_COLUMNS})
+        tails = {}
+        for sheet_name in _FINGERPRINT_COLUMNS:
+            rows = fetched.get(sheet_name, [])
+            if synced_rows[sheet_name]:
+                if not rows or row_fingerprint(sheet_name, rows[0]) != last_rows.get(sheet_name):
+                    logger.info(f"{sheet_name} changed since the search index was saved; rebuilding")
+                    return False
+                rows = rows[1:]
+            tails[sheet_name] = rows
+        
+        with self._lock:
+            self._reset()
+            self.epochs, self.amounts, self.tipos, self.labels = arrays
+            self.descriptions = header["descriptions"]
+            self.label_names = header["labels"]
+            self._label_ids = {label: i for i, label in enumerate(self.label_names)}
+            start = 0
+            for term, length in zip(header["terms"], header["lengths"]):
+                self.postings[term] = postings[start:start + length]
+                start += length
+            self._synced_rows, self._last_rows = dict(synced_rows), dict(last_rows)
+            # Rows saved after the file was written, then those saved during this load
+            for sheet_name, rows in tails.items():
+                self._unsaved += self._apply_batch(sheet_name, rows, synced_rows[sheet_name] + 2)
+            for sheet_name, rows, first_row in self._buffered:
+                self._unsaved += self._apply_batch(sheet_name, rows, first_row)
+            self._buffered = []
+            self._loaded = True
+        
+        logger.info(f"Search index loaded: {len(self)} documents, {len(self.postings)} terms")
+        return True
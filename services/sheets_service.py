@@ -5,19 +5,23 @@ Handles authentication and data persistence to Google Sheets.
 """
 
 import logging
-from typing import Optional, List
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional, List, Tuple, Union
 from pathlib import Path
 
-import gspread
-from google.oauth2.service_account import Credentials
-from google.auth.exceptions import GoogleAuthError
-
 from domain.transaction import Transaction, TransactionType
 from domain.capital import CapitalMovement
+from domain.records import TransactionRecord, BudgetRecord, CapitalRecord
 from services.config import settings
+from services.metrics import metrics
+from services.row_decoder import decode_transactions, decode_budgets, decode_capital
 
 logger = logging.getLogger(__name__)
 
+metrics.describe("sheets_cached_reads_total", "Whole-sheet reads by result (hit: unchanged spreadsheet, no download)")
+
 
 class SheetsService:
     """
@@ -39,6 +43,7 @@ class SheetsService:
     TRANSACCIONES_SHEET = "Transacciones"
     CAPITAL_SHEET = "Ahorros e Inversiones"
     PRESUPUESTOS_SHEET = "Presupuestos"
+    RESUMEN_SHEET = "Resumen"
     
     # Header row for Transacciones sheet (gastos e ingresos unificados)
     TRANSACCIONES_HEADER = ["Fecha", "Monto", "Categoría", "Descripción", "Es Ingreso"]
@@ -49,6 +54,23 @@ class SheetsService:
     # Header row for Presupuestos sheet
     PRESUPUESTOS_HEADER = ["Fecha", "Monto", "Categoría", "Descripción"]
     
+    # Header row for Resumen sheet (maintained by the bot, see services/summary.py)
+    RESUMEN_HEADER = ["Mes", "Tipo", "Categoría", "Total", "Movimientos"]
+    
+    # Sheets created by initialize_sheets(): (title, header, initial row count)
+    SHEET_LAYOUTS = [
+        (TRANSACCIONES_SHEET, TRANSACCIONES_HEADER, 1000),  # More rows since it's unified
+        (CAPITAL_SHEET, CAPITAL_HEADER, 500),
+        (PRESUPUESTOS_SHEET, PRESUPUESTOS_HEADER, 100),
+        (RESUMEN_SHEET, RESUMEN_HEADER, 200),
+    ]
+    
+    # Attempts at reading the Drive revision before a read goes uncached (see _probe_revision)
+    REVISION_PROBE_ATTEMPTS = 2
+    
+    # Closed years of Transacciones are moved to "Transacciones <year>" sheets (see services/archive.py)
+    ARCHIVE_TITLE_PATTERN = re.compile(rf"^{re.escape(TRANSACCIONES_SHEET)} (\d{{4}})$")
+    
     def __init__(self, credentials_file: Optional[str] = None, spreadsheet_id: Optional[str] = None):
         """
         Initialize the Sheets service.
@@ -60,7 +82,16 @@ class SheetsService:
         self.credentials_file = credentials_file or settings.SHEETS_CREDENTIALS_FILE
         self.spreadsheet_id = spreadsheet_id or settings.SPREADSHEET_ID
         self.client = None
+        self.transport = None
         self.spreadsheet = None
+        self._worksheets = {}
+        self._archive_years: Optional[List[int]] = None  # See archive_years
+        # Whole-sheet reads of get_cached_rows(), valid while the Drive revision stays the same
+        self._read_cache: Dict[str, List[List]] = {}
+        self._read_revision: Optional[str] = None
+        self._read_lock = threading.Lock()
+        self._writes = 0  # Writes of ours so far, so reads that overlap one are not cached
+        self._revision_probe_failed = False
     
     def authenticate(self) -> bool:
         """
@@ -69,17 +100,19 @@ class SheetsService:
         Returns:
             True if authentication successful, False otherwise
         """
+        # Heavy client libraries are imported on first use to keep startup fast
+        import gspread
+        from google.auth.exceptions import GoogleAuthError
+        from services.sheets_transport import SheetsTransport
+        
         try:
             if not Path(self.credentials_file).exists():
                 logger.error(f"Credentials file not found: {self.credentials_file}")
                 return False
             
-            creds = Credentials.from_service_account_file(
-                self.credentials_file,
-                scopes=self.SCOPES
-            )
-            
-            self.client = gspread.authorize(creds)
+            # Credential, token and keep-alive connections are shared by all clients
+            self.transport = SheetsTransport.shared(self.credentials_file, self.SCOPES)
+            self.client = gspread.Client(auth=self.transport.credentials, session=self.transport.session)
             logger.info("Successfully authenticated with Google Sheets")
             return True
             
@@ -107,20 +140,46 @@ class SheetsService:
         
         try:
             self.spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+            self._worksheets = {}
             logger.info(f"Connected to spreadsheet: {self.spreadsheet.title}")
             return True
         except Exception as e:
             logger.error(f"Error connecting to spreadsheet: {e}")
             return False
     
+    def ensure_connected(self) -> bool:
+        """
+        Authenticate, connect and initialize the sheets unless already done.
+        
+        Lets background writers recover when Google was unreachable at startup.
+        
+        Returns:
+            True if the spreadsheet is ready, False otherwise
+        """
+        if self.spreadsheet and self._worksheets:
+            return True
+        if not self.client and not self.authenticate():
+            return False
+        if not self.spreadsheet and not self.connect_spreadsheet():
+            return False
+        return self.initialize_sheets()
+    
     def initialize_sheets(self) -> bool:
         """
         Initialize the spreadsheet with required sheets and headers.
         
-        Creates three sheets:
+        Creates four sheets:
         1. "Transacciones" - Unified sheet for gastos e ingresos (operational flow)
         2. "Ahorros e Inversiones" - Capital movements (savings & investments)
         3. "Presupuestos" - Budgets
+        4. "Resumen" - Monthly totals and active capital, maintained by the bot
+        
+        When every sheet exists, the check is a single metadata read that
+        also returns their header rows, however many sheets SHEET_LAYOUTS
+        lists. Only on a spreadsheet that is missing sheets does it take
+        more: a read of every sheet's properties, a header read of the
+        present ones, and one batch_update that creates sheets and writes
+        headers together.
         
         Returns:
             True if initialization successful, False otherwise
@@ -129,56 +188,79 @@ class SheetsService:
             logger.error("Not connected to spreadsheet. Call connect_spreadsheet() first.")
             return False
         
+        from gspread.exceptions import APIError
+        
         try:
-            existing_sheets = [ws.title for ws in self.spreadsheet.worksheets()]
+            titles = [title for title, _, _ in self.SHEET_LAYOUTS]
+            try:
+                # Usual case, one round trip: properties and header row of every sheet
+                existing, first_rows = self._fetch_headers(titles)
+                # Only the requested sheets come back; archives are listed on first use
+                self._archive_years = None
+            except APIError as e:
+                if getattr(e.response, "status_code", None) != 400:
+                    raise
+                # A sheet is missing (its range does not parse): list them all first
+                metadata = self.spreadsheet.fetch_sheet_metadata(params={"fields": "sheets.properties"})
+                existing = {
+                    sheet["properties"]["title"]: sheet["properties"]
+                    for sheet in metadata.get("sheets", [])
+                }
+                self._archive_years = self._archive_years_of(existing)
+                present = [title for title in titles if title in existing]
+                first_rows = self._fetch_headers(present)[1] if present else {}
             
-            # Create or verify "Transacciones" sheet (unified gastos + ingresos)
-            if self.TRANSACCIONES_SHEET not in existing_sheets:
-                worksheet = self.spreadsheet.add_worksheet(
-                    title=self.TRANSACCIONES_SHEET,
-                    rows=1000,  # More rows since it's unified
-                    cols=5
-                )
-                worksheet.append_row(self.TRANSACCIONES_HEADER)
-                logger.info(f"Created sheet: {self.TRANSACCIONES_SHEET}")
-            else:
-                worksheet = self.spreadsheet.worksheet(self.TRANSACCIONES_SHEET)
-                first_row = worksheet.row_values(1)
-                if not first_row or first_row != self.TRANSACCIONES_HEADER:
-                    worksheet.insert_row(self.TRANSACCIONES_HEADER, 1)
-                    logger.info(f"Added header to sheet: {self.TRANSACCIONES_SHEET}")
+            # Only if needed: create sheets and write headers together
+            requests = []
+            next_sheet_id = max([props["sheetId"] for props in existing.values()], default=0) + 1
+            for title, header, rows in self.SHEET_LAYOUTS:
+                if title not in existing:
+                    sheet_id = next_sheet_id
+                    next_sheet_id += 1
+                    requests.append({
+                        "addSheet": {
+                            "properties": {
+                                "sheetId": sheet_id,
+                                "title": title,
+                                "gridProperties": {"rowCount": rows, "columnCount": len(header)}
+                            }
+                        }
+                    })
+                    requests.append(self._header_request(sheet_id, header))
+                    logger.info(f"Creating sheet: {title}")
+                    continue
+                
+                first_row = first_rows.get(title, [])
+                if first_row != header:
+                    sheet_id = existing[title]["sheetId"]
+                    if first_row:
+                        # Keep existing data: shift it down and put the header above
+                        requests.append({
+                            "insertDimension": {
+                                "range": {
+                                    "sheetId": sheet_id,
+                                    "dimension": "ROWS",
+                                    "startIndex": 0,
+                                    "endIndex": 1
+                                },
+                                "inheritFromBefore": False
+                            }
+                        })
+                    requests.append(self._header_request(sheet_id, header))
+                    logger.info(f"Adding header to sheet: {title}")
             
-            # Create or verify "Ahorros e Inversiones" sheet (capital movements)
-            if self.CAPITAL_SHEET not in existing_sheets:
-                worksheet = self.spreadsheet.add_worksheet(
-                    title=self.CAPITAL_SHEET,
-                    rows=500,
-                    cols=8
-                )
-                worksheet.append_row(self.CAPITAL_HEADER)
-                logger.info(f"Created sheet: {self.CAPITAL_SHEET}")
-            else:
-                worksheet = self.spreadsheet.worksheet(self.CAPITAL_SHEET)
-                first_row = worksheet.row_values(1)
-                if not first_row or first_row != self.CAPITAL_HEADER:
-                    worksheet.insert_row(self.CAPITAL_HEADER, 1)
-                    logger.info(f"Added header to sheet: {self.CAPITAL_SHEET}")
+            if requests:
+                response = self.spreadsheet.batch_update({"requests": requests})
+                for reply in response.get("replies", []):
+                    if "addSheet" in reply:
+                        properties = reply["addSheet"]["properties"]
+                        existing[properties["title"]] = properties
             
-            # Create or verify "Presupuestos" sheet
-            if self.PRESUPUESTOS_SHEET not in existing_sheets:
-                worksheet = self.spreadsheet.add_worksheet(
-                    title=self.PRESUPUESTOS_SHEET,
-                    rows=100,
-                    cols=4
-                )
-                worksheet.append_row(self.PRESUPUESTOS_HEADER)
-                logger.info(f"Created sheet: {self.PRESUPUESTOS_SHEET}")
-            else:
-                worksheet = self.spreadsheet.worksheet(self.PRESUPUESTOS_SHEET)
-                first_row = worksheet.row_values(1)
-                if not first_row or first_row != self.PRESUPUESTOS_HEADER:
-                    worksheet.insert_row(self.PRESUPUESTOS_HEADER, 1)
-                    logger.info(f"Added header to sheet: {self.PRESUPUESTOS_SHEET}")
+            # Cache worksheet handles so later reads/writes skip a metadata lookup
+            self._worksheets = {
+                title: self._worksheet_from_properties(existing[title])
+                for title, _, _ in self.SHEET_LAYOUTS
+            }
             
             return True
             
@@ -186,6 +268,154 @@ class SheetsService:
             logger.error(f"Error initializing sheets: {e}")
             return False
     
+    def _fetch_headers(self, titles: List[str]) -> Tuple[Dict[str, dict], Dict[str, List[str]]]:
+        """
+        Properties and header row of several sheets in one metadata read.
+        
+        Errors are raised; a title that does not exist fails the whole
+        request with a 400.
+        
+        Args:
+            titles: Sheet titles
+        
+        Returns:
+            (title → sheet properties, title → header row without trailing empty cells)
+        """
+        metadata = self.spreadsheet.fetch_sheet_metadata(params={
+            "includeGridData": "true",
+            "ranges": [self._a1_range(title, "1:1") for title in titles],
+            "fields": "sheets(properties,data.rowData.values.formattedValue)",
+        })
+        existing = {}
+        first_rows = {}
+        for sheet in metadata.get("sheets", []):
+            title = sheet["properties"]["title"]
+            existing[title] = sheet["properties"]
+            rows = (sheet.get("data") or [{}])[0].get("rowData") or [{}]
+            header = [cell.get("formattedValue", "") for cell in rows[0].get("values", [])]
+            while header and not header[-1]:
+                header.pop()
+            first_rows[title] = header
+        return existing, first_rows
+    
+    @classmethod
+    def _archive_years_of(cls, titles) -> List[int]:
+        """Years of the archive sheets among some sheet titles."""
+        return sorted(int(match.group(1)) for match in map(cls.ARCHIVE_TITLE_PATTERN.match, titles) if match)
+    
+    @property
+    def archive_years(self) -> List[int]:
+        """
+        Years with an archive sheet.
+        
+        initialize_sheets() only reads the sheets it manages, so the sheet
+        titles are listed on first use (one metadata read). Errors are raised.
+        """
+        if self._archive_years is None:
+            if not self.spreadsheet:
+                return []
+            self._archive_years = self._archive_years_of(self.get_sheet_titles())
+        return self._archive_years
+    
+    @archive_years.setter
+    def archive_years(self, years: List[int]) -> None:
+        self._archive_years = years
+    
+    @staticmethod
+    def _a1_range(title: str, cells: str) -> str:
+        """
+        Build an A1 range for a sheet title, quoting it as the API expects.
+        
+        Args:
+            title: Sheet title
+            cells: Cell range within the sheet (e.g. "1:1", "A2:E")
+        
+        Returns:
+            Range string like "'Ahorros e Inversiones'!1:1"
+        """
+        escaped = title.replace("'", "''")
+        return f"'{escaped}'!{cells}"
+    
+    @staticmethod
+    def _header_request(sheet_id: int, header: List[str]) -> dict:
+        """
+        Build a batch_update request that writes a header into row 1.
+        
+        Args:
+            sheet_id: Numeric id of the target sheet
+            header: Header values
+        
+        Returns:
+            updateCells request body
+        """
+        return {
+            "updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": [{
+                    "values": [{"userEnteredValue": {"stringValue": value}} for value in header]
+                }],
+                "fields": "userEnteredValue"
+            }
+        }
+    
+    def _worksheet_from_properties(self, properties: dict):
+        """Create a worksheet handle from sheet properties without an API call."""
+        import gspread
+        return gspread.Worksheet(self.spreadsheet, properties)
+    
+    def _get_worksheet(self, title: str):
+        """
+        Get a worksheet handle by title, using the cache filled by initialize_sheets.
+        
+        Args:
+            title: Sheet title
+        
+        Returns:
+            gspread Worksheet
+        """
+        worksheet = self._worksheets.get(title)
+        if worksheet is None:
+            worksheet = self.spreadsheet.worksheet(title)
+            self._worksheets[title] = worksheet
+        return worksheet
+    
+    @classmethod
+    def row_for_record(cls, record: Union[Transaction, CapitalMovement]) -> Tuple[str, list]:
+        """
+        Map a domain record to its target sheet and row.
+        
+        - Gastos e Ingresos → "Transacciones" sheet (operational flow)
+        - Presupuestos → "Presupuestos" sheet
+        - Ahorros e Inversiones → "Ahorros e Inversiones" sheet
+        
+        Args:
+            record: Transaction or CapitalMovement to map
+        
+        Returns:
+            Tuple (sheet_name, row_values)
+        
+        Raises:
+            ValueError: If a Transaction has a capital tipo (ahorro/inversion)
+        """
+        if isinstance(record, CapitalMovement):
+            return cls.CAPITAL_SHEET, record.to_sheets_row()
+        
+        if record.tipo == TransactionType.PRESUPUESTO:
+            # For presupuestos, exclude the "Es Ingreso" column
+            return cls.PRESUPUESTOS_SHEET, [
+                record.fecha.strftime("%Y-%m-%d %H:%M:%S"),
+                record.monto,
+                record.categoria,
+                record.descripcion or ""
+            ]
+        
+        if record.tipo in [TransactionType.AHORRO, TransactionType.INVERSION]:
+            # Capital movements must be CapitalMovement objects
+            raise ValueError(f"Transaction tipo {record.tipo} should be saved as a CapitalMovement")
+        
+        # Gastos and Ingresos go to unified "Transacciones" sheet
+        return cls.TRANSACCIONES_SHEET, record.to_sheets_row()
+    
     def save_transaction(self, transaction: Transaction) -> bool:
         """
         Save a transaction to the appropriate sheet.
@@ -206,26 +436,15 @@ class SheetsService:
         
         try:
             # Determine target sheet based on transaction type
-            if transaction.tipo == TransactionType.PRESUPUESTO:
-                sheet_name = self.PRESUPUESTOS_SHEET
-                # For presupuestos, exclude the "Es Ingreso" column
-                row_data = [
-                    transaction.fecha.strftime("%Y-%m-%d %H:%M:%S"),
-                    transaction.monto,
-                    transaction.categoria,
-                    transaction.descripcion or ""
-                ]
-            elif transaction.tipo in [TransactionType.AHORRO, TransactionType.INVERSION]:
-                # Capital movements should use save_capital_movement() instead
-                logger.warning(f"Transaction tipo {transaction.tipo} should use save_capital_movement()")
+            try:
+                sheet_name, row_data = self.row_for_record(transaction)
+            except ValueError as e:
+                logger.warning(str(e))
                 return False
-            else:
-                # Gastos and Ingresos go to unified "Transacciones" sheet
-                sheet_name = self.TRANSACCIONES_SHEET
-                row_data = transaction.to_sheets_row()
             
-            worksheet = self.spreadsheet.worksheet(sheet_name)
+            worksheet = self._get_worksheet(sheet_name)
             worksheet.append_row(row_data)
+            self._invalidate_reads()
             logger.info(f"Saved transaction to {sheet_name}: {transaction}")
             return True
             
@@ -248,9 +467,10 @@ class SheetsService:
             return False
         
         try:
-            worksheet = self.spreadsheet.worksheet(self.CAPITAL_SHEET)
+            worksheet = self._get_worksheet(self.CAPITAL_SHEET)
             row_data = capital.to_sheets_row()
             worksheet.append_row(row_data)
+            self._invalidate_reads()
             logger.info(f"Saved capital movement to {self.CAPITAL_SHEET}: {capital}")
             return True
             
@@ -258,6 +478,482 @@ class SheetsService:
             logger.error(f"Error saving capital movement: {e}")
             return False
     
+    def append_rows(self, sheet_name: str, rows: List[list]) -> Optional[int]:
+        """
+        Append several rows to a sheet in a single API call.
+        
+        Unlike the save_* methods, errors are raised so callers that retry
+        (like the outbox drainer) can tell a failed write from a successful one.
+        
+        Args:
+            sheet_name: Target sheet title
+            rows: Row values to append
+        
+        Returns:
+            Sheet row number of the first appended row, or None if unknown
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        worksheet = self._get_worksheet(sheet_name)
+        response = worksheet.append_rows(rows)
+        self._invalidate_reads()
+        logger.info(f"Appended {len(rows)} rows to {sheet_name}")
+        
+        # updatedRange looks like "'Transacciones'!A12:E14"
+        updated_range = response.get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        return int(match.group(1)) if match else None
+    
+    def get_rows(self, sheet_name: str) -> List[List]:
+        """
+        Get all rows of a sheet (excluding the header).
+        
+        Unlike the get_* readers, errors are raised so callers can tell an
+        empty sheet from a failed read. Sheets of SHEET_LAYOUTS are read with
+        get_cached_rows(), so nothing is downloaded while the spreadsheet is
+        unchanged.
+        
+        Args:
+            sheet_name: Sheet title
+        
+        Returns:
+            Raw rows; row i is sheet row i + 2
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        if any(title == sheet_name for title, _, _ in self.SHEET_LAYOUTS):
+            return self.get_cached_rows([sheet_name])[sheet_name]
+        return self._get_worksheet(sheet_name).get_all_values()[1:]  # Skip header
+    
+    def get_revision(self) -> str:
+        """
+        Cheap change signal of the whole spreadsheet.
+        
+        One Drive metadata request that returns the file's version and
+        modifiedTime, without downloading any cell values; both change on
+        every edit, by the bot or by hand. Errors are raised, like get_rows().
+        
+        Returns:
+            Opaque revision string
+        """
+        if not self.client:
+            raise RuntimeError("Not authenticated")
+        
+        from gspread.urls import DRIVE_FILES_API_V3_URL
+        response = self.client.request("get", f"{DRIVE_FILES_API_V3_URL}/{self.spreadsheet_id}",
+                                       params={"fields": "version,modifiedTime", "supportsAllDrives": True})
+        metadata = response.json()
+        return f"{metadata.get('version')}@{metadata.get('modifiedTime')}"
+    
+    def _invalidate_reads(self) -> None:
+        """Forget cached reads after a write of ours (Drive may report the new revision late)."""
+        with self._read_lock:
+            self._writes += 1
+            self._read_revision = None
+            self._read_cache = {}
+    
+    def _probe_revision(self) -> Optional[str]:
+        """
+        The current revision, or None if it cannot be read (then the read is not cached).
+        
+        Only a 403 or 404 (Drive API not enabled, or no access to the file)
+        turns the probe off for good; other errors are retried once and then
+        again on the next read.
+        """
+        if self._revision_probe_failed or not settings.SHEETS_CHANGE_DETECTION:
+            return None
+        
+        from gspread.exceptions import APIError
+        
+        for attempt in range(self.REVISION_PROBE_ATTEMPTS):
+            try:
+                return self.get_revision()
+            except APIError as e:
+                if getattr(e.response, "status_code", None) in (403, 404):
+                    self._revision_probe_failed = True
+                    logger.warning(f"Cannot read the spreadsheet revision, sheet reads will not be cached: {e}")
+                    return None
+                error = e
+            except Exception as e:
+                error = e
+        logger.warning(f"Spreadsheet revision probe failed, reading without cache: {error}")
+        return None
+    
+    def get_cached_rows(self, titles: List[str]) -> Dict[str, List[List]]:
+        """
+        Get all rows of several sheets, downloading them only if the spreadsheet changed.
+        
+        The Drive revision is checked first; when it matches the one of the
+        last read and every sheet is cached, no values are downloaded.
+        Otherwise the sheets are read in one values_batch_get call. Rows are
+        padded to the header width like get_all_values(). Errors are raised,
+        like get_rows().
+        
+        Each call gets its own outer lists, but the row lists are shared
+        with the cache and later callers: treat them as read-only.
+        
+        Args:
+            titles: Sheet titles of SHEET_LAYOUTS
+        
+        Returns:
+            sheet title → rows (excluding the header); row i is sheet row i + 2
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        revision = self._probe_revision()
+        with self._read_lock:
+            writes = self._writes
+            if revision is not None and revision == self._read_revision and all(
+                    title in self._read_cache for title in titles):
+                metrics.inc("sheets_cached_reads_total", len(titles), result="hit")
+                return {title: list(self._read_cache[title]) for title in titles}
+        
+        widths = {title: len(header) for title, header, _ in self.SHEET_LAYOUTS}
+        rows = {title: [row + [""] * (widths.get(title, 0) - len(row)) for row in values]
+                for title, values in self._batch_rows(titles).items()}
+        metrics.inc("sheets_cached_reads_total", len(titles), result="miss")
+        
+        with self._read_lock:
+            if revision is not None and writes == self._writes:
+                if revision != self._read_revision:
+                    self._read_cache = {}
+                    self._read_revision = revision
+                self._read_cache.update(rows)
+        return {title: list(sheet_rows) for title, sheet_rows in rows.items()}
+    
+    def get_row_chunk(self, sheet_name: str, first_row: int, count: int) -> List[List]:
+        """
+        Get a fixed window of rows of any sheet (not only SHEET_LAYOUTS ones).
+        
+        Errors are raised, like get_rows(). Trailing empty rows and cells
+        of the window are not returned, so fewer than `count` rows only
+        means the rest of the window is blank, not that the sheet ends
+        there; see get_sheet_row_counts().
+        
+        Args:
+            sheet_name: Sheet title
+            first_row: First sheet row number to read
+            count: Number of rows in the window
+        
+        Returns:
+            Raw rows; row i is sheet row first_row + i
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        response = self.spreadsheet.values_get(
+            self._a1_range(sheet_name, f"A{first_row}:Z{first_row + count - 1}"))
+        return response.get("values", [])
+    
+    def get_row_count(self, sheet_name: str) -> int:
+        """
+        Number of rows of a sheet up to its last filled Fecha cell, header included.
+        
+        Only column A is downloaded. Errors are raised, like get_rows().
+        
+        Args:
+            sheet_name: Sheet title
+        
+        Returns:
+            Sheet row number of the last row with a value in column A
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        response = self.spreadsheet.values_get(self._a1_range(sheet_name, "A:A"))
+        return len(response.get("values", []))
+    
+    def get_sheet_titles(self) -> List[str]:
+        """
+        Titles of every sheet in the spreadsheet, in one metadata call.
+        
+        Errors are raised, like get_rows().
+        
+        Returns:
+            Sheet titles in tab order
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        metadata = self.spreadsheet.fetch_sheet_metadata(params={"fields": "sheets.properties.title"})
+        return [sheet["properties"]["title"] for sheet in metadata.get("sheets", [])]
+    
+    def get_sheet_row_counts(self) -> Dict[str, int]:
+        """
+        Grid size of every sheet, in one metadata call.
+        
+        The grid includes blank rows, so it is an upper bound of the last
+        filled row in any column. Errors are raised, like get_rows().
+        
+        Returns:
+            Sheet title → number of rows in its grid, in tab order
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        metadata = self.spreadsheet.fetch_sheet_metadata(
+            params={"fields": "sheets.properties(title,gridProperties.rowCount)"})
+        return {sheet["properties"]["title"]: sheet["properties"].get("gridProperties", {}).get("rowCount", 0)
+                for sheet in metadata.get("sheets", [])}
+    
+    @classmethod
+    def archive_title(cls, year: int) -> str:
+        """Title of the Transacciones archive sheet of a year."""
+        return f"{cls.TRANSACCIONES_SHEET} {year}"
+    
+    def _batch_rows(self, titles: List[str], first_rows: Optional[Dict[str, int]] = None) -> Dict[str, List[List]]:
+        """Rows (from row 2, or the given first row) of several sheets in one values_batch_get call."""
+        if not titles:
+            return {}
+        first_rows = first_rows or {}
+        response = self.spreadsheet.values_batch_get(
+            [self._a1_range(title, f"A{first_rows.get(title, 2)}:Z") for title in titles])
+        return {title: value_range.get("values", [])
+                for title, value_range in zip(titles, response.get("valueRanges", []))}
+    
+    def get_rows_from(self, first_rows: Dict[str, int]) -> Dict[str, List[List]]:
+        """
+        Get the rows of several sheets from a given row on, in one API call.
+        
+        Errors are raised, like get_rows(). Trailing empty cells are not
+        returned, and a sheet with no rows from that point yields [].
+        
+        Args:
+            first_rows: sheet title → first sheet row number to read (2 for all rows)
+        
+        Returns:
+            sheet title → rows; row i is sheet row first_row + i
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        return self._batch_rows(list(first_rows), first_rows)
+    
+    def get_archive_rows(self, years: Optional[List[int]] = None) -> Dict[int, List[List]]:
+        """
+        Get the rows of Transacciones archive sheets in one API call.
+        
+        Errors are raised, like get_rows().
+        
+        Args:
+            years: Archive years to read (None for all)
+        
+        Returns:
+            year → rows, for the requested years that have an archive
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        wanted = [year for year in self.archive_years if years is None or year in years]
+        rows = self._batch_rows([self.archive_title(year) for year in wanted])
+        return {year: rows.get(self.archive_title(year), []) for year in wanted}
+    
+    def get_transaction_rows(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[List]:
+        """
+        Get Transacciones rows, adding the archives a date range reaches into.
+        
+        The hot sheet and the needed archives are read in one API call; a
+        range within the current period reads the hot sheet only. Rows are
+        not filtered by date, and their positions are not sheet row numbers.
+        
+        Args:
+            start: Inclusive lower bound of the range (None for all history)
+            end: Exclusive upper bound of the range (None for no bound)
+        
+        Returns:
+            Archived rows (oldest year first) followed by the hot sheet rows
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        
+        years = [year for year in self.archive_years
+                 if (start is None or year >= start.year) and (end is None or datetime(year, 1, 1) < end)]
+        titles = [self.archive_title(year) for year in years] + [self.TRANSACCIONES_SHEET]
+        rows = self._batch_rows(titles)
+        return [row for title in titles for row in rows.get(title, [])]
+    
+    def archive_rows(self, sheet_name: str, moves: List[Tuple[int, int, str]]) -> None:
+        """
+        Move runs of rows from a sheet to archive sheets in one atomic batch_update.
+        
+        Archive sheets are created (with the source header) or grown as
+        needed, and moved rows are appended after their existing rows. Each
+        run is copied with copyPaste and removed with deleteDimension,
+        bottom-up so the row numbers of the other runs stay valid. Rows
+        appended to the source meanwhile are not affected, since they land
+        below the moved ones.
+        
+        Errors are raised; nothing is moved if the batch fails.
+        
+        Args:
+            sheet_name: Source sheet title
+            moves: Non-overlapping (first sheet row number, row count, archive title) runs
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        if not moves:
+            return
+        
+        header = next(header for title, header, _ in self.SHEET_LAYOUTS if title == sheet_name)
+        metadata = self.spreadsheet.fetch_sheet_metadata(params={"fields": "sheets.properties"})
+        existing = {sheet["properties"]["title"]: sheet["properties"] for sheet in metadata.get("sheets", [])}
+        source_id = existing[sheet_name]["sheetId"]
+        
+        # Next free row (0-based) of each archive: after its existing rows, or after the header
+        targets = sorted({title for _, _, title in moves})
+        next_row = {title: 1 for title in targets}
+        present = [title for title in targets if title in existing]
+        if present:
+            response = self.spreadsheet.values_batch_get([self._a1_range(title, "A:A") for title in present])
+            for title, value_range in zip(present, response.get("valueRanges", [])):
+                next_row[title] = max(len(value_range.get("values", [])), 1)
+        
+        requests = []
+        sheet_ids = {title: existing[title]["sheetId"] for title in present}
+        next_sheet_id = max([props["sheetId"] for props in existing.values()], default=0) + 1
+        for title in targets:
+            needed = next_row[title] + sum(count for _, count, target in moves if target == title)
+            if title not in existing:
+                sheet_ids[title] = next_sheet_id
+                next_sheet_id += 1
+                requests.append({
+                    "addSheet": {
+                        "properties": {
+                            "sheetId": sheet_ids[title],
+                            "title": title,
+                            "gridProperties": {"rowCount": needed, "columnCount": len(header)}
+                        }
+                    }
+                })
+                requests.append(self._header_request(sheet_ids[title], header))
+            elif existing[title]["gridProperties"]["rowCount"] < needed:
+                requests.append({
+                    "appendDimension": {
+                        "sheetId": sheet_ids[title],
+                        "dimension": "ROWS",
+                        "length": needed - existing[title]["gridProperties"]["rowCount"]
+                    }
+                })
+        
+        # Destinations in source order, so each archive keeps the sheet's order
+        placed = []
+        for first_row, count, title in sorted(moves):
+            placed.append((first_row - 1, count, title, next_row[title]))
+            next_row[title] += count
+        
+        for start, count, title, destination in reversed(placed):
+            requests.append({
+                "copyPaste": {
+                    "source": {"sheetId": source_id, "startRowIndex": start, "endRowIndex": start + count,
+                               "startColumnIndex": 0, "endColumnIndex": len(header)},
+                    "destination": {"sheetId": sheet_ids[title], "startRowIndex": destination,
+                                    "endRowIndex": destination + count,
+                                    "startColumnIndex": 0, "endColumnIndex": len(header)},
+                    "pasteType": "PASTE_NORMAL"
+                }
+            })
+            requests.append({
+                "deleteDimension": {
+                    "range": {"sheetId": source_id, "dimension": "ROWS",
+                              "startIndex": start, "endIndex": start + count}
+                }
+            })
+        
+        self.spreadsheet.batch_update({"requests": requests})
+        self._invalidate_reads()
+        
+        # The cached handle has a stale row count now
+        self._worksheets.pop(sheet_name, None)
+        for title in targets:
+            match = self.ARCHIVE_TITLE_PATTERN.match(title)
+            if match and int(match.group(1)) not in self.archive_years:
+                self.archive_years = sorted(self.archive_years + [int(match.group(1))])
+        logger.info(f"Archived {sum(count for _, count, _ in moves)} rows of {sheet_name} into {', '.join(targets)}")
+    
+    def get_tail_rows(self, sheet_name: str, count: int) -> List[List]:
+        """
+        Get the last rows of a sheet (excluding the header).
+        
+        Args:
+            sheet_name: Sheet title
+            count: Maximum number of rows to return
+        
+        Returns:
+            Up to `count` rows from the end of the sheet
+        """
+        records = self.get_rows(sheet_name)
+        return records[-count:] if count > 0 else []
+    
+    def update_capital_movements(self, updates: List[Tuple[int, list]],
+                                 verify: Optional[Callable[[int, list], bool]] = None) -> List[int]:
+        """
+        Rewrite Estado, Fecha Retiro and Retorno of many capital movements in one API call.
+        
+        Row numbers come from a cache, and rows move when someone sorts or
+        deletes rows in the sheet. With verify, the target rows are read
+        first (one batch_get for all of them) and nothing is written unless
+        every row still holds the expected movement.
+        
+        Errors are raised so callers only update their own state after a
+        successful write.
+        
+        Args:
+            updates: (sheet row number, [estado, fecha_retiro, retorno]) pairs
+            verify: Called with (row number, current row values); False marks the row stale
+        
+        Returns:
+            Stale row numbers (nothing was written), or [] after a successful write
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        if not updates:
+            return []
+        
+        worksheet = self._get_worksheet(self.CAPITAL_SHEET)
+        
+        if verify is not None:
+            # Whole rows A:H, so the caller can recompute the movement fingerprint
+            current = worksheet.batch_get([f"A{row}:H{row}" for row, _ in updates])
+            stale = [row for (row, _), values in zip(updates, current)
+                     if not verify(row, list(values[0]) if values else [])]
+            if stale:
+                logger.warning(f"Capital rows {stale} no longer hold the expected movements, not writing")
+                return stale
+        
+        # Estado, Fecha Retiro and Retorno are the adjacent columns E:G
+        data = [{"range": f"E{row}:G{row}", "values": [values]} for row, values in updates]
+        worksheet.batch_update(data)
+        self._invalidate_reads()
+        logger.info(f"Updated {len(updates)} capital movements in {self.CAPITAL_SHEET}")
+        return []
+    
+    def update_ranges(self, sheet_name: str, data: List[Tuple[str, List[list]]], min_rows: int = 0) -> None:
+        """
+        Write several ranges of a sheet in one API call.
+        
+        Errors are raised so callers can retry.
+        
+        Args:
+            sheet_name: Sheet title
+            data: (A1 range within the sheet, values) pairs
+            min_rows: Grow the sheet first if it has fewer rows than this
+        """
+        if not self.spreadsheet:
+            raise RuntimeError("Not connected to spreadsheet")
+        if not data:
+            return
+        
+        worksheet = self._get_worksheet(sheet_name)
+        if worksheet.row_count < min_rows:
+            worksheet.add_rows(min_rows - worksheet.row_count)
+        
+        worksheet.batch_update([{"range": cells, "values": values} for cells, values in data])
+        self._invalidate_reads()
+        logger.info(f"Updated {len(data)} ranges in {sheet_name}")
+    
     def get_capital_movements(self, only_active: bool = False) -> List[List]:
         """
         Retrieve capital movements from Google Sheets.
@@ -273,8 +969,7 @@ class SheetsService:
             return []
         
         try:
-            worksheet = self.spreadsheet.worksheet(self.CAPITAL_SHEET)
-            records = worksheet.get_all_values()[1:]  # Skip header
+            records = self.get_rows(self.CAPITAL_SHEET)
             
             if only_active:
                 # Filter by Estado column (index 4): only "activo"
@@ -290,6 +985,9 @@ class SheetsService:
         """
         Retrieve transactions from Google Sheets.
         
+        Sheets are read with get_cached_rows(), so repeated calls download
+        nothing while the spreadsheet is unchanged.
+        
         Args:
             transaction_type: Type of transactions to retrieve (None for all)
             
@@ -301,35 +999,77 @@ class SheetsService:
             return []
         
         try:
-            all_records = []
-            
             if transaction_type == TransactionType.PRESUPUESTO:
-                # Get only presupuestos
-                worksheet = self.spreadsheet.worksheet(self.PRESUPUESTOS_SHEET)
-                records = worksheet.get_all_values()[1:]  # Skip header
-                return records
+                return self.get_cached_rows([self.PRESUPUESTOS_SHEET])[self.PRESUPUESTOS_SHEET]
             elif transaction_type in [TransactionType.GASTO, TransactionType.INGRESO]:
-                # Get from Transacciones sheet and filter by "Es Ingreso" column
-                worksheet = self.spreadsheet.worksheet(self.TRANSACCIONES_SHEET)
-                records = worksheet.get_all_values()[1:]  # Skip header
+                records = self.get_cached_rows([self.TRANSACCIONES_SHEET])[self.TRANSACCIONES_SHEET]
                 
                 # Filter by type: last column (index 4) is "Es Ingreso"
                 is_ingreso_filter = transaction_type == TransactionType.INGRESO
                 filtered = [r for r in records if len(r) > 4 and r[4] == str(is_ingreso_filter)]
                 return filtered
             else:
-                # Get all transactions from both sheets
-                # Transacciones
-                worksheet = self.spreadsheet.worksheet(self.TRANSACCIONES_SHEET)
-                all_records.extend(worksheet.get_all_values()[1:])
-                
-                # Presupuestos
-                worksheet = self.spreadsheet.worksheet(self.PRESUPUESTOS_SHEET)
-                all_records.extend(worksheet.get_all_values()[1:])
-                
-                return all_records
+                # Transacciones and Presupuestos in one batch read (none if unchanged)
+                rows = self.get_cached_rows([self.TRANSACCIONES_SHEET, self.PRESUPUESTOS_SHEET])
+                return rows[self.TRANSACCIONES_SHEET] + rows[self.PRESUPUESTOS_SHEET]
                 
         except Exception as e:
             logger.error(f"Error retrieving transactions: {e}")
             return []
-
+    
+    def get_transaction_records(self) -> List[TransactionRecord]:
+        """
+        Retrieve the Transacciones sheet as typed records.
+        
+        Returns:
+            List of TransactionRecord (gastos e ingresos)
+        """
+        if not self.spreadsheet:
+            logger.error("Not connected to spreadsheet")
+            return []
+        
+        try:
+            return decode_transactions(self.get_rows(self.TRANSACCIONES_SHEET))
+        except Exception as e:
+            logger.error(f"Error retrieving transaction records: {e}")
+            return []
+    
+    def get_budget_records(self) -> List[BudgetRecord]:
+        """
+        Retrieve the Presupuestos sheet as typed records.
+        
+        Returns:
+            List of BudgetRecord
+        """
+        if not self.spreadsheet:
+            logger.error("Not connected to spreadsheet")
+            return []
+        
+        try:
+            return decode_budgets(self.get_rows(self.PRESUPUESTOS_SHEET))
+        except Exception as e:
+            logger.error(f"Error retrieving budget records: {e}")
+            return []
+    
+    def get_capital_records(self, only_active: bool = False) -> List[CapitalRecord]:
+        """
+        Retrieve the Ahorros e Inversiones sheet as typed records.
+        
+        Args:
+            only_active: If True, return only active (non-withdrawn) movements
+        
+        Returns:
+            List of CapitalRecord
+        """
+        if not self.spreadsheet:
+            logger.error("Not connected to spreadsheet")
+            return []
+        
+        try:
+            records = decode_capital(self.get_rows(self.CAPITAL_SHEET))
+            if only_active:
+                records = [r for r in records if r.is_active()]
+            return records
+        except Exception as e:
+            logger.error(f"Error retrieving capital records: {e}")
+            return []
@@ -0,0 +1,195 @@
+"""
+Shared HTTP transport for Google Sheets traffic.
+
+One service-account credential and one pooled keep-alive session per
+credentials file, shared by every gspread client in the process, so extra
+clients (per worker or per tenant) reuse open TLS connections and the same
+OAuth token instead of fetching their own. The token is refreshed by a
+background thread before it expires, so no request waits for a token fetch,
+and responses are gzip-compressed. Connection reuse is published as metrics.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from services.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Google APIs only compress responses for clients that say so in the User-Agent
+USER_AGENT = "dacarsoft-finance-bot (gzip)"
+
+metrics.describe("sheets_http_requests_total", "HTTP requests to Google APIs by status")
+metrics.describe("sheets_http_request_seconds", "Latency of HTTP requests to Google APIs")
+metrics.describe("sheets_connections_opened", "TLS connections opened to Google APIs")
+metrics.describe("sheets_connection_reuse_ratio", "Share of requests served on an already open connection")
+metrics.describe("sheets_token_refreshes_total", "OAuth token refreshes")
+
+_transports: Dict[Tuple[str, Tuple[str, ...]], "SheetsTransport"] = {}
+_transports_lock = threading.Lock()
+
+
+class SheetsTransport:
+    """
+    Credential, token refresher and pooled session shared by Sheets clients.
+    """
+    
+    def __init__(self, credentials_file: str, scopes: Sequence[str], pool_size: Optional[int] = None,
+                 refresh_margin: Optional[float] = None):
+        """
+        Load the credential, build the session and fetch the first token.
+        
+        Args:
+            credentials_file: Service account credentials JSON file
+            scopes: OAuth scopes
+            pool_size: Keep-alive connections kept per host
+            refresh_margin: Seconds before expiry at which the token is refreshed
+        
+        Raises:
+            google.auth.exceptions.GoogleAuthError: If the first token fetch fails
+        """
+        import requests
+        from google.auth.transport.requests import AuthorizedSession, Request
+        from google.oauth2.service_account import Credentials
+        
+        self.pool_size = pool_size or settings.SHEETS_POOL_SIZE
+        self.refresh_margin = refresh_margin or settings.SHEETS_TOKEN_REFRESH_MARGIN
+        self.credentials = Credentials.from_service_account_file(credentials_file, scopes=list(scopes))
+        
+        transport = self
+        
+        class CountingSession(AuthorizedSession):
+            """AuthorizedSession that records per-request metrics."""
+            
+            def request(self, method, url, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                except Exception:
+                    metrics.inc("sheets_http_requests_total", status="error")
+                    raise
+                metrics.observe("sheets_http_request_seconds", time.perf_counter() - started)
+                metrics.inc("sheets_http_requests_total", status=response.status_code)
+                if response.headers.get("Content-Encoding") == "gzip":
+                    transport.gzip_responses += 1
+                return response
+        
+        # Token requests get their own keep-alive session too
+        token_session = requests.Session()
+        token_session.headers["User-Agent"] = USER_AGENT
+        self._token_request = Request(session=token_session)
+        
+        self.session = CountingSession(self.credentials, auth_request=self._token_request)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size,
+                                                pool_block=False)
+        self.session.mount("https://", adapter)
+        self._adapters = [adapter, token_session.get_adapter("https://")]
+        
+        self.gzip_responses = 0
+        self.token_refreshes = 0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        
+        self.refresh()
+        threading.Thread(target=self._refresh_loop, name="sheets-token-refresher", daemon=True).start()
+        metrics.register_collector(self.publish_metrics)
+    
+    @classmethod
+    def shared(cls, credentials_file: str, scopes: Sequence[str]) -> "SheetsTransport":
+        """
+        Get the process-wide transport of a credentials file, creating it on first use.
+        
+        Args:
+            credentials_file: Service account credentials JSON file
+            scopes: OAuth scopes
+        
+        Returns:
+            The shared transport
+        """
+        key = (credentials_file, tuple(scopes))
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                transport = _transports[key] = cls(credentials_file, scopes)
+            return transport
+    
+    def seconds_until_expiry(self) -> Optional[float]:
+        """Seconds the current token is still valid for (None before the first fetch)."""
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return None
+        # google-auth keeps expiry as a naive UTC datetime
+        return (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+    
+    def refresh(self) -> None:
+        """Fetch a new token now (blocking)."""
+        with self._refresh_lock:
+            self.credentials.refresh(self._token_request)
+            self.token_refreshes += 1
+        metrics.inc("sheets_token_refreshes_total")
+        logger.debug(f"Sheets token refreshed, valid for {self.seconds_until_expiry():.0f}s")
+    
+    def _refresh_loop(self) -> None:
+        """Refresh the token refresh_margin seconds before it expires."""
+        while True:
+            remaining = self.seconds_until_expiry()
+            wait = 0.0 if remaining is None else remaining - self.refresh_margin
+            if self._stop.wait(max(wait, 1.0)):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Requests still refresh on their own if the token runs out
+                logger.warning(f"Proactive Sheets token refresh failed: {e}")
+                if self._stop.wait(30):
+                    return
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Connection reuse statistics.
+        
+        Returns:
+            requests, connections opened, reuse ratio, gzip responses, token
+            refreshes and seconds until the token expires
+        """
+        requests_made = connections = 0
+        for adapter in self._adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_made += pool.num_requests
+                    connections += pool.num_connections
+        remaining = self.seconds_until_expiry()
+        return {
+            "pool_size": self.pool_size,
+            "requests": requests_made,
+            "connections_opened": connections,
+            "reuse_ratio": round(1 - connections / requests_made, 3) if requests_made else 0.0,
+            "gzip_responses": self.gzip_responses,
+            "token_refreshes": self.token_refreshes,
+            "token_expires_in": round(remaining) if remaining is not None else None,
+        }
+    
+    def publish_metrics(self) -> None:
+        """Metrics collector: copy the reuse statistics into gauges."""
+        stats = self.stats()
+        metrics.set("sheets_connections_opened", stats["connections_opened"])
+        metrics.set("sheets_connection_reuse_ratio", stats["reuse_ratio"])
+    
+    def close(self) -> None:
+        """Stop the refresher and close the pooled connections (shared() then creates a new transport)."""
+        with _transports_lock:
+            for key, transport in list(_transports.items()):
+                if transport is self:
+                    del _transports[key]
+        metrics.unregister_collector(self.publish_metrics)
+        self._stop.set()
+        self.session.close()
+        for adapter in self._adapters:
+            adapter.close()
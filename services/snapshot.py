@@ -0,0 +1,205 @@
+"""
+Columnar on-disk snapshot of the ledger.
+
+Writes the typed records of the append-only sheets (Transacciones and
+Presupuestos) as one file per column (numbers as raw arrays, repeated names
+dictionary-encoded, free text as offsets + UTF-8 blob) that are read back
+with mmap, plus a manifest recording how many rows of each sheet the
+snapshot covers and a fingerprint of the last one. A restart then only has
+to fetch the rows appended since (see Ledger.load), instead of every sheet.
+Ahorros e Inversiones is not included: its rows change in place
+(withdrawals, returns), and it is small enough to re-read whole.
+"""
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import time
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from domain.records import BudgetRecord, TransactionRecord
+from services.config import settings
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes; older snapshots are ignored
+_FORMAT_VERSION = 1
+
+# Record type and (field, encoding) columns per sheet. Encodings:
+# time = epoch seconds ('d'), float = 'd', bool = 'b',
+# dict = 'I' codes into a list kept in the manifest, text = offsets + blob
+SCHEMAS: Dict[str, Tuple[type, List[Tuple[str, str]]]] = {
+    SheetsService.TRANSACCIONES_SHEET: (TransactionRecord, [
+        ("fecha", "time"), ("monto", "float"), ("categoria", "dict"),
+        ("descripcion", "text"), ("es_ingreso", "bool")]),
+    SheetsService.PRESUPUESTOS_SHEET: (BudgetRecord, [
+        ("fecha", "time"), ("monto", "float"), ("categoria", "dict"), ("descripcion", "text")]),
+}
+
+
+class SnapshotTable(NamedTuple):
+    """
+    The snapshot of one sheet.
+    
+    Attributes:
+        records: Decoded records
+        rows: Sheet rows covered (malformed ones included), i.e. rows 2..rows+1
+        last_row: Fingerprint of the last covered row (None if the sheet was empty)
+    """
+    records: list
+    rows: int
+    last_row: Optional[List[str]]
+
+
+def _file_key(sheet_name: str) -> str:
+    """File name prefix of a sheet ("Transacciones" → "transacciones")."""
+    return sheet_name.lower().replace(" ", "_")
+
+
+class LedgerSnapshot:
+    """
+    Reads and writes ledger snapshots under one directory.
+    
+    Each save writes a new generation directory and then atomically
+    replaces manifest.json, so a crash mid-save leaves the previous
+    snapshot intact.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the snapshot store.
+        
+        Args:
+            path: Snapshot directory (defaults to DATA_DIR/snapshot)
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "snapshot"
+    
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the manifest file."""
+        return self.path / "manifest.json"
+    
+    def save(self, tables: Dict[str, SnapshotTable]) -> None:
+        """
+        Write a new snapshot (blocking).
+        
+        Args:
+            tables: sheet name → records, rows covered and last row fingerprint
+        """
+        started = time.perf_counter()
+        generation = f"gen-{time.time_ns()}"
+        directory = self.path / generation
+        directory.mkdir(parents=True, exist_ok=True)
+        
+        manifest: Dict[str, Any] = {
+            "version": _FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "generation": generation,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "sheets": {}
+        }
+        for sheet_name, table in tables.items():
+            _, columns = SCHEMAS[sheet_name]
+            dictionaries: Dict[str, List[str]] = {}
+            for index, (field, encoding) in enumerate(columns):
+                values = [record[index] for record in table.records]
+                stem = directory / f"{_file_key(sheet_name)}.{field}"
+                if encoding == "time":
+                    data = array("d", (value.timestamp() for value in values))
+                    Path(f"{stem}.bin").write_bytes(data.tobytes())
+                elif encoding == "float":
+                    Path(f"{stem}.bin").write_bytes(array("d", values).tobytes())
+                elif encoding == "bool":
+                    Path(f"{stem}.bin").write_bytes(array("b", values).tobytes())
+                elif encoding == "dict":
+                    codes: Dict[str, int] = {}
+                    data = array("I", (codes.setdefault(value, len(codes)) for value in values))
+                    dictionaries[field] = list(codes)
+                    Path(f"{stem}.bin").write_bytes(data.tobytes())
+                else:
+                    encoded = [(value or "").encode("utf-8") for value in values]
+                    offsets = array("Q", [0])
+                    for item in encoded:
+                        offsets.append(offsets[-1] + len(item))
+                    Path(f"{stem}.bin").write_bytes(offsets.tobytes())
+                    Path(f"{stem}.txt").write_bytes(b"".join(encoded))
+            manifest["sheets"][sheet_name] = {
+                "records": len(table.records),
+                "rows": table.rows,
+                "last_row": table.last_row,
+                "dictionaries": dictionaries
+            }
+        
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+        
+        # Older generations are no longer referenced (open maps stay valid after unlink)
+        for old in self.path.glob("gen-*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Ledger snapshot saved in {(time.perf_counter() - started) * 1000:.0f} ms: "
+                    + ", ".join(f"{name} {table.rows} filas" for name, table in tables.items()))
+    
+    def _map(self, path: Path, typecode: str) -> Sequence:
+        """Memory-map a column file as a typed read-only view (unmapped when the view is dropped)."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return array(typecode)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)
+    
+    def load(self) -> Optional[Dict[str, SnapshotTable]]:
+        """
+        Read the current snapshot (blocking).
+        
+        Returns:
+            sheet name → SnapshotTable, or None if there is no usable snapshot
+        """
+        if not self.manifest_path.exists():
+            return None
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if manifest.get("version") != _FORMAT_VERSION or manifest.get("byteorder") != sys.byteorder:
+                return None
+            directory = self.path / manifest["generation"]
+            
+            tables = {}
+            for sheet_name, info in manifest["sheets"].items():
+                record_type, columns = SCHEMAS[sheet_name]
+                decoded = []
+                for field, encoding in columns:
+                    stem = directory / f"{_file_key(sheet_name)}.{field}"
+                    if encoding == "time":
+                        decoded.append([datetime.fromtimestamp(value)
+                                        for value in self._map(Path(f"{stem}.bin"), "d")])
+                    elif encoding == "float":
+                        decoded.append(self._map(Path(f"{stem}.bin"), "d").tolist())
+                    elif encoding == "bool":
+                        decoded.append([bool(value) for value in self._map(Path(f"{stem}.bin"), "b")])
+                    elif encoding == "dict":
+                        names = info["dictionaries"][field]
+                        decoded.append([names[code] for code in self._map(Path(f"{stem}.bin"), "I")])
+                    else:
+                        offsets = self._map(Path(f"{stem}.bin"), "Q")
+                        blob = Path(f"{stem}.txt").read_bytes()
+                        decoded.append([blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+                                        for i in range(len(offsets) - 1)])
+                    if len(decoded[-1]) != info["records"]:
+                        raise ValueError(f"{sheet_name}.{field}: {len(decoded[-1])} values, expected {info['records']}")
+                records = [record_type(*cells) for cells in zip(*decoded)] if decoded and info["records"] else []
+                tables[sheet_name] = SnapshotTable(records, info["rows"], info["last_row"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Error loading ledger snapshot from {self.path}: {e}")
+            return None
+        
+        logger.info(f"Ledger snapshot loaded ({manifest['created_at']}): "
+                    + ", ".join(f"{name} {table.rows} filas" for name, table in tables.items()))
+        return tables
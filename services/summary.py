@@ -0,0 +1,317 @@
+"""
+Materialized "Resumen" summary sheet.
+
+Keeps monthly totals per tipo and categoria, plus active capital per
+institution, in a small sheet that dashboards and /stats can read instead of
+recomputing over the whole ledger. Each summary line keeps its row, so after
+every outbox write batch only the changed cells are rewritten, in a single
+batch update. A full rebuild from the source sheets is available on demand.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from domain.records import CapitalRecord
+from services.capital_index import movement_id
+from services.row_decoder import decode_budgets, decode_capital, decode_transactions, parse_amount
+from services.sheets_service import SheetsService
+
+logger = logging.getLogger(__name__)
+
+# "Mes" value of the active capital lines
+CAPITAL_MONTH = "Capital activo"
+
+# (Mes, Tipo, Categoría) of a summary line
+SummaryKey = Tuple[str, str, str]
+
+
+class SummarySheet:
+    """
+    In-memory mirror of the Resumen sheet that writes back only what changed.
+    """
+    
+    def __init__(self, sheets: SheetsService):
+        """
+        Initialize an empty summary.
+        
+        Args:
+            sheets: SheetsService used for reads and writes
+        """
+        self.sheets = sheets
+        self._totals: Dict[SummaryKey, List[float]] = {}  # key -> [total, count]
+        self._rows: Dict[SummaryKey, int] = {}  # key -> sheet row number
+        self._dirty: Set[SummaryKey] = set()
+        self._flushing = False
+        self._flush_task: Optional[asyncio.Future] = None
+        self._loaded = False
+        self._rebuilding = False
+        # Writes seen while rebuild() runs, applied after it if its reads missed them
+        self._buffered: List[Tuple[str, List[list], Optional[int]]] = []
+        self._buffered_capital: List[Tuple[List[CapitalRecord], List[CapitalRecord]]] = []
+        self._lock = threading.Lock()
+    
+    def load(self) -> None:
+        """
+        Load the current Resumen sheet (blocking, one small read).
+        
+        If it is empty but the ledger is not (first run), it is rebuilt.
+        """
+        rows = self.sheets.get_rows(SheetsService.RESUMEN_SHEET)
+        with self._lock:
+            self._totals.clear()
+            self._rows.clear()
+            for offset, row in enumerate(rows):
+                row = list(row) + [""] * (5 - len(row))
+                if not row[0]:
+                    continue
+                key = (row[0], row[1], row[2])
+                self._totals[key] = [parse_amount(row[3]) or 0.0, int(parse_amount(row[4]) or 0)]
+                self._rows[key] = offset + 2  # Row 1 is the header
+            self._loaded = True
+        
+        if not self._rows:
+            self.rebuild()
+        logger.info(f"Summary loaded: {len(self._rows)} lines")
+    
+    def _add(self, key: SummaryKey, amount: float, count: int) -> None:
+        """Apply a delta to a summary line (lock held by caller)."""
+        totals = self._totals.setdefault(key, [0.0, 0])
+        totals[0] = round(totals[0] + amount, 2)
+        totals[1] += count
+        self._dirty.add(key)
+    
+    @staticmethod
+    def _capital_key(record: CapitalRecord) -> SummaryKey:
+        """Summary line of a capital movement."""
+        return (CAPITAL_MONTH, record.tipo, record.institucion)
+    
+    def _add_rows(self, sheet_name: str, rows: List[list]) -> None:
+        """Accumulate freshly written ledger rows (lock held by caller)."""
+        if sheet_name == SheetsService.TRANSACCIONES_SHEET:
+            for record in decode_transactions(rows):
+                self._add((record.fecha.strftime("%Y-%m"), record.tipo.value, record.categoria), record.monto, 1)
+        elif sheet_name == SheetsService.PRESUPUESTOS_SHEET:
+            for record in decode_budgets(rows):
+                self._add((record.fecha.strftime("%Y-%m"), record.tipo.value, record.categoria), record.monto, 1)
+        elif sheet_name == SheetsService.CAPITAL_SHEET:
+            for record in decode_capital(rows):
+                if record.is_active():
+                    self._add(self._capital_key(record), record.get_current_value(), 1)
+    
+    def on_rows_written(self, sheet_name: str, rows: List[list], first_row: Optional[int]) -> None:
+        """Outbox flush listener: fold the written rows in and write the changed lines."""
+        rows = [[str(cell) for cell in row] for row in rows]
+        with self._lock:
+            if self._rebuilding:
+                self._buffered.append((sheet_name, rows, first_row))
+                return
+            if not self._loaded:
+                return
+            self._add_rows(sheet_name, rows)
+        self._request_flush()
+    
+    def on_capital_updated(self, before: List[CapitalRecord], after: List[CapitalRecord]) -> None:
+        """Capital index listener: move withdrawn capital and returns in or out of the active lines."""
+        with self._lock:
+            if self._rebuilding:
+                self._buffered_capital.append((before, after))
+                return
+            if not self._loaded:
+                return
+            self._update_capital(before, after)
+        self._request_flush()
+    
+    def _update_capital(self, before: List[CapitalRecord], after: List[CapitalRecord]) -> None:
+        """Replace capital movements in the active lines (lock held by caller)."""
+        for old, new in zip(before, after):
+            if old.is_active():
+                self._add(self._capital_key(old), -old.get_current_value(), -1)
+            if new.is_active():
+                self._add(self._capital_key(new), new.get_current_value(), 1)
+    
+    def _request_flush(self) -> None:
+        """Flush in a worker thread, unless a flush is already running (it will pick the changes up)."""
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Already off the event loop (e.g. called from a worker thread)
+            self._flush_loop()
+            return
+        self._flush_task = loop.create_task(asyncio.to_thread(self._flush_loop))
+    
+    async def stop(self) -> None:
+        """Cancel the background flush, if one is running (changed lines are rebuilt by /recalcular)."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+    
+    def _flush_loop(self) -> None:
+        """Write changed lines until none are left."""
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            logger.error(f"Error updating {SheetsService.RESUMEN_SHEET} sheet: {e}")
+        finally:
+            with self._lock:
+                self._flushing = False
+    
+    def flush(self) -> int:
+        """
+        Write the changed summary lines in one batch update (blocking).
+        
+        New lines are appended after the existing ones; existing lines only
+        get their Total and Movimientos cells rewritten.
+        
+        Returns:
+            Number of lines written
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            data = []
+            new_keys = []
+            last_row = max(self._rows.values(), default=1)
+            for key in sorted(dirty):
+                total, count = self._totals[key]
+                row = self._rows.get(key)
+                if row is None:
+                    last_row += 1
+                    row = self._rows[key] = last_row
+                    new_keys.append(key)
+                    data.append((f"A{row}:E{row}", [[*key, total, count]]))
+                else:
+                    data.append((f"D{row}:E{row}", [[total, count]]))
+        
+        try:
+            self.sheets.update_ranges(SheetsService.RESUMEN_SHEET, data, min_rows=last_row)
+        except Exception:
+            with self._lock:
+                # New lines get their row again (and all their cells) on the next flush
+                for key in new_keys:
+                    self._rows.pop(key, None)
+                self._dirty |= dirty
+            raise
+        return len(data)
+    
+    def rebuild(self) -> int:
+        """
+        Recompute the whole summary from the ledger sheets and rewrite it (blocking).
+        
+        Rows written and capital updated while it runs are buffered, like
+        Ledger.load() does, and applied on top of the rebuilt lines unless
+        the reads already included them.
+        
+        Returns:
+            Number of summary lines
+        """
+        with self._lock:
+            self._rebuilding = True
+            self._buffered, self._buffered_capital = [], []
+        try:
+            return self._rebuild()
+        except Exception:
+            with self._lock:
+                # The old lines stay; fold in what was held back from them
+                self._rebuilding = False
+                if self._loaded:
+                    for sheet_name, rows, _ in self._buffered:
+                        self._add_rows(sheet_name, rows)
+                    for before, after in self._buffered_capital:
+                        self._update_capital(before, after)
+                self._buffered, self._buffered_capital = [], []
+            raise
+    
+    def _rebuild(self) -> int:
+        """Body of rebuild(), with writes being buffered."""
+        # One read of every sheet, archives included, so the per-sheet row
+        # counts tell which buffered batches it already contains
+        archives = [self.sheets.archive_title(year) for year in self.sheets.archive_years]
+        sheet_rows = self.sheets.get_rows_from(
+            {title: 2 for title in (*archives, SheetsService.TRANSACCIONES_SHEET,
+                                    SheetsService.PRESUPUESTOS_SHEET, SheetsService.CAPITAL_SHEET)})
+        transactions = decode_transactions(
+            [row for title in (*archives, SheetsService.TRANSACCIONES_SHEET) for row in sheet_rows[title]])
+        budgets = decode_budgets(sheet_rows[SheetsService.PRESUPUESTOS_SHEET])
+        capital = decode_capital(sheet_rows[SheetsService.CAPITAL_SHEET])
+        
+        totals: Dict[SummaryKey, List[float]] = {}
+        for record in (*transactions, *budgets):
+            line = totals.setdefault((record.fecha.strftime("%Y-%m"), record.tipo.value, record.categoria), [0.0, 0])
+            line[0] += record.monto
+            line[1] += 1
+        for record in capital:
+            if record.is_active():
+                line = totals.setdefault(self._capital_key(record), [0.0, 0])
+                line[0] += record.get_current_value()
+                line[1] += 1
+        
+        keys = sorted(totals)
+        values = [[*key, round(totals[key][0], 2), totals[key][1]] for key in keys]
+        
+        # Blank out lines left over from the previous layout in the same call
+        with self._lock:
+            values += [[""] * 5 for _ in range(max(self._rows.values(), default=1) - 1 - len(values))]
+        if values:
+            self.sheets.update_ranges(SheetsService.RESUMEN_SHEET, [(f"A2:E{len(values) + 1}", values)],
+                                      min_rows=len(values) + 1)
+        
+        # Capital state the reads saw, to tell which buffered updates they missed
+        read_state = {movement_id(record): (record.estado, record.retorno) for record in capital}
+        
+        with self._lock:
+            self._totals = {key: [round(totals[key][0], 2), totals[key][1]] for key in keys}
+            self._rows = {key: offset + 2 for offset, key in enumerate(keys)}
+            self._dirty.clear()
+            self._loaded = True
+            
+            # Stop buffering in the same critical section, so no batch falls in between
+            self._rebuilding = False
+            for sheet_name, rows, first_row in self._buffered:
+                read_rows = len(sheet_rows.get(sheet_name, []))
+                if first_row is None or first_row - 2 >= read_rows:
+                    self._add_rows(sheet_name, rows)
+            for before, after in self._buffered_capital:
+                missed = [(old, new) for old, new in zip(before, after)
+                          if read_state.get(movement_id(old)) == (old.estado, old.retorno)]
+                self._update_capital([old for old, _ in missed], [new for _, new in missed])
+            self._buffered, self._buffered_capital = [], []
+            pending = bool(self._dirty)
+        
+        if pending:
+            self._request_flush()
+        logger.info(f"Summary rebuilt: {len(keys)} lines")
+        return len(keys)
+    
+    def month(self, month: str) -> Dict[str, Dict[str, Tuple[float, int]]]:
+        """
+        Totals of a month.
+        
+        Args:
+            month: "YYYY-MM"
+        
+        Returns:
+            tipo → categoria → (total, movimientos)
+        """
+        result: Dict[str, Dict[str, Tuple[float, int]]] = {}
+        with self._lock:
+            for (mes, tipo, categoria), (total, count) in self._totals.items():
+                if mes == month and count:
+                    result.setdefault(tipo, {})[categoria] = (total, count)
+        return result
+    
+    def active_capital(self) -> Dict[str, float]:
+        """Active capital per institution."""
+        result: Dict[str, float] = {}
+        with self._lock:
+            for (mes, _, institucion), (total, count) in self._totals.items():
+                if mes == CAPITAL_MONTH and count:
+                    result[institucion] = round(result.get(institucion, 0.0) + total, 2)
+        return result
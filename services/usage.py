@@ -0,0 +1,212 @@
+"""
+LLM token and cost accounting.
+
+Every parser call is recorded with its prompt and completion tokens,
+latency, model and prompt profile, aggregated per day and user in
+DATA_DIR/llm_usage.json (one counter row per day, user, model and profile).
+Totals go to the metrics registry; per-user detail is served by the
+/admin/usage route. Per-user daily token budgets tell LLMService when to
+fall back to the free heuristic parser.
+"""
+
+import json
+import logging
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes
+_FORMAT_VERSION = 1
+
+# Save to disk after this many calls (also saved at shutdown)
+_SAVE_EVERY = 20
+
+# Counter columns of each aggregate row
+FIELDS = ("calls", "prompt_tokens", "completion_tokens", "latency_ms", "cost_usd")
+
+metrics.describe("llm_calls_total", "Parser calls by backend model")
+metrics.describe("llm_tokens_total", "LLM tokens billed by model and kind (prompt/completion)")
+metrics.describe("llm_cost_usd_total", "Estimated LLM spend in USD by model")
+metrics.describe("llm_request_seconds", "Latency of parser calls by model")
+metrics.describe("llm_budget_fallbacks_total", "Messages parsed heuristically because the user was over budget")
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimated USD cost of a call from LLM_PRICES (per million tokens).
+    
+    Models without a price (local, heuristic, replayed) cost 0.
+    """
+    prices = settings.LLM_PRICES.get(model)
+    if not prices:
+        # Dated snapshots ("gpt-4o-mini-2024-07-18") share the base model's price
+        matches = [name for name in settings.LLM_PRICES if model.startswith(name)]
+        prices = settings.LLM_PRICES[max(matches, key=len)] if matches else None
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+class UsageTracker:
+    """
+    Per-day, per-user LLM usage with daily token budgets.
+    
+    Rows are keyed "user_id|model|profile" under each ISO day; days older
+    than LLM_USAGE_RETENTION_DAYS are dropped.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the tracker and load persisted usage.
+        
+        Args:
+            path: Usage file (defaults to DATA_DIR/llm_usage.json)
+        """
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "llm_usage.json"
+        # day → "user|model|profile" → counters in FIELDS order
+        self._days: Dict[str, Dict[str, List[float]]] = {}
+        # (day, user) → tokens, for O(1) budget checks
+        self._user_tokens: Dict[tuple, int] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self) -> None:
+        """Load usage from disk."""
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") != _FORMAT_VERSION:
+                return
+            self._days = data["days"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading LLM usage from {self.path}: {e}")
+            return
+        for day, rows in self._days.items():
+            for key, counters in rows.items():
+                user_key = (day, key.split("|", 1)[0])
+                self._user_tokens[user_key] = self._user_tokens.get(user_key, 0) + int(counters[1] + counters[2])
+    
+    def save(self) -> None:
+        """Write usage to disk atomically, if it changed since the last save."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            oldest = (date.today() - timedelta(days=settings.LLM_USAGE_RETENTION_DAYS)).isoformat()
+            for day in [day for day in self._days if day < oldest]:
+                del self._days[day]
+                self._user_tokens = {key: tokens for key, tokens in self._user_tokens.items() if key[0] != day}
+            payload = json.dumps({"version": _FORMAT_VERSION, "days": self._days})
+            self._unsaved = 0
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def record(self, user_id, model: str, profile: str, prompt_tokens: int, completion_tokens: int,
+               latency_ms: float, day: Optional[date] = None) -> None:
+        """
+        Add one parser call to the aggregates.
+        
+        Args:
+            user_id: Telegram user id (None for calls outside a chat)
+            model: Model (or backend name) that answered
+            profile: Prompt profile used
+            prompt_tokens: Input tokens billed
+            completion_tokens: Output tokens billed
+            latency_ms: Wall time of the call
+            day: Day to charge (defaults to today)
+        """
+        day_key = (day or date.today()).isoformat()
+        user = str(user_id) if user_id is not None else "-"
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            row = self._days.setdefault(day_key, {}).setdefault(f"{user}|{model}|{profile}", [0] * len(FIELDS))
+            for position, value in enumerate((1, prompt_tokens, completion_tokens, latency_ms, cost)):
+                row[position] += value
+            user_key = (day_key, user)
+            self._user_tokens[user_key] = self._user_tokens.get(user_key, 0) + prompt_tokens + completion_tokens
+            self._unsaved += 1
+            save = self._unsaved >= _SAVE_EVERY
+        
+        metrics.inc("llm_calls_total", model=model)
+        metrics.inc("llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+        metrics.inc("llm_tokens_total", completion_tokens, model=model, kind="completion")
+        metrics.inc("llm_cost_usd_total", cost, model=model)
+        metrics.observe("llm_request_seconds", latency_ms / 1000, model=model)
+        if save:
+            try:
+                self.save()
+            except OSError as e:
+                logger.error(f"Error saving LLM usage: {e}")
+    
+    def tokens_today(self, user_id) -> int:
+        """Tokens a user has spent today."""
+        with self._lock:
+            return self._user_tokens.get((date.today().isoformat(), str(user_id)), 0)
+    
+    @staticmethod
+    def budget_for(user_id) -> int:
+        """Daily token budget of a user (0 for unlimited)."""
+        return settings.LLM_USER_TOKEN_BUDGETS.get(str(user_id), settings.LLM_DAILY_TOKEN_BUDGET)
+    
+    def over_budget(self, user_id) -> bool:
+        """True if the user has used up today's token budget."""
+        if user_id is None:
+            return False
+        budget = self.budget_for(user_id)
+        return budget > 0 and self.tokens_today(user_id) >= budget
+    
+    def report(self, since: date, until: date, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aggregated usage over a range of days.
+        
+        Args:
+            since: First day (inclusive)
+            until: Last day (inclusive)
+            user_id: Only this user (None for all)
+        
+        Returns:
+            Totals, per-user totals (with today's budget status), and per
+            model/profile totals
+        """
+        first, last = since.isoformat(), until.isoformat()
+        today = date.today().isoformat()
+        totals = dict.fromkeys(FIELDS, 0)
+        users: Dict[str, Dict[str, Any]] = {}
+        models: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for day, rows in self._days.items():
+                if not first <= day <= last:
+                    continue
+                for key, counters in rows.items():
+                    user, model, profile = key.split("|", 2)
+                    if user_id is not None and user != str(user_id):
+                        continue
+                    for target in (totals, users.setdefault(user, dict.fromkeys(FIELDS, 0)),
+                                   models.setdefault(f"{model}|{profile}", dict.fromkeys(FIELDS, 0))):
+                        for field, value in zip(FIELDS, counters):
+                            target[field] += value
+            for user, entry in users.items():
+                entry["tokens_today"] = self._user_tokens.get((today, user), 0)
+                entry["daily_budget"] = self.budget_for(user) if user != "-" else 0
+        
+        for entry in (totals, *users.values(), *models.values()):
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+            entry["latency_ms"] = round(entry["latency_ms"], 1)
+        return {
+            "since": first,
+            "until": last,
+            "totals": totals,
+            "users": dict(sorted(users.items(), key=lambda item: -item[1]["cost_usd"])),
+            "models": {key: {"model": key.split("|")[0], "profile": key.split("|")[1], **entry}
+                       for key, entry in sorted(models.items())},
+        }